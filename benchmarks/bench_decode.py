@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Benchmark da decodificação de fotos grandes: cor em resolução total x cinza reduzido
+
+Gera uma foto sintética de ~24 MP a partir de um gabarito de teste e mede, em
+processos separados, o tempo de decodificação e o pico de RSS de cada modo.
+
+Uso: python benchmarks/bench_decode.py [megapixels]
+"""
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+SAMPLE = os.path.join(BASE_DIR, 'gabaritos para teste', 'gabarito de 20.jpg')
+
+
+def decode(mode, path):
+    import cv2
+    import numpy as np
+    from PIL import Image
+
+    from cadastro.omr_processor import load_uploaded_image
+
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    start = time.perf_counter()
+    if mode == 'antigo':
+        # Caminho anterior: PIL em cor na resolução total + conversão para cinza
+        image = np.array(Image.open(io.BytesIO(data)))
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    else:
+        gray = load_uploaded_image(data, target_width=1000)
+    elapsed = time.perf_counter() - start
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{elapsed * 1000:.1f} {peak_kb} {gray.shape[1]}x{gray.shape[0]}")
+
+
+def main(megapixels=24):
+    from PIL import Image
+
+    sample = Image.open(SAMPLE)
+    scale = (megapixels * 1_000_000 / (sample.width * sample.height)) ** 0.5
+    big = sample.resize((int(sample.width * scale), int(sample.height * scale)))
+
+    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
+        big.save(temp_file, 'JPEG', quality=90)
+        path = temp_file.name
+
+    try:
+        print(f"Foto sintética: {big.width}x{big.height} ({big.width * big.height / 1e6:.1f} MP)")
+        print(f"{'modo':<10}{'decodificação ms':>18}{'pico RSS MB':>14}{'saída':>12}")
+        for mode in ('antigo', 'reduzido'):
+            output = subprocess.run(
+                [sys.executable, __file__, '--decode', mode, path],
+                capture_output=True, text=True, check=True
+            ).stdout.split()
+            elapsed, peak_kb, shape = output[0], int(output[1]), output[2]
+            print(f"{mode:<10}{elapsed:>18}{peak_kb / 1024:>14.0f}{shape:>12}")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--decode':
+        decode(sys.argv[2], sys.argv[3])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 24)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Correção em lote: laço por aluno (calcular_nota antigo) x GradingKey (matriz alunos x questões)
+
+Não usa banco: o gabarito é montado em memória.
+
+Uso: python benchmarks/bench_grading.py [alunos] [questões]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sistema_cadastro.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from cadastro.grading import compile_key  # noqa: E402
+from cadastro.models import GabaritoProva  # noqa: E402
+
+
+def legacy_grade(respostas_corretas, respostas_aluno):
+    """Reprodução do calcular_nota antigo: comparação de strings questão a questão"""
+    acertos = 0
+    for questao_id, resposta_correta in respostas_corretas.items():
+        if respostas_aluno.get(str(questao_id), '').upper() == resposta_correta.upper():
+            acertos += 1
+    return acertos, len(respostas_corretas), round(acertos / len(respostas_corretas) * 100, 2)
+
+
+def make_gabarito(questoes_ids, key, rng, weighted=False):
+    gabarito = GabaritoProva()
+    gabarito.set_respostas_dict({q: letra for q, letra in zip(questoes_ids, key)})
+    if weighted:
+        gabarito.set_anuladas_list(questoes_ids[:1])
+        gabarito.set_pesos_dict({q: float(p) for q, p in zip(questoes_ids, rng.integers(1, 4, len(questoes_ids)))})
+        gabarito.set_credito_parcial_dict({questoes_ids[1]: {'A' if key[1] != 'A' else 'B': 0.5}})
+        gabarito.penalidade_erro = 0.25
+    return gabarito
+
+
+def main(num_alunos=10000, num_questoes=20):
+    rng = np.random.default_rng(0)
+    questoes_ids = [str(1000 + q) for q in range(num_questoes)]
+    key = rng.choice(list('ABCDE'), num_questoes)
+    respostas = [
+        {q: letra.strip() for q, letra in zip(questoes_ids, np.where(
+            rng.random(num_questoes) < 0.7, key, rng.choice(list('ABCDE '), num_questoes)))}
+        for _ in range(num_alunos)
+    ]
+
+    print(f"{num_alunos} alunos x {num_questoes} questões")
+    print(f"{'caminho':<34}{'tempo (ms)':>12}{'alunos/s':>14}")
+
+    gabarito = make_gabarito(questoes_ids, key, rng)
+    respostas_corretas = gabarito.get_respostas_dict()
+    start = time.perf_counter()
+    legacy = [legacy_grade(respostas_corretas, r) for r in respostas]
+    elapsed = time.perf_counter() - start
+    print(f"{'laço por aluno':<34}{elapsed * 1000:>12.1f}{num_alunos / elapsed:>14.0f}")
+
+    start = time.perf_counter()
+    compiled = compile_key(gabarito)
+    answers = compiled.answer_matrix(respostas)
+    matrix_time = time.perf_counter() - start
+    start = time.perf_counter()
+    acertos, notas = compiled.grade(answers)
+    elapsed = time.perf_counter() - start
+    print(f"{'GradingKey (montar matriz)':<34}{matrix_time * 1000:>12.1f}{num_alunos / matrix_time:>14.0f}")
+    print(f"{'GradingKey (corrigir)':<34}{elapsed * 1000:>12.1f}{num_alunos / elapsed:>14.0f}")
+
+    iguais = all(a == int(b) and n == round(float(c), 2) for (a, _, n), b, c in zip(legacy, acertos, notas))
+    print(f"resultados iguais ao laço: {iguais}")
+
+    weighted = compile_key(make_gabarito(questoes_ids, key, rng, weighted=True))
+    start = time.perf_counter()
+    weighted.grade(answers)
+    elapsed = time.perf_counter() - start
+    print(f"{'pesos + parcial + penalidade':<34}{elapsed * 1000:>12.1f}{num_alunos / elapsed:>14.0f}")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+"""
+Desempenho e acerto do leitor OMR sobre um conjunto de folhas rotuladas
+
+Cada imagem do conjunto tem ao lado um JSON com o mesmo nome
+({"num_questoes": 20, "formato": "20q", "respostas": ["C", "B", "", ...]});
+"gabaritos para teste" já traz as quatro fotos de exemplo rotuladas.
+
+Para cada formato mostra percentis de latência por etapa (decodificação e
+os tempos_ms do OMRResult), a média dos contadores da leitura, o pico de
+memória e o acerto por questão. O
+resumo pode ser salvo como baseline (--salvar) e comparado com execuções
+seguintes (--comparar): o script termina com código 1 se alguma etapa ficar
+mais lenta que a tolerância ou se o acerto cair.
+
+--ruido SIGMA soma ruído gaussiano às imagens decodificadas, para medir
+fotos "carregadas" (milhares de contornos por folha).
+
+Uso: python benchmarks/bench_omr.py [--corpus DIR ...] [--repeticoes N] [--ruido SIGMA]
+                                    [--salvar baseline.json] [--comparar baseline.json]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+import zlib
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from cadastro.omr_processor import ENGINE_VERSION, OMRProcessor, load_uploaded_image, working_width  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(BASE_DIR, 'gabaritos para teste')
+DEFAULT_BASELINE = os.path.join(BASE_DIR, 'benchmarks', 'baseline_omr.json')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+
+PERCENTILES = (50, 90, 99)
+
+# Piora tolerada na comparação com a baseline
+LATENCY_TOLERANCE = 0.25  # fração do p50 de cada etapa
+LATENCY_FLOOR_MS = 2.0  # diferenças menores que isso são ruído
+ACCURACY_TOLERANCE = 0.0
+
+
+def load_corpus(directories):
+    """Lista de (caminho da imagem, rótulo) das imagens que têm JSON ao lado"""
+    corpus = []
+    for directory in directories:
+        for path in sorted(glob.glob(os.path.join(directory, '*'))):
+            base, ext = os.path.splitext(path)
+            if ext.lower() not in IMAGE_EXTENSIONS or not os.path.exists(base + '.json'):
+                continue
+            with open(base + '.json', encoding='utf-8') as f:
+                label = json.load(f)
+            label.setdefault('formato', f"{label['num_questoes']}q")
+            corpus.append((path, label))
+    return corpus
+
+
+def read_sheet(processor, data, label, name, noise=0.0):
+    """Decodifica e lê uma folha; devolve (respostas, tempos em ms por etapa, contadores)"""
+    start = time.perf_counter()
+    gray = load_uploaded_image(data, target_width=working_width(label['num_questoes']))
+    decode_ms = (time.perf_counter() - start) * 1000
+    if noise:
+        rng = np.random.default_rng(zlib.crc32(name.encode()))
+        gray = np.clip(gray + rng.normal(0, noise, gray.shape), 0, 255).astype(np.uint8)
+
+    result = processor.read(gray, label['num_questoes'], source_name=name)
+    timings = {'decodificacao': decode_ms, **result.timings}
+    timings['total'] = timings.get('total', 0.0) + decode_ms
+    return result.answers, timings, result.counters
+
+
+def peak_memory(processor, data, label, name, noise=0.0):
+    """Pico de memória alocada (KB) durante uma leitura completa"""
+    tracemalloc.start()
+    read_sheet(processor, data, label, name, noise)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def run(corpus, repeats, noise=0.0):
+    """Executa o conjunto e devolve o resumo por formato"""
+    processor = OMRProcessor()
+    formats = {}
+    for path, label in corpus:
+        with open(path, 'rb') as f:
+            data = f.read()
+        name = os.path.basename(path)
+        expected = [letra or '' for letra in label['respostas']]
+
+        stats = formats.setdefault(label['formato'], {
+            'num_questoes': label['num_questoes'], 'folhas': 0, 'tempos': {}, 'memoria_kb': [],
+            'certas': np.zeros(label['num_questoes']), 'folhas_perfeitas': 0, 'marcas': {}, 'contadores': {},
+        })
+
+        read_sheet(processor, data, label, name, noise)  # aquecimento (layouts compilados, imports)
+        stats['memoria_kb'].append(peak_memory(processor, data, label, name, noise))
+        for _ in range(repeats):
+            answers, timings, counters = read_sheet(processor, data, label, name, noise)
+            for stage, ms in timings.items():
+                stats['tempos'].setdefault(stage, []).append(ms)
+        for counter, value in counters.items():
+            stats['contadores'].setdefault(counter, []).append(value)
+
+        hits = np.array([a == e for a, e in zip(answers, expected)] +
+                        [False] * (len(expected) - len(answers)))
+        stats['certas'][:len(hits)] += hits[:label['num_questoes']]
+        stats['folhas'] += 1
+        stats['folhas_perfeitas'] += int(hits.all())
+
+        # Folhas sintéticas (synthetic_sheets.py) trazem o tipo de marca de cada questão
+        for mark, hit in zip(label.get('marcas', []), hits):
+            counts = stats['marcas'].setdefault(mark['tipo'], [0, 0])
+            counts[0] += int(hit)
+            counts[1] += 1
+
+    summary = {}
+    for formato, stats in sorted(formats.items(), key=lambda item: (item[1]['num_questoes'], item[0])):
+        summary[formato] = {
+            'num_questoes': stats['num_questoes'],
+            'folhas': stats['folhas'],
+            'latencia_ms': {
+                stage: {f'p{p}': round(float(np.percentile(values, p)), 2) for p in PERCENTILES}
+                for stage, values in stats['tempos'].items()
+            },
+            'contadores_media': {
+                counter: round(float(np.mean(values)), 1) for counter, values in stats['contadores'].items()
+            },
+            'memoria_pico_kb': round(max(stats['memoria_kb'])),
+            'acerto': round(float(stats['certas'].sum() / (stats['folhas'] * stats['num_questoes'])), 4),
+            'acerto_por_questao': [round(float(c / stats['folhas']), 4) for c in stats['certas']],
+            'folhas_perfeitas': stats['folhas_perfeitas'],
+        }
+        if stats['marcas']:
+            summary[formato]['acerto_por_marca'] = {
+                tipo: round(certas / total, 4) for tipo, (certas, total) in sorted(stats['marcas'].items())
+            }
+    return {'versao_motor': ENGINE_VERSION, 'repeticoes': repeats, 'ruido': noise, 'formatos': summary}
+
+
+def print_summary(result):
+    for formato, stats in result['formatos'].items():
+        print(f"\n{formato}: {stats['folhas']} folha(s), acerto {stats['acerto'] * 100:.1f}% "
+              f"({stats['folhas_perfeitas']} perfeitas), pico de memória {stats['memoria_pico_kb']} KB")
+        print(f"  {'etapa':<16}" + ''.join(f"{f'p{p} ms':>10}" for p in PERCENTILES))
+        for stage, values in stats['latencia_ms'].items():
+            print(f"  {stage:<16}" + ''.join(f"{values[f'p{p}']:>10.2f}" for p in PERCENTILES))
+        print('  contadores (média por folha): ' + ', '.join(
+            f'{counter} {value:g}' for counter, value in stats.get('contadores_media', {}).items()))
+        if 'acerto_por_marca' in stats:
+            print('  acerto por tipo de marca: ' + ', '.join(
+                f'{tipo} {acc * 100:.1f}%' for tipo, acc in stats['acerto_por_marca'].items()))
+        errors = [i + 1 for i, acc in enumerate(stats['acerto_por_questao']) if acc < 1]
+        if errors:
+            print(f"  questões com erro: {errors}")
+
+
+def compare(result, baseline):
+    """Diferenças em relação à baseline; devolve a lista de regressões"""
+    regressions = []
+    print(f"\nComparação com a baseline (motor v{baseline.get('versao_motor')} -> v{result['versao_motor']})")
+    for formato, stats in result['formatos'].items():
+        base = baseline.get('formatos', {}).get(formato)
+        if base is None:
+            print(f"  {formato}: sem baseline")
+            continue
+
+        delta = stats['acerto'] - base['acerto']
+        print(f"  {formato}: acerto {base['acerto'] * 100:.1f}% -> {stats['acerto'] * 100:.1f}%")
+        if delta < -ACCURACY_TOLERANCE:
+            regressions.append(f"{formato}: acerto caiu {-delta * 100:.1f} pontos")
+
+        for stage, values in stats['latencia_ms'].items():
+            old = base['latencia_ms'].get(stage)
+            if old is None:
+                continue
+            new_p50, old_p50 = values['p50'], old['p50']
+            change = (new_p50 - old_p50) / old_p50 if old_p50 else 0.0
+            print(f"    {stage:<16}{old_p50:>10.2f}{new_p50:>10.2f}{change * 100:>+9.0f}%")
+            if change > LATENCY_TOLERANCE and new_p50 - old_p50 > LATENCY_FLOOR_MS:
+                regressions.append(f"{formato}/{stage}: p50 {old_p50:.1f} -> {new_p50:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--corpus', action='append',
+                        help='Pasta com imagens rotuladas (pode repetir; padrão: gabaritos para teste)')
+    parser.add_argument('--repeticoes', type=int, default=5, help='Leituras cronometradas por folha')
+    parser.add_argument('--ruido', type=float, default=0.0, help='Desvio do ruído gaussiano somado às imagens')
+    parser.add_argument('--salvar', nargs='?', const=DEFAULT_BASELINE, help='Grava o resumo como baseline')
+    parser.add_argument('--comparar', nargs='?', const=DEFAULT_BASELINE, help='Compara com uma baseline salva')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus or [DEFAULT_CORPUS])
+    if not corpus:
+        print("Nenhuma imagem rotulada encontrada")
+        return 1
+
+    result = run(corpus, args.repeticoes, args.ruido)
+    print_summary(result)
+
+    status = 0
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            regressions = compare(result, json.load(f))
+        for regression in regressions:
+            print(f"REGRESSÃO: {regression}")
+        status = 1 if regressions else 0
+
+    if args.salvar:
+        with open(args.salvar, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f"\nBaseline salva em {args.salvar}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
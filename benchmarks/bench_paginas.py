@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""
+Latência das páginas do professor conforme cresce o número de professores e de questões
+
+O professor medido tem sempre os mesmos dados (disciplinas, alunos com
+notas, questões); os demais professores são acrescentados a cada etapa.
+Com os índices (Professor.cpf, Aluno(professor, matricula),
+Questao(cpf_professor, disciplina_nome)) o tempo e o número de consultas
+de cada página não devem depender do tamanho das tabelas.
+
+O professor medido também tem provas de tamanhos diferentes: as páginas de
+uma prova buscam as questões (ProvaQuestao) em uma consulta só, então o
+número de consultas não pode variar com o número de questões nem passar de
+CONSULTAS_PROVA. Se passar, o script termina com código 1.
+
+Usa um banco SQLite temporário (o db.sqlite3 do projeto não é tocado).
+
+Uso: python benchmarks/bench_paginas.py [--escalas 10,200,1000] [--questoes 200] [--repeticoes 20]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sistema_cadastro.settings')
+
+CPF_MEDIDO = '00000000000'
+PAGINAS = [
+    '/cadastro/',
+    '/cadastro/disciplina/0/',
+    '/cadastro/alunos/',
+    '/cadastro/lista_questoes/?disciplina=Disciplina 0',
+    '/cadastro/gerar_prova/',
+    '/cadastro/selecionar_questoes/?disciplina=Disciplina 0',
+    '/cadastro/cadastrar_questao/',
+    '/cadastro/provas/',
+]
+# Páginas de uma prova, medidas para cada tamanho em TAMANHOS_PROVA
+PAGINAS_PROVA = [
+    '/cadastro/gabarito/{}/',
+    '/cadastro/prova/pdf/{}/',
+]
+TAMANHOS_PROVA = (5, 20, 50)
+CONSULTAS_PROVA = 6  # sessão + professor + prova/gabarito + questões, com folga
+
+
+def setup_database(path):
+    import django
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = path
+    django.setup()
+
+    from django.core.management import call_command
+    from django.test.utils import setup_test_environment
+    call_command('migrate', verbosity=0)
+    setup_test_environment()  # cliente de teste (ALLOWED_HOSTS, templates)
+
+
+def populate(inicio, fim, questoes_por_professor, alunos_por_professor=30, disciplinas_por_professor=3):
+    """Cria os professores inicio..fim-1, cada um com disciplinas, alunos inscritos e questões"""
+    from django.contrib.auth.hashers import make_password
+    from cadastro.models import Aluno, Disciplina, Inscricao, Professor, Questao
+
+    senha = make_password('senha')
+    professores = Professor.objects.bulk_create([
+        Professor(nome=f'Professor {i}', email=f'{i:011d}@bench.com', cpf=f'{i:011d}', senha=senha)
+        for i in range(inicio, fim)
+    ])
+    disciplinas = Disciplina.objects.bulk_create([
+        Disciplina(nome=f'Disciplina {d}', ano='2025.2', professor=professor)
+        for professor in professores for d in range(disciplinas_por_professor)
+    ])
+    alunos = Aluno.objects.bulk_create([
+        Aluno(nome=f'Aluno {a}', matricula=f'{a:011d}', professor=professor)
+        for professor in professores for a in range(alunos_por_professor)
+    ], batch_size=2000)
+    Inscricao.objects.bulk_create([
+        Inscricao(aluno=alunos[p * alunos_por_professor + a], disciplina=disciplinas[p * disciplinas_por_professor],
+                  nota_1va=7.0, nota_2va=6.0)
+        for p in range(len(professores)) for a in range(alunos_por_professor)
+    ], batch_size=2000)
+    Questao.objects.bulk_create([
+        Questao(enunciado=f'Questão {q}', alternativa_a='a', alternativa_b='b', alternativa_c='c',
+                alternativa_d='d', alternativa_e='e', resposta_correta='ABCDE'[q % 5],
+                cpf_professor=professor.cpf, disciplina_nome=f'Disciplina {q % disciplinas_por_professor}')
+        for professor in professores for q in range(questoes_por_professor)
+    ], batch_size=2000)
+
+
+def criar_provas(questoes_por_professor):
+    """Provas do professor medido, uma por tamanho; devolve as páginas de cada uma"""
+    from cadastro.models import GabaritoProva, Professor, Prova, Questao
+
+    professor = Professor.objects.get(cpf=CPF_MEDIDO)
+    questoes = list(Questao.objects.filter(cpf_professor=CPF_MEDIDO).order_by('id')[:max(TAMANHOS_PROVA)])
+    paginas = []
+    for tamanho in TAMANHOS_PROVA:
+        if tamanho > len(questoes):
+            continue
+        prova = Prova.objects.create(disciplina='Disciplina 0', professor=professor, quantidade_questoes=tamanho)
+        prova.set_questoes_ids_list([questao.id for questao in questoes[:tamanho]])
+        gabarito = GabaritoProva(prova=prova)
+        gabarito.set_respostas_dict({str(questao.id): questao.resposta_correta for questao in questoes[:tamanho]})
+        gabarito.save()
+        paginas.append((tamanho, [pagina.format(prova.id) for pagina in PAGINAS_PROVA]))
+    return paginas
+
+
+def measure(client, repeticoes, paginas):
+    """{página: (p50 ms, consultas)}"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    resultado = {}
+    for pagina in paginas:
+        client.get(pagina)  # aquecimento
+        tempos = []
+        for _ in range(repeticoes):
+            with CaptureQueriesContext(connection) as consultas:
+                start = time.perf_counter()
+                response = client.get(pagina)
+                tempos.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, (pagina, response.status_code)
+        resultado[pagina] = (float(np.percentile(tempos, 50)), len(consultas.captured_queries))
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--escalas', default='10,200,1000', help='Total de professores em cada etapa')
+    parser.add_argument('--questoes', type=int, default=200, help='Questões por professor')
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+    escalas = [int(valor) for valor in args.escalas.split(',')]
+
+    from django.test import Client
+
+    resultados = []
+    criados = 0
+    provas = []
+    for escala in escalas:
+        populate(criados, escala, args.questoes)
+        if criados == 0:
+            provas = criar_provas(args.questoes)
+        criados = escala
+        paginas = PAGINAS + [pagina for _, paginas_prova in provas for pagina in paginas_prova]
+        client = Client()
+        client.post('/cadastro/login/', {'cpf': CPF_MEDIDO, 'senha': 'senha'})
+        resultados.append(measure(client, args.repeticoes, paginas))
+        print(f"{escala} professores, {escala * args.questoes} questões: medido")
+
+    print(f"\n{'página':<56}" + ''.join(f"{f'{escala} prof. ms':>16}" for escala in escalas) + f"{'consultas':>11}")
+    for pagina in paginas:
+        tempos = ''.join(f"{resultado[pagina][0]:>16.2f}" for resultado in resultados)
+        consultas = '/'.join(str(resultado[pagina][1]) for resultado in resultados)
+        print(f"{pagina:<56}{tempos}{consultas:>11}")
+
+    # Páginas de prova: mesmo número de consultas para 5 ou 50 questões, dentro do limite
+    falhas = []
+    for i, modelo in enumerate(PAGINAS_PROVA):
+        contagens = {tamanho: {resultado[paginas_prova[i]][1] for resultado in resultados}
+                     for tamanho, paginas_prova in provas}
+        todas = set().union(*contagens.values())
+        if len(todas) > 1 or max(todas) > CONSULTAS_PROVA:
+            falhas.append(f"{modelo.format('<id>')}: consultas por tamanho de prova {contagens} "
+                          f"(limite {CONSULTAS_PROVA})")
+    for falha in falhas:
+        print(f"REGRESSÃO: {falha}")
+    return 1 if falhas else 0
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_database(os.path.join(tmp, 'bench.sqlite3'))
+        status = main()
+    sys.exit(status)
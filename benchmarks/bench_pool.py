@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Latência de leitura OMR: worker frio (processo novo, importa OpenCV) x pool aquecido
+
+Uso: python benchmarks/bench_pool.py [leituras]
+"""
+import os
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+SAMPLES = [(n, os.path.join(BASE_DIR, 'gabaritos para teste', f'gabarito de {n}.jpg')) for n in (5, 10, 15, 20)]
+
+COLD_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+sys.path.append({base!r})
+from cadastro.omr_processor import process_sheet
+process_sheet(open({path!r}, 'rb').read(), {num_questions})
+print(time.perf_counter() - start)
+"""
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def report(label, latencies):
+    latencies = [t * 1000 for t in latencies]
+    print(f"{label:<8}{len(latencies):>8}{percentile(latencies, 50):>10.1f}{percentile(latencies, 99):>10.1f}")
+
+
+def main(runs=40):
+    from cadastro import omr_pool
+    from cadastro.omr_processor import process_sheet
+
+    images = [(n, open(path, 'rb').read(), path) for n, path in SAMPLES]
+
+    cold = []
+    for i in range(max(4, runs // 4)):
+        n, _, path = images[i % len(images)]
+        output = subprocess.run(
+            [sys.executable, '-c', COLD_SCRIPT.format(base=BASE_DIR, path=path, num_questions=n)],
+            capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()
+        cold.append(float(output[-1]))
+
+    omr_pool.warm_up()
+    warm = []
+    for i in range(runs):
+        n, data, _ = images[i % len(images)]
+        start = time.perf_counter()
+        omr_pool.run(process_sheet, data, n)
+        warm.append(time.perf_counter() - start)
+
+    print(f"{'modo':<8}{'leituras':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    report('frio', cold)
+    report('quente', warm)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 40)
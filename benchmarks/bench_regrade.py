@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+"""
+Recorreção de uma prova após mudança no gabarito: calcular_nota por aluno x regrade_prova
+
+O último caso dá pesos aleatórios às questões, o que espalha as notas (quase
+uma por aluno). O regrade_prova deve fazer um UPDATE (bulk_update) por lote
+de UPDATE_BATCH_SIZE alunos alterados; se passar disso, o script termina
+com código 1.
+
+Usa um banco SQLite temporário (o db.sqlite3 do projeto não é tocado).
+
+Uso: python benchmarks/bench_regrade.py [alunos]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sistema_cadastro.settings')
+
+NUM_QUESTOES = 20
+
+
+def setup_database(path):
+    import django
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = path
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def populate(num_alunos, rng):
+    from cadastro.models import Aluno, GabaritoProva, Professor, Prova, Questao, ResultadoAluno
+
+    professor = Professor.objects.create(nome='Benchmark', email='00000000000@temp.com', cpf='00000000000')
+    key = rng.choice(list('ABCDE'), NUM_QUESTOES)
+    questoes = Questao.objects.bulk_create([
+        Questao(enunciado=f'Questão {q}', alternativa_a='a', alternativa_b='b', alternativa_c='c',
+                alternativa_d='d', alternativa_e='e', resposta_correta=letra,
+                cpf_professor=professor.cpf, disciplina_nome='Benchmark')
+        for q, letra in enumerate(key)
+    ])
+    questoes_ids = [questao.id for questao in questoes]
+    prova = Prova.objects.create(disciplina='Benchmark', professor=professor, quantidade_questoes=NUM_QUESTOES)
+    prova.set_questoes_ids_list(questoes_ids)
+
+    gabarito = GabaritoProva(prova=prova)
+    gabarito.set_respostas_dict({str(q): letra for q, letra in zip(questoes_ids, key)})
+    gabarito.save()
+
+    alunos = Aluno.objects.bulk_create(
+        [Aluno(nome=f'Aluno {i}', email=f'aluno{i}@bench.com') for i in range(num_alunos)])
+
+    resultados = []
+    for aluno in alunos:
+        respostas = np.where(rng.random(NUM_QUESTOES) < 0.7, key, rng.choice(list('ABCDE '), NUM_QUESTOES))
+        resultado = ResultadoAluno(aluno=aluno, prova=prova, acertos=0, total_questoes=NUM_QUESTOES,
+                                   nota_percentual=0)
+        resultado.set_respostas_dict({str(q): letra.strip() for q, letra in zip(questoes_ids, respostas)})
+        resultados.append(resultado)
+    ResultadoAluno.objects.bulk_create(resultados, batch_size=1000)
+    return prova
+
+
+def legacy_regrade(prova):
+    """Caminho antigo: calcular_nota e save() por resultado"""
+    from cadastro.models import ResultadoAluno
+
+    gabarito = prova.gabarito
+    for resultado in ResultadoAluno.objects.filter(prova=prova):
+        acertos, total, nota = gabarito.calcular_nota(resultado.get_respostas_dict())
+        resultado.acertos, resultado.total_questoes, resultado.nota_percentual = acertos, total, nota
+        resultado.save(update_fields=['acertos', 'total_questoes', 'nota_percentual'])
+
+
+MUDANCAS = {
+    'resposta': 'resposta corrigida',
+    'anulacao': 'resposta + anulação',
+    'pesos': 'pesos aleatórios',
+}
+
+
+def change_key(prova, mudanca, rng):
+    gabarito = prova.gabarito
+    respostas = gabarito.get_respostas_dict()
+    primeira = next(iter(respostas))
+    respostas[primeira] = 'A' if respostas[primeira] != 'A' else 'B'
+    gabarito.set_respostas_dict(respostas)
+    gabarito.set_anuladas_list([list(respostas)[1]] if mudanca == 'anulacao' else [])
+    if mudanca == 'pesos':
+        gabarito.set_pesos_dict({q: round(float(peso), 1) for q, peso in zip(respostas, rng.uniform(0.5, 3, len(respostas)))})
+    gabarito.save()
+
+
+def main(num_alunos=5000):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from cadastro.grading import UPDATE_BATCH_SIZE, regrade_prova
+
+    rng = np.random.default_rng(0)
+    prova = populate(num_alunos, rng)
+
+    start = time.perf_counter()
+    recalculo = regrade_prova(prova)
+    print(f"Primeira correção: {recalculo['alterados']}/{recalculo['resultados']} resultados "
+          f"em {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    # SELECT + um UPDATE por lote do bulk_update
+    limite = 1 + -(-num_alunos // UPDATE_BATCH_SIZE)
+    falhas = []
+    print(f"{'mudança':<22}{'calcular_nota (ms)':>20}{'regrade_prova (ms)':>20}{'alterados':>12}{'consultas':>11}")
+    for mudanca, label in MUDANCAS.items():
+        change_key(prova, mudanca, rng)
+        prova.refresh_from_db()
+
+        start = time.perf_counter()
+        legacy_regrade(prova)
+        legacy = (time.perf_counter() - start) * 1000
+
+        # Desfaz o efeito do caminho antigo para medir o regrade sobre notas desatualizadas
+        from cadastro.models import ResultadoAluno
+        ResultadoAluno.objects.filter(prova=prova).update(acertos=0, nota_percentual=0)
+
+        connection.queries_log.clear()  # o caminho antigo encheu o registro de consultas
+        with CaptureQueriesContext(connection) as consultas:
+            start = time.perf_counter()
+            recalculo = regrade_prova(prova)
+            vectorized = (time.perf_counter() - start) * 1000
+        # BEGIN/COMMIT (SAVEPOINT) da transação não contam
+        num_consultas = sum(1 for consulta in consultas.captured_queries
+                            if consulta['sql'].lstrip().upper().startswith(('SELECT', 'UPDATE')))
+
+        print(f"{label:<22}{legacy:>20.0f}{vectorized:>20.0f}{recalculo['alterados']:>12}{num_consultas:>11}")
+        if num_consultas > limite:
+            falhas.append(f"{label}: {num_consultas} consultas para {num_alunos} alunos (limite {limite})")
+
+    for falha in falhas:
+        print(f"REGRESSÃO: {falha}")
+    return 1 if falhas else 0
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_database(os.path.join(tmp, 'bench.sqlite3'))
+        status = main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
+    sys.exit(status)
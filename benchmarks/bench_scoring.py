@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Benchmark da pontuação de bolhas: máscara por alternativa (antigo) x score_bubbles
+
+Uso: python benchmarks/bench_scoring.py [repetições]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import imutils
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cadastro.omr_scoring import score_bubbles
+
+GABARITOS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gabaritos para teste')
+
+
+def legacy_scores(thresh, centers, radius):
+    """Reprodução do laço antigo: uma máscara do tamanho da imagem por alternativa"""
+    filled = []
+    for row in centers:
+        row_filled = []
+        for x, y in row:
+            mask = np.zeros(thresh.shape, dtype=np.uint8)
+            cv2.circle(mask, (x, y), radius, 255, -1)
+            masked = cv2.bitwise_and(thresh, thresh, mask=mask)
+            row_filled.append(cv2.countNonZero(masked))
+        filled.append(row_filled)
+    return np.array(filled)
+
+
+def bubble_sets(num_questions, height):
+    """Conjuntos de bolhas equivalentes aos usados pelas estratégias do OMRProcessor"""
+    if num_questions == 20:
+        start_y = height // 3
+        return {
+            'fixed_20q': ([[(base_x + dx, start_y + row * 45) for dx in (-80, -40, 0, 40, 80)]
+                           for base_x in (250, 750) for row in range(10)], 18),
+            'grid': ([[(x, 400 + i * 35 + 15) for x in xs]
+                      for xs in ([250, 300, 350, 400, 450], [550, 600, 650, 700, 750]) for i in range(10)], 15),
+        }
+    if num_questions == 10:
+        return {
+            'g10': ([[(x, y) for x in (290, 341, 392, 443, 494)] for y in range(355, 878, 58)], 22),
+            'grid': ([[(x, 450 + i * 50 + 20) for x in (450, 500, 550, 600, 650)] for i in range(10)], 20),
+        }
+    if num_questions == 5:
+        return {
+            'g5': ([[(x, y) for x in (452, 503, 554, 605, 656)] for y in (490, 548, 606, 664, 722)], 25),
+            'grid': ([[(x, y + 25) for x in (450, 500, 550, 600, 650)] for y in (475, 540, 605, 670, 735)], 20),
+        }
+    return {
+        'grid': ([[(x, 420 + i * 40 + 17) for x in (450, 500, 550, 600, 650)] for i in range(num_questions)], 20),
+    }
+
+
+def measure(func, repeats):
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = func()
+    elapsed = (time.perf_counter() - start) / repeats
+    return result, elapsed, peak
+
+
+def main(repeats=50):
+    print(f"{'folha':<10}{'estratégia':<12}{'bolhas':>7}{'antigo ms':>11}{'novo ms':>9}"
+          f"{'antigo KB':>11}{'novo KB':>9}")
+    for num_questions in (5, 10, 15, 20):
+        path = os.path.join(GABARITOS_DIR, f'gabarito de {num_questions}.jpg')
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            print(f"Imagem não encontrada: {path}")
+            continue
+
+        width = 1000 if num_questions > 10 else 800
+        gray = imutils.resize(image, width=width)
+        _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+
+        for name, (centers, radius) in bubble_sets(num_questions, thresh.shape[0]).items():
+            old, old_time, old_peak = measure(lambda: legacy_scores(thresh, centers, radius), repeats)
+            new, new_time, new_peak = measure(lambda: score_bubbles(thresh, centers, radius), repeats)
+            if not np.array_equal(old, new):
+                print(f"DIVERGÊNCIA em {num_questions}q/{name}")
+            bubbles = len(centers) * len(centers[0])
+            print(f"{num_questions:<10}{name:<12}{bubbles:>7}{old_time * 1000:>11.2f}{new_time * 1000:>9.2f}"
+                  f"{old_peak / 1024:>11.0f}{new_peak / 1024:>9.0f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+"""
+Gerador de folhas de resposta sintéticas com rótulos, para medir vazão e acerto do OMR
+
+As folhas usam a mesma geometria do registro de formatos (omr_layouts), a
+mesma que visualizar_prova.html imprime e que o leitor procura: marcadores,
+bolhas, letras e números. Cada questão recebe uma marca sorteada (caneta
+cheia, rabisco, marca fraca, rasura, marca dupla ou nada) e a foto passa
+por rotação, perspectiva, iluminação irregular, desfoque, ruído e JPEG.
+
+Ao lado de cada imagem é gravado um JSON no formato lido por bench_omr.py
+({"num_questoes", "formato", "respostas", ...}), com a resposta esperada:
+marcas duplas e rasuras sem outra marca esperam a questão em branco.
+
+Uso: python benchmarks/synthetic_sheets.py SAIDA [--quantidade N] [--formato folha-20]
+                                           [--questoes N] [--semente S] [--processos P]
+Depois: python benchmarks/bench_omr.py --corpus SAIDA --repeticoes 1
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from cadastro.omr_layouts import ALTERNATIVES, get_layout  # noqa: E402
+
+# Pixels da folha por pixel do quadro de referência (~100 dpi em A4 com 1.5)
+RENDER_SCALE = 1.5
+
+# Largura das fotos geradas (o leitor trabalha com 800-1000 px)
+PHOTO_WIDTH = 1200
+
+# Probabilidade de cada tipo de marca por questão
+MARK_KINDS = {
+    'vazia': 0.12,
+    'cheia': 0.50,
+    'rabisco': 0.13,
+    'fraca': 0.08,
+    'rasura': 0.09,  # alternativa apagada + marca em outra
+    'so_rasura': 0.03,  # só a alternativa apagada
+    'dupla': 0.05,
+}
+
+# Cores de caneta/lápis (BGR)
+INKS = ((30, 30, 30), (120, 40, 20), (20, 20, 90), (70, 70, 70))
+
+
+def _expected(kind, choice):
+    return ALTERNATIVES[choice] if kind in ('cheia', 'rabisco', 'fraca', 'rasura') else ''
+
+
+def render_sheet(layout, num_questions, rng, scale=RENDER_SCALE):
+    """
+    Folha limpa de um formato com marcas sorteadas
+
+    Returns:
+        tuple: (imagem BGR, lista de marcas {'tipo', 'alternativas'} por questão,
+                respostas esperadas)
+    """
+    ref_w, ref_h = layout.ref_size
+    image = np.full((round(ref_h * scale), round(ref_w * scale), 3), 255, np.uint8)
+
+    def px(value):
+        return int(round(value * scale))
+
+    for x, y, side in layout.marks:
+        cv2.rectangle(image, (px(x - side / 2), px(y - side / 2)), (px(x + side / 2), px(y + side / 2)), (0, 0, 0), -1)
+
+    cv2.putText(image, 'FOLHA DE RESPOSTAS', (px(ref_w * 0.3), px(60)), cv2.FONT_HERSHEY_SIMPLEX,
+                0.55 * scale, (40, 40, 40), max(1, px(1.2)), cv2.LINE_AA)
+
+    centers = layout.centers(num_questions)
+    radius = layout.radius
+    kinds = list(MARK_KINDS)
+    weights = np.array(list(MARK_KINDS.values()))
+    marks, expected = [], []
+    for q_idx, row in enumerate(centers):
+        for alt_idx, (x, y) in enumerate(row):
+            cv2.circle(image, (px(x), px(y)), px(radius), (90, 90, 90), max(1, px(0.8)), cv2.LINE_AA)
+            cv2.putText(image, ALTERNATIVES[alt_idx], (px(x - radius * 0.45), px(y - radius - 3)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.28 * scale, (60, 60, 60), 1, cv2.LINE_AA)
+        cv2.putText(image, f'{q_idx + 1:02d}', (px(row[0][0] - layout.pitch[0] / 2 - 24), px(row[0][1] + 4)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.32 * scale, (30, 30, 30), 1, cv2.LINE_AA)
+
+        kind = kinds[rng.choice(len(kinds), p=weights / weights.sum())]
+        choice, other = rng.choice(len(ALTERNATIVES), 2, replace=False)
+        ink = INKS[rng.integers(len(INKS))]
+        alternatives = []
+        if kind in ('cheia', 'rasura', 'dupla'):
+            _pen_fill(image, row[choice] * scale, radius * scale, ink, rng)
+            alternatives.append(int(choice))
+        elif kind == 'rabisco':
+            _scribble(image, row[choice] * scale, radius * scale, ink, rng)
+            alternatives.append(int(choice))
+        elif kind == 'fraca':
+            _pen_fill(image, row[choice] * scale, radius * scale, ink, rng, strength=rng.uniform(0.55, 0.75))
+            alternatives.append(int(choice))
+        if kind in ('rasura', 'so_rasura'):
+            _erasure(image, row[other] * scale, radius * scale, rng)
+        if kind == 'dupla':
+            _pen_fill(image, row[other] * scale, radius * scale, ink, rng)
+            alternatives.append(int(other))
+
+        mark = {'tipo': kind, 'alternativas': alternatives}
+        if kind in ('rasura', 'so_rasura'):
+            mark['apagada'] = int(other)
+        marks.append(mark)
+        expected.append(_expected(kind, choice))
+    return image, marks, expected
+
+
+def _patch(image, center, radius):
+    """Recorte (view) em volta de uma bolha e o centro nas coordenadas do recorte"""
+    cx, cy = center
+    x0, y0 = max(0, int(cx - 2 * radius)), max(0, int(cy - 2 * radius))
+    x1, y1 = int(cx + 2 * radius) + 1, int(cy + 2 * radius) + 1
+    return image[y0:y1, x0:x1], np.array([cx - x0, cy - y0])
+
+
+def _pen_fill(image, center, radius, ink, rng, strength=1.0):
+    """Bolha pintada à mão: elipse irregular que cobre 80-100% da bolha, com falhas"""
+    image, center = _patch(image, center, radius)
+    overlay = image.copy()
+    cx, cy = center + rng.normal(0, radius * 0.08, 2)
+    axes = (int(radius * rng.uniform(0.8, 1.05)), int(radius * rng.uniform(0.75, 1.0)))
+    cv2.ellipse(overlay, (int(cx), int(cy)), axes, rng.uniform(0, 180), 0, 360, ink, -1, cv2.LINE_AA)
+    # Falhas de tinta: riscos claros finos atravessando a marca
+    for _ in range(rng.integers(0, 3)):
+        angle = rng.uniform(0, math.pi)
+        dx, dy = math.cos(angle) * radius, math.sin(angle) * radius
+        cv2.line(overlay, (int(cx - dx), int(cy - dy)), (int(cx + dx), int(cy + dy)), (235, 235, 235), 1, cv2.LINE_AA)
+    cv2.addWeighted(overlay, strength, image, 1 - strength, 0, dst=image)
+
+
+def _scribble(image, center, radius, ink, rng):
+    """Marca em zigue-zague (quem não pinta a bolha inteira)"""
+    image, (cx, cy) = _patch(image, center, radius)
+    rows = rng.integers(4, 8)
+    points = []
+    for i in range(rows):
+        y = cy - radius * 0.8 + 1.6 * radius * i / (rows - 1)
+        half = math.sqrt(max(radius ** 2 - (y - cy) ** 2, 0)) * 0.95
+        points.append((cx - half if i % 2 == 0 else cx + half, y))
+    points = np.array(points) + rng.normal(0, radius * 0.05, (rows, 2))
+    cv2.polylines(image, [np.round(points).astype(np.int32)], False, ink,
+                  max(2, int(radius * rng.uniform(0.35, 0.55))), cv2.LINE_AA)
+
+
+def _erasure(image, center, radius, rng):
+    """Marca apagada: resto cinza claro e borrado sobre a bolha"""
+    image, (cx, cy) = _patch(image, center, radius)
+    overlay = image.copy()
+    gray = int(rng.uniform(175, 215))
+    cv2.circle(overlay, (int(cx), int(cy)), int(radius * rng.uniform(0.7, 1.0)), (gray, gray, gray), -1, cv2.LINE_AA)
+    overlay = cv2.GaussianBlur(overlay, (0, 0), radius * 0.3)
+    alpha = rng.uniform(0.5, 0.9)
+    cv2.addWeighted(overlay, alpha, image, 1 - alpha, 0, dst=image)
+
+
+def photograph(image, rng, rotation=None, width=PHOTO_WIDTH):
+    """
+    Simula a foto de celular de uma folha impressa
+
+    Papel sobre fundo escuro, rotação (pequena ou de 90/180/270 graus),
+    perspectiva, gradiente de iluminação com vinheta, desfoque, ruído e
+    compressão JPEG. Perspectiva, rotação e escala viram uma única
+    homografia, aplicada direto na resolução da foto.
+    """
+    h, w = image.shape[:2]
+    pad = int(0.12 * max(h, w))
+    background = tuple(int(v) for v in rng.uniform(60, 140, 3))
+
+    if rotation is None:
+        rotation = rng.normal(0, 4) + rng.choice([0, 90, 180, 270], p=[0.85, 0.05, 0.05, 0.05])
+
+    # Cantos do papel deslocados (perspectiva) e depois girados em torno do centro
+    paper = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+    moved = paper + (rng.uniform(-0.06, 0.06, (4, 2)) * np.float32([w, h])).astype(np.float32)
+    angle = math.radians(rotation)
+    rot = np.array([[math.cos(angle), math.sin(angle)], [-math.sin(angle), math.cos(angle)]], dtype=np.float32)
+    moved = (moved - moved.mean(axis=0)) @ rot.T
+
+    # Enquadramento: papel + margem de fundo, reduzido para a largura da foto
+    x0, y0 = moved.min(axis=0) - pad
+    x1, y1 = moved.max(axis=0) + pad
+    scale = width / (x1 - x0)
+    out_w, out_h = width, int(round((y1 - y0) * scale))
+    target = ((moved - (x0, y0)) * scale).astype(np.float32)
+    matrix = cv2.getPerspectiveTransform(paper, target)
+    photo = cv2.warpPerspective(image, matrix, (out_w, out_h), flags=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR,
+                                borderValue=background)
+
+    # Iluminação: gradiente linear em direção aleatória + vinheta (calculada em
+    # uma grade pequena e ampliada)
+    gh, gw = 32, max(2, round(32 * out_w / out_h))
+    yy, xx = np.mgrid[0:gh, 0:gw].astype(np.float32)
+    yy, xx = yy / (gh - 1), xx / (gw - 1)
+    direction = rng.uniform(0, 2 * math.pi)
+    ramp = xx * math.cos(direction) + yy * math.sin(direction)
+    light = 1 + rng.uniform(0.1, 0.35) * (ramp - ramp.mean())
+    light *= 1 - rng.uniform(0, 0.35) * ((xx - rng.uniform(0.3, 0.7)) ** 2 + (yy - rng.uniform(0.3, 0.7)) ** 2)
+    light = cv2.resize(light * rng.uniform(0.8, 1.05), (out_w, out_h), interpolation=cv2.INTER_LINEAR)
+
+    # Operações do OpenCV com saturação em uint8 (bem mais rápidas que em float no numpy)
+    sigma = rng.uniform(0, 1.3)
+    if sigma > 0.3:
+        photo = cv2.GaussianBlur(photo, (0, 0), sigma)
+    photo = cv2.multiply(photo, cv2.merge([light] * 3), dtype=cv2.CV_8U)
+    noise = np.empty((out_h, out_w), np.int16)
+    cv2.setRNGSeed(int(rng.integers(2 ** 31)))
+    cv2.randn(noise, 0, rng.uniform(2, 9))
+    photo = cv2.add(photo, cv2.merge([noise] * 3), dtype=cv2.CV_8U)
+
+    quality = int(rng.integers(60, 95))
+    _, encoded = cv2.imencode('.jpg', photo, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes(), {'rotacao': round(float(rotation), 2), 'desfoque': round(float(sigma), 2),
+                               'jpeg': quality}
+
+
+def generate_one(args):
+    """Gera e grava uma folha (função de trabalho do pool)"""
+    output, index, layout_name, num_questions, seed = args
+    rng = np.random.default_rng([seed, index])
+    layout = get_layout(layout_name)
+    image, marks, expected = render_sheet(layout, num_questions, rng)
+    data, params = photograph(image, rng)
+
+    name = f'folha_{index:06d}'
+    with open(os.path.join(output, name + '.jpg'), 'wb') as f:
+        f.write(data)
+    with open(os.path.join(output, name + '.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'num_questoes': num_questions,
+            'formato': layout.name,
+            'respostas': expected,
+            'marcas': marks,
+            'foto': params,
+        }, f, ensure_ascii=False)
+    return len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera folhas de resposta sintéticas rotuladas')
+    parser.add_argument('saida', help='Pasta de saída (imagens + JSON)')
+    parser.add_argument('--quantidade', type=int, default=100)
+    parser.add_argument('--formato', default='folha-20', help='Nome do formato em omr_layouts')
+    parser.add_argument('--questoes', type=int, help='Número de questões (padrão: capacidade do formato)')
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--processos', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    layout = get_layout(args.formato)
+    num_questions = min(args.questoes or layout.capacity, layout.capacity)
+    os.makedirs(args.saida, exist_ok=True)
+
+    jobs = [(args.saida, i, layout.name, num_questions, args.semente) for i in range(args.quantidade)]
+    start = time.perf_counter()
+    with Pool(args.processos, initializer=cv2.setNumThreads, initargs=(1,)) as pool:
+        sizes = pool.map(generate_one, jobs, chunksize=max(1, len(jobs) // (args.processos * 8)))
+    elapsed = time.perf_counter() - start
+    print(f"{len(sizes)} folhas {layout.name} ({num_questions} questões) em {elapsed:.1f} s "
+          f"({len(sizes) / elapsed:.0f} folhas/s, {sum(sizes) / len(sizes) / 1024:.0f} KB em média)")
+
+
+if __name__ == '__main__':
+    main()
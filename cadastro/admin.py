@@ -1,7 +1,8 @@
 #configurar o admin do django
 from django.contrib import admin
-from .models import Professor, Disciplina, Aluno
+from .models import Professor, Disciplina, Aluno, Inscricao
 
 admin.site.register(Professor)
 admin.site.register(Disciplina)
-admin.site.register(Aluno)
\ No newline at end of file
+admin.site.register(Aluno)
+admin.site.register(Inscricao)
@@ -0,0 +1,168 @@
+import json
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+
+from .models import ResultadoAluno
+from .omr_layouts import ALTERNATIVES
+
+# Código de cada letra nas matrizes de respostas (-1 = em branco ou inválida)
+ANSWER_CODES = {letra: codigo for codigo, base in enumerate(ALTERNATIVES) for letra in (base, base.lower())}
+
+# Linhas por UPDATE do bulk_update (5 parâmetros por linha, abaixo do limite do SQLite)
+UPDATE_BATCH_SIZE = 190
+
+
+def answer_codes(respostas, questoes_ids):
+    """Respostas {questao_id: letra} de um aluno como vetor de códigos na ordem de questoes_ids"""
+    return [ANSWER_CODES.get(respostas.get(str(questao_id)) or '', -1) for questao_id in questoes_ids]
+
+
+def letter_codes(letras, num_questoes):
+    """Lista de letras (ordem das questões, ex.: leitura OMR) como vetor de códigos com num_questoes posições"""
+    codes = [ANSWER_CODES.get(letra or '', -1) for letra in letras[:num_questoes]]
+    return codes + [-1] * (num_questoes - len(codes))
+
+
+def _load_answers(respostas_json):
+    try:
+        return json.loads(respostas_json)
+    except (TypeError, ValueError):
+        return {}
+
+
+class GradingKey:
+    """
+    Gabarito compilado em vetores para corrigir muitos alunos de uma vez
+
+    credit é a tabela (questões x alternativas + 1) com a fração do peso
+    ganha por cada resposta: 1 na alternativa correta, o crédito parcial
+    configurado nas demais e 0 na última coluna, que é a da questão em
+    branco (o código -1 indexa a última coluna). Questões anuladas valem o
+    peso inteiro para todos; respostas erradas (crédito 0, não em branco)
+    descontam penalty x peso quando há penalização.
+    """
+
+    def __init__(self, questoes_ids, key, weights, annulled, credit, penalty=0.0):
+        self.questoes_ids = questoes_ids
+        self.key = key
+        self.weights = weights
+        self.annulled = annulled
+        self.credit = credit
+        self.penalty = penalty
+
+    def __len__(self):
+        return len(self.key)
+
+    @property
+    def total_points(self):
+        return float(self.weights.sum())
+
+    def answer_matrix(self, respostas_list):
+        """Matriz (alunos x questões) de códigos a partir de dicionários {questao_id: letra}"""
+        code = ANSWER_CODES.get
+        questoes_ids = self.questoes_ids  # já normalizados para str em compile_key
+        return np.array([[code(respostas.get(q) or '', -1) for q in questoes_ids] for respostas in respostas_list],
+                        dtype=np.int8).reshape(len(respostas_list), len(self))
+
+    def score(self, answers):
+        """
+        Corrige todos os alunos de uma vez
+
+        Args:
+            answers: Matriz (alunos x questões) de códigos de resposta
+
+        Returns:
+            tuple: (acertos por aluno, pontos por aluno); os pontos nunca
+                   ficam abaixo de zero
+        """
+        answers = np.asarray(answers, dtype=np.intp).reshape(-1, len(self))
+        credit = self.credit[np.arange(len(self)), answers]
+        credit[:, self.annulled] = 1.0
+
+        acertos = (((answers == self.key) & (self.key >= 0)) | self.annulled).sum(axis=1)
+        pontos = credit @ self.weights
+        if self.penalty:
+            wrong = (credit == 0) & (answers >= 0)
+            pontos = np.maximum(pontos - self.penalty * (wrong @ self.weights), 0.0)
+        return acertos, pontos
+
+    def grade(self, answers, scale=100):
+        """Acertos e nota (pontos / total de pontos x scale) de cada aluno"""
+        acertos, pontos = self.score(answers)
+        total = self.total_points
+        notas = pontos / total * scale if total > 0 else np.zeros(len(pontos))
+        return acertos, notas
+
+
+def compile_key(gabarito, questoes_ids=None):
+    """
+    Compila o gabarito da prova (resposta, peso, anulação e crédito parcial de cada questão)
+
+    Args:
+        gabarito: GabaritoProva
+        questoes_ids: Ordem das questões nas matrizes de respostas (padrão:
+                      a ordem do próprio gabarito)
+
+    Returns:
+        GradingKey
+    """
+    respostas = gabarito.get_respostas_dict()
+    if questoes_ids is None:
+        questoes_ids = list(respostas)
+    questoes_ids = [str(questao_id) for questao_id in questoes_ids]
+    anuladas = {str(questao_id) for questao_id in gabarito.get_anuladas_list()}
+    pesos = gabarito.get_pesos_dict()
+    parciais = gabarito.get_credito_parcial_dict()
+
+    key = np.array([ANSWER_CODES.get(respostas.get(q) or '', -1) for q in questoes_ids], dtype=np.int8)
+    weights = np.array([float(pesos.get(q, 1)) for q in questoes_ids], dtype=np.float64)
+    annulled = np.array([q in anuladas for q in questoes_ids], dtype=bool)
+
+    credit = np.zeros((len(questoes_ids), len(ALTERNATIVES) + 1), dtype=np.float64)
+    for q_idx, questao_id in enumerate(questoes_ids):
+        for letra, fracao in parciais.get(questao_id, {}).items():
+            if letra in ANSWER_CODES:
+                credit[q_idx, ANSWER_CODES[letra]] = float(fracao)
+    answered_key = key >= 0
+    credit[np.flatnonzero(answered_key), key[answered_key]] = 1.0
+
+    return GradingKey(questoes_ids, key, weights, annulled, credit, gabarito.penalidade_erro or 0.0)
+
+
+def regrade_prova(prova):
+    """
+    Recalcula os resultados já gravados de uma prova depois de uma mudança no gabarito
+
+    Todas as respostas guardadas são carregadas em uma matriz, corrigidas
+    de uma vez e só as linhas cuja nota mudou são gravadas, em uma única
+    transação.
+
+    Returns:
+        dict: {'resultados': quantos foram corrigidos, 'alterados': quantos mudaram}
+    """
+    key = compile_key(prova.gabarito)
+    linhas = list(ResultadoAluno.objects.filter(prova=prova).values_list(
+        'id', 'respostas_aluno', 'acertos', 'total_questoes', 'nota_percentual'))
+    if not linhas:
+        return {'resultados': 0, 'alterados': 0}
+
+    answers = key.answer_matrix([_load_answers(respostas) for _, respostas, _, _, _ in linhas])
+    total = len(key)
+    acertos, notas = key.grade(answers)
+    notas = np.round(notas, 2)
+
+    antigos_acertos = np.array([linha[2] for linha in linhas])
+    antigos_totais = np.array([linha[3] for linha in linhas])
+    antigas_notas = np.array([float(linha[4]) for linha in linhas])
+    mudou = (acertos != antigos_acertos) | (antigos_totais != total) | ~np.isclose(notas, antigas_notas)
+
+    alterados = np.flatnonzero(mudou)
+    with transaction.atomic():
+        ResultadoAluno.objects.bulk_update([
+            ResultadoAluno(id=linhas[i][0], acertos=int(acertos[i]), total_questoes=total,
+                           nota_percentual=Decimal(f'{notas[i]:.2f}'))
+            for i in alterados
+        ], ['acertos', 'total_questoes', 'nota_percentual'], batch_size=UPDATE_BATCH_SIZE)
+    return {'resultados': len(linhas), 'alterados': len(alterados)}
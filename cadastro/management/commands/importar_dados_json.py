@@ -0,0 +1,134 @@
+import json
+import os
+
+from django.conf import settings
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from cadastro.models import Aluno, Disciplina, Inscricao, Professor, Questao
+
+DEFAULT_PATH = os.path.join(settings.BASE_DIR, 'temp_storage', 'dados_temp.json')
+
+CAMPOS_QUESTAO = ('enunciado', 'alternativa_a', 'alternativa_b', 'alternativa_c', 'alternativa_d',
+                  'alternativa_e', 'resposta_correta', 'disciplina_nome')
+
+
+def carregar_json(caminho):
+    """Documento do armazenamento JSON antigo, lido uma vez (sem lock: o sistema não grava mais nele)"""
+    if os.path.exists(caminho + '.journal') and os.path.getsize(caminho + '.journal'):
+        raise CommandError(f'{caminho}.journal tem alterações que não estão no arquivo principal; '
+                           'compacte o diário com a versão anterior do sistema antes de importar')
+    with open(caminho, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def _senha_hash(senha):
+    """Senhas do JSON estão em texto puro; as já convertidas são mantidas"""
+    if not senha:
+        return make_password(None)  # sem senha: login impossível
+    try:
+        identify_hasher(senha)
+        return senha
+    except ValueError:
+        return make_password(senha)
+
+
+class Command(BaseCommand):
+    help = ('Importa usuários, disciplinas, alunos, inscrições (com notas) e questões do '
+            'armazenamento JSON antigo para as tabelas do banco')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--arquivo', default=DEFAULT_PATH,
+                            help=f'Arquivo JSON (padrão {DEFAULT_PATH})')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['arquivo']):
+            raise CommandError(f"Arquivo não encontrado: {options['arquivo']}")
+        data = carregar_json(options['arquivo'])
+
+        contagem = {'professores': 0, 'disciplinas': 0, 'alunos': 0, 'inscricoes': 0, 'questoes': 0}
+        ignorados = []
+        with transaction.atomic():
+            professores = self._importar_professores(data, contagem)
+
+            for item in data.get('alunos', []):
+                professor = professores.get(item.get('cpf_professor'))
+                if professor is None:
+                    ignorados.append(f"aluno {item.get('matricula')} sem professor")
+                    continue
+                self._aluno(professor, item, contagem)
+
+            for item in data.get('disciplinas', []):
+                professor = professores.get(item.get('cpf_professor'))
+                if professor is None:
+                    ignorados.append(f"disciplina {item.get('nome')!r} sem professor")
+                    continue
+                disciplina, criada = Disciplina.objects.get_or_create(
+                    professor=professor, nome=item.get('nome', ''), ano=item.get('ano') or '')
+                contagem['disciplinas'] += criada
+                for inscrito in item.get('alunos', []):
+                    _, criada = Inscricao.objects.update_or_create(
+                        aluno=self._aluno(professor, inscrito, contagem),
+                        disciplina=disciplina,
+                        defaults={campo: inscrito.get(campo)
+                                  for campo in ('nota_1va', 'nota_2va', 'nota_3va', 'nota_final')},
+                    )
+                    contagem['inscricoes'] += criada
+
+            for item in data.get('questoes', []):
+                if not item.get('cpf_professor'):
+                    ignorados.append(f"questão {item.get('id')} sem professor")
+                    continue
+                campos = {campo: item.get(campo) or '' for campo in CAMPOS_QUESTAO}
+                campos['resposta_correta'] = campos['resposta_correta'] or 'A'
+                if item.get('id'):
+                    # O ID é o usado nas provas já salvas (ProvaQuestao)
+                    _, criada = Questao.objects.update_or_create(
+                        id=item['id'], defaults={**campos, 'cpf_professor': item['cpf_professor']})
+                else:
+                    _, criada = Questao.objects.get_or_create(
+                        cpf_professor=item['cpf_professor'], disciplina_nome=campos['disciplina_nome'],
+                        enunciado=campos['enunciado'], defaults=campos)
+                contagem['questoes'] += criada
+
+        self.stdout.write(', '.join(f'{quantidade} {nome}' for nome, quantidade in contagem.items()) + ' criados')
+        for item in ignorados:
+            self.stdout.write(self.style.WARNING(f'Ignorado: {item}'))
+        self.stdout.write(self.style.SUCCESS('Importação concluída'))
+
+    def _importar_professores(self, data, contagem):
+        """Usuários (login por CPF) viram professores; devolve {cpf: Professor}"""
+        for item in data.get('professores', []):
+            _, criado = Professor.objects.get_or_create(email=item['email'], defaults={'nome': item['nome']})
+            contagem['professores'] += criado
+
+        professores = {}
+        for item in data.get('usuarios', []):
+            cpf = item['cpf']
+            # Professor criado antes ao salvar uma prova (e-mail provisório) ou pelo formulário de professores
+            professor = (Professor.objects.filter(cpf=cpf).first()
+                         or Professor.objects.filter(email=f'{cpf}@temp.com').first()
+                         or Professor.objects.filter(email=item.get('email'), cpf__isnull=True).first())
+            if professor is None:
+                email = item.get('email')
+                if not email or Professor.objects.filter(email=email).exists():
+                    email = f'{cpf}@temp.com'  # e-mail é único; o CPF é que identifica o professor
+                professor = Professor(email=email)
+                contagem['professores'] += 1
+            elif (professor.email == f'{cpf}@temp.com' and item.get('email')
+                    and not Professor.objects.filter(email=item['email']).exists()):
+                professor.email = item['email']
+            professor.cpf = cpf
+            professor.nome = item.get('nome') or professor.nome
+            professor.rg = item.get('rg') or professor.rg
+            professor.senha = _senha_hash(item.get('senha') or '')
+            professor.save()
+            professores[cpf] = professor
+        return professores
+
+    def _aluno(self, professor, item, contagem):
+        aluno, criado = Aluno.objects.get_or_create(
+            professor=professor, matricula=item['matricula'], defaults={'nome': item.get('nome', '')})
+        contagem['alunos'] += criado
+        return aluno
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from cadastro import omr_cache
+from cadastro.models import OMRCache, OMRJob
+
+
+class Command(BaseCommand):
+    help = 'Mostra o uso do cache de leituras OMR (reenvios da mesma foto) e permite limpá-lo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limpar', action='store_true',
+                            help='Remove todas as leituras guardadas')
+        parser.add_argument('--remover-vencidas', action='store_true',
+                            help='Aplica os limites de idade e de tamanho do cache')
+
+    def handle(self, *args, **options):
+        if options['limpar']:
+            removidas = omr_cache.clear()
+            self.stdout.write(self.style.SUCCESS(f'{removidas} leitura(s) removida(s) do cache'))
+            return
+
+        if options['remover_vencidas']:
+            removidas = omr_cache.evict()
+            self.stdout.write(self.style.SUCCESS(f'{removidas} leitura(s) vencida(s) removida(s)'))
+
+        # Hits e misses persistentes: jobs concluídos a partir do cache x processados
+        jobs = OMRJob.objects.exclude(status=OMRJob.STATUS_ERRO)
+        hits = jobs.filter(do_cache=True).count()
+        misses = jobs.filter(do_cache=False).count()
+        total = hits + misses
+
+        self.stdout.write(f'Leituras guardadas: {OMRCache.objects.count()}')
+        self.stdout.write(f'Leituras reaproveitadas (hits): {hits}')
+        self.stdout.write(f'Leituras processadas (misses): {misses}')
+        if total:
+            self.stdout.write(f'Taxa de acerto do cache: {100 * hits / total:.1f}%')
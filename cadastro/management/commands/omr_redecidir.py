@@ -0,0 +1,98 @@
+import json
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from cadastro.models import OMRFolha
+from cadastro.omr_layouts import ALTERNATIVES
+from cadastro.omr_processor import MARK_FILL_RATIO
+from cadastro.omr_scoring import decide_answers
+
+
+def _answer_indices(respostas, num_questoes):
+    """Letras guardadas como índices (-1 em branco), completando até num_questoes"""
+    indices = np.full(num_questoes, -1, dtype=np.int64)
+    for q_idx, letra in enumerate(respostas[:num_questoes]):
+        if letra:
+            indices[q_idx] = ALTERNATIVES.find(letra.upper())
+    return indices
+
+
+class Command(BaseCommand):
+    help = ('Decide de novo as respostas das folhas OMR guardadas com outro limiar de marcação, '
+            'sem reprocessar as fotos, e mostra quantas respostas mudariam')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limiar', type=float, default=MARK_FILL_RATIO,
+                            help=f'Fração mínima da bolha preenchida (padrão {MARK_FILL_RATIO})')
+        parser.add_argument('--margem', type=float, default=0.0,
+                            help='Diferença mínima para a segunda alternativa; abaixo dela a questão fica em branco')
+        parser.add_argument('--prova', type=int,
+                            help='Considera só as folhas desta prova')
+        parser.add_argument('--versao-motor', type=int,
+                            help='Considera só as folhas lidas por esta versão do motor OMR')
+        parser.add_argument('--aplicar', action='store_true',
+                            help='Grava as novas respostas (sem esta opção só mostra o relatório)')
+
+    def handle(self, *args, **options):
+        folhas = OMRFolha.objects.all()
+        if options['prova']:
+            folhas = folhas.filter(prova_id=options['prova'])
+        if options['versao_motor'] is not None:
+            folhas = folhas.filter(versao_motor=options['versao_motor'])
+
+        # Agrupar por número de questões para decidir cada grupo em um único array
+        grupos = {}
+        for folha_id, num_questoes, preenchimento, respostas in folhas.values_list(
+                'id', 'num_questoes', 'preenchimento', 'respostas').iterator(chunk_size=2000):
+            grupos.setdefault(num_questoes, []).append((folha_id, bytes(preenchimento), respostas))
+
+        total_folhas = total_questoes = 0
+        mudancas = {'alteradas': 0, 'marcadas_para_branco': 0, 'branco_para_marcadas': 0, 'troca_de_letra': 0}
+        folhas_afetadas = []
+        for num_questoes, linhas in grupos.items():
+            ids = [folha_id for folha_id, _, _ in linhas]
+            fills = np.frombuffer(b''.join(dados for _, dados, _ in linhas), dtype='<f2')
+            fills = fills.reshape(len(linhas), num_questoes, len(ALTERNATIVES)).astype(np.float64)
+
+            antigas = np.stack([
+                _answer_indices(json.loads(respostas or '[]'), num_questoes)
+                for _, _, respostas in linhas
+            ])
+            novas = decide_answers(fills, options['limiar'], options['margem'])
+
+            # Questões sem medidas (leitura alternativa) mantêm a resposta guardada
+            lidas = ~np.isnan(fills).any(axis=2)
+            novas = np.where(lidas, novas, antigas)
+
+            mudou = novas != antigas
+            mudancas['alteradas'] += int(mudou.sum())
+            mudancas['marcadas_para_branco'] += int((mudou & (novas < 0)).sum())
+            mudancas['branco_para_marcadas'] += int((mudou & (antigas < 0)).sum())
+            mudancas['troca_de_letra'] += int((mudou & (novas >= 0) & (antigas >= 0)).sum())
+            total_folhas += len(linhas)
+            total_questoes += novas.size
+
+            for linha in np.flatnonzero(mudou.any(axis=1)):
+                letras = ['' if idx < 0 else ALTERNATIVES[idx] for idx in novas[linha]]
+                folhas_afetadas.append((ids[linha], letras))
+
+        self.stdout.write(f'Folhas analisadas: {total_folhas} ({total_questoes} questões)')
+        self.stdout.write(f"Limiar: {options['limiar']}  margem: {options['margem']}")
+        self.stdout.write(f"Respostas alteradas: {mudancas['alteradas']} em {len(folhas_afetadas)} folha(s)")
+        self.stdout.write(f"  marcadas -> em branco: {mudancas['marcadas_para_branco']}")
+        self.stdout.write(f"  em branco -> marcadas: {mudancas['branco_para_marcadas']}")
+        self.stdout.write(f"  troca de alternativa: {mudancas['troca_de_letra']}")
+
+        if not options['aplicar']:
+            return
+
+        atualizadas = []
+        for folha_id, letras in folhas_afetadas:
+            folha = OMRFolha(id=folha_id, limiar=options['limiar'])
+            folha.set_respostas_list(letras)
+            atualizadas.append(folha)
+        with transaction.atomic():
+            OMRFolha.objects.bulk_update(atualizadas, ['respostas', 'limiar'], batch_size=500)
+        self.stdout.write(self.style.SUCCESS(f'{len(atualizadas)} folha(s) atualizada(s)'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from cadastro import omr_jobs
+
+
+class Command(BaseCommand):
+    help = 'Processa a fila de leituras OMR (use com OMR_INLINE_WORKER = False nos processos web)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Processa os jobs pendentes e encerra')
+        parser.add_argument('--limpar-imagens', action='store_true',
+                            help='Descarta as fotos dos jobs mais antigos que OMR_IMAGEM_RETENCAO e encerra')
+
+    def handle(self, *args, **options):
+        if options['limpar_imagens']:
+            descartadas = omr_jobs.purge_images()
+            self.stdout.write(self.style.SUCCESS(f'{descartadas} foto(s) de jobs OMR descartada(s)'))
+            return
+
+        if options['once']:
+            processed = omr_jobs.run_worker(once=True)
+            self.stdout.write(self.style.SUCCESS(f'{processed} job(s) OMR processado(s)'))
+            return
+
+        self.stdout.write('Worker OMR aguardando jobs (Ctrl+C para sair)...')
+        try:
+            omr_jobs.run_worker()
+        except KeyboardInterrupt:
+            self.stdout.write('Worker OMR encerrado')
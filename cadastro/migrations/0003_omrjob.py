@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cadastro', '0002_prova_gabaritoprova_resultadoaluno'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OMRJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('aluno_matricula', models.CharField(blank=True, max_length=20)),
+                ('avaliacao', models.CharField(blank=True, max_length=10)),
+                ('num_questoes', models.IntegerField()),
+                ('imagem', models.BinaryField()),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('concluido', 'Concluído'), ('erro', 'Erro')], db_index=True, default='pendente', max_length=12)),
+                ('progresso', models.IntegerField(default=0)),
+                ('resultado', models.TextField(blank=True)),
+                ('erro', models.TextField(blank=True)),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('data_inicio', models.DateTimeField(blank=True, null=True)),
+                ('data_conclusao', models.DateTimeField(blank=True, null=True)),
+                ('prova', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='omr_jobs', to='cadastro.prova')),
+            ],
+            options={
+                'verbose_name': 'Leitura OMR',
+                'verbose_name_plural': 'Leituras OMR',
+                'ordering': ['data_criacao'],
+            },
+        ),
+    ]
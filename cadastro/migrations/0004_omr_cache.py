@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cadastro', '0003_omrjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='omrjob',
+            name='do_cache',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='OMRCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('imagem_hash', models.CharField(max_length=64)),
+                ('layout', models.CharField(max_length=30)),
+                ('num_questoes', models.IntegerField()),
+                ('versao_motor', models.IntegerField()),
+                ('leitura', models.TextField()),
+                ('usos', models.IntegerField(default=0)),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('ultimo_acesso', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Cache de leitura OMR',
+                'verbose_name_plural': 'Cache de leituras OMR',
+                'unique_together': {('imagem_hash', 'layout', 'num_questoes', 'versao_motor')},
+            },
+        ),
+    ]
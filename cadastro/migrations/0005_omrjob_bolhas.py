@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cadastro', '0004_omr_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='omrjob',
+            name='bolhas',
+            field=models.TextField(blank=True),
+        ),
+    ]
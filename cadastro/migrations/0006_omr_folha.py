@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cadastro', '0005_omrjob_bolhas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OMRFolha',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('aluno_matricula', models.CharField(blank=True, max_length=20)),
+                ('layout', models.CharField(max_length=30)),
+                ('versao_motor', models.IntegerField()),
+                ('num_questoes', models.IntegerField()),
+                ('preenchimento', models.BinaryField()),
+                ('respostas', models.TextField()),
+                ('limiar', models.FloatField(blank=True, null=True)),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('aluno', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='folhas_omr', to='cadastro.aluno')),
+                ('job', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='folha', to='cadastro.omrjob')),
+                ('prova', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='folhas_omr', to='cadastro.prova')),
+            ],
+            options={
+                'verbose_name': 'Folha OMR lida',
+                'verbose_name_plural': 'Folhas OMR lidas',
+                'indexes': [models.Index(fields=['prova', 'versao_motor'], name='cadastro_om_prova_i_f1d495_idx')],
+            },
+        ),
+    ]
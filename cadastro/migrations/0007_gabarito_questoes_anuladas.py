@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cadastro', '0006_omr_folha'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gabaritoprova',
+            name='questoes_anuladas',
+            field=models.TextField(blank=True, default='[]'),
+        ),
+    ]
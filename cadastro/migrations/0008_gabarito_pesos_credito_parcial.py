@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cadastro', '0007_gabarito_questoes_anuladas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gabaritoprova',
+            name='credito_parcial',
+            field=models.TextField(blank=True, default='{}'),
+        ),
+        migrations.AddField(
+            model_name='gabaritoprova',
+            name='penalidade_erro',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='gabaritoprova',
+            name='pesos',
+            field=models.TextField(blank=True, default='{}'),
+        ),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:42
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copiar_inscricoes(apps, schema_editor):
+    """Inscrições da tabela automática do ManyToMany antigo vão para Inscricao (sem notas)"""
+    Aluno = apps.get_model('cadastro', 'Aluno')
+    Inscricao = apps.get_model('cadastro', 'Inscricao')
+    Antiga = Aluno.disciplinas.through
+    Inscricao.objects.bulk_create([
+        Inscricao(aluno_id=aluno_id, disciplina_id=disciplina_id)
+        for aluno_id, disciplina_id in Antiga.objects.values_list('aluno_id', 'disciplina_id')
+    ])
+
+
+def preencher_cpf(apps, schema_editor):
+    """Professores criados ao salvar provas têm o e-mail provisório <cpf>@temp.com"""
+    Professor = apps.get_model('cadastro', 'Professor')
+    for professor in Professor.objects.filter(cpf__isnull=True, email__endswith='@temp.com'):
+        match = re.fullmatch(r'(\d{11})@temp\.com', professor.email)
+        if match and not Professor.objects.filter(cpf=match.group(1)).exists():
+            professor.cpf = match.group(1)
+            professor.save(update_fields=['cpf'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cadastro', '0008_gabarito_pesos_credito_parcial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='professor',
+            name='cpf',
+            field=models.CharField(blank=True, max_length=11, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='professor',
+            name='rg',
+            field=models.CharField(blank=True, max_length=7),
+        ),
+        migrations.AddField(
+            model_name='professor',
+            name='senha',
+            field=models.CharField(blank=True, max_length=128),
+        ),
+        migrations.RunPython(preencher_cpf, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='disciplina',
+            name='ano',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='disciplina',
+            index=models.Index(fields=['professor', 'nome'], name='cadastro_di_profess_8ee4a8_idx'),
+        ),
+        migrations.AddField(
+            model_name='aluno',
+            name='matricula',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='aluno',
+            name='professor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alunos', to='cadastro.professor'),
+        ),
+        migrations.AlterField(
+            model_name='aluno',
+            name='email',
+            field=models.EmailField(blank=True, max_length=254, null=True, unique=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='aluno',
+            unique_together={('professor', 'matricula')},
+        ),
+        migrations.CreateModel(
+            name='Inscricao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nota_1va', models.FloatField(blank=True, null=True)),
+                ('nota_2va', models.FloatField(blank=True, null=True)),
+                ('nota_3va', models.FloatField(blank=True, null=True)),
+                ('nota_final', models.FloatField(blank=True, null=True)),
+                ('aluno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inscricoes', to='cadastro.aluno')),
+                ('disciplina', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inscricoes', to='cadastro.disciplina')),
+            ],
+            options={
+                'verbose_name': 'Inscrição',
+                'verbose_name_plural': 'Inscrições',
+                'unique_together': {('aluno', 'disciplina')},
+            },
+        ),
+        # O Django não troca um ManyToMany por um com through=: copia, remove e recria
+        migrations.RunPython(copiar_inscricoes, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='aluno',
+            name='disciplinas',
+        ),
+        migrations.AddField(
+            model_name='aluno',
+            name='disciplinas',
+            field=models.ManyToManyField(related_name='alunos', through='cadastro.Inscricao', to='cadastro.disciplina'),
+        ),
+        migrations.AddIndex(
+            model_name='questao',
+            index=models.Index(fields=['cpf_professor', 'disciplina_nome'], name='cadastro_qu_cpf_pro_e41bec_idx'),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:48
+
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copiar_questoes(apps, schema_editor):
+    """Prova.questoes_ids (JSON) -> ProvaQuestao, com os pontos tirados dos pesos do gabarito"""
+    Prova = apps.get_model('cadastro', 'Prova')
+    Questao = apps.get_model('cadastro', 'Questao')
+    GabaritoProva = apps.get_model('cadastro', 'GabaritoProva')
+    ProvaQuestao = apps.get_model('cadastro', 'ProvaQuestao')
+
+    existentes = set(Questao.objects.values_list('id', flat=True))
+    pesos = {}
+    for prova_id, pesos_json in GabaritoProva.objects.values_list('prova_id', 'pesos'):
+        try:
+            pesos[prova_id] = json.loads(pesos_json or '{}')
+        except ValueError:
+            pesos[prova_id] = {}
+
+    itens = []
+    for prova_id, questoes_ids in Prova.objects.values_list('id', 'questoes_ids'):
+        try:
+            questoes_ids = json.loads(questoes_ids or '[]')
+        except ValueError:
+            questoes_ids = []
+        vistas = set()
+        for questao_id in questoes_ids:
+            questao_id = int(questao_id)
+            # Questões excluídas depois da prova já não apareciam nela
+            if questao_id not in existentes or questao_id in vistas:
+                continue
+            vistas.add(questao_id)
+            itens.append(ProvaQuestao(
+                prova_id=prova_id, questao_id=questao_id, posicao=len(vistas),
+                pontos=float(pesos.get(prova_id, {}).get(str(questao_id), 1)),
+            ))
+    ProvaQuestao.objects.bulk_create(itens, batch_size=1000)
+
+
+def restaurar_questoes_ids(apps, schema_editor):
+    Prova = apps.get_model('cadastro', 'Prova')
+    ProvaQuestao = apps.get_model('cadastro', 'ProvaQuestao')
+    ids = {}
+    for prova_id, questao_id in ProvaQuestao.objects.order_by('prova_id', 'posicao').values_list('prova_id', 'questao_id'):
+        ids.setdefault(prova_id, []).append(questao_id)
+    for prova in Prova.objects.all():
+        prova.questoes_ids = json.dumps(ids.get(prova.id, []))
+        prova.save(update_fields=['questoes_ids'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cadastro', '0009_dados_relacionais'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProvaQuestao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicao', models.PositiveIntegerField()),
+                ('pontos', models.FloatField(default=1)),
+                ('prova', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itens', to='cadastro.prova')),
+                ('questao', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='itens_prova', to='cadastro.questao')),
+            ],
+            options={
+                'verbose_name': 'Questão da prova',
+                'verbose_name_plural': 'Questões das provas',
+                'ordering': ['posicao'],
+                'unique_together': {('prova', 'posicao'), ('prova', 'questao')},
+            },
+        ),
+        migrations.AddField(
+            model_name='prova',
+            name='questoes',
+            field=models.ManyToManyField(related_name='provas', through='cadastro.ProvaQuestao', to='cadastro.questao'),
+        ),
+        migrations.RunPython(copiar_questoes, restaurar_questoes_ids),
+        migrations.RemoveField(
+            model_name='prova',
+            name='questoes_ids',
+        ),
+    ]
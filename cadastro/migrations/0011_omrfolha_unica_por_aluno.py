@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:06
+
+from django.db import migrations, models
+
+
+def remover_repetidas(apps, schema_editor):
+    """Fica só a folha mais recente de cada aluno por prova; as restantes ganham o aluno (FK)"""
+    OMRFolha = apps.get_model('cadastro', 'OMRFolha')
+    Aluno = apps.get_model('cadastro', 'Aluno')
+
+    mais_recente = {}
+    repetidas = []
+    for folha_id, prova_id, matricula in (OMRFolha.objects.exclude(aluno_matricula='')
+                                          .order_by('-id').values_list('id', 'prova_id', 'aluno_matricula')):
+        if (prova_id, matricula) in mais_recente:
+            repetidas.append(folha_id)
+        else:
+            mais_recente[(prova_id, matricula)] = folha_id
+    OMRFolha.objects.filter(id__in=repetidas).delete()
+
+    for folha in OMRFolha.objects.exclude(aluno_matricula='').filter(aluno__isnull=True).select_related('prova'):
+        folha.aluno = Aluno.objects.filter(
+            professor_id=folha.prova.professor_id, matricula=folha.aluno_matricula).first()
+        if folha.aluno:
+            folha.save(update_fields=['aluno'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cadastro', '0010_prova_questoes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remover_repetidas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='omrfolha',
+            constraint=models.UniqueConstraint(condition=models.Q(('aluno_matricula', ''), _negated=True), fields=('prova', 'aluno_matricula'), name='omrfolha_unica_por_aluno'),
+        ),
+    ]
@@ -1,29 +1,68 @@
 # BANCO DE DADOS 
 
 from django.db import models
+from django.utils import timezone
 
 class Professor(models.Model):
     nome = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
+    cpf = models.CharField(max_length=11, unique=True, null=True, blank=True)  # Login (sessão 'usuario')
+    rg = models.CharField(max_length=7, blank=True)
+    senha = models.CharField(max_length=128, blank=True)  # Hash (django.contrib.auth.hashers)
 
     def __str__(self):
         return self.nome
 
 class Disciplina(models.Model):
     nome = models.CharField(max_length=100)
+    ano = models.CharField(max_length=10, blank=True)
     professor = models.ForeignKey(Professor, on_delete=models.CASCADE, related_name='disciplinas')
 
     def __str__(self):
         return self.nome
 
+    class Meta:
+        indexes = [models.Index(fields=['professor', 'nome'])]
+
 class Aluno(models.Model):
     nome = models.CharField(max_length=100)
-    email = models.EmailField(unique=True)
-    disciplinas = models.ManyToManyField(Disciplina, related_name='alunos')
+    email = models.EmailField(unique=True, null=True, blank=True)
+    matricula = models.CharField(max_length=20, blank=True)
+    professor = models.ForeignKey(Professor, on_delete=models.CASCADE, null=True, blank=True, related_name='alunos')
+    disciplinas = models.ManyToManyField(Disciplina, through='Inscricao', related_name='alunos')
 
     def __str__(self):
         return self.nome
 
+    class Meta:
+        # Cada professor cadastra os próprios alunos (a mesma matrícula pode aparecer para outro professor)
+        unique_together = ['professor', 'matricula']
+
+class Inscricao(models.Model):
+    """Aluno inscrito em uma disciplina, com as notas das avaliações"""
+    aluno = models.ForeignKey(Aluno, on_delete=models.CASCADE, related_name='inscricoes')
+    disciplina = models.ForeignKey(Disciplina, on_delete=models.CASCADE, related_name='inscricoes')
+    nota_1va = models.FloatField(null=True, blank=True)
+    nota_2va = models.FloatField(null=True, blank=True)
+    nota_3va = models.FloatField(null=True, blank=True)
+    nota_final = models.FloatField(null=True, blank=True)
+
+    # Nome da avaliação (enviado pelo aplicar_nota_omr) -> campo da nota
+    CAMPOS_NOTA = {
+        '1VA': 'nota_1va',
+        '2VA': 'nota_2va',
+        '3VA': 'nota_3va',
+        'Final': 'nota_final',
+    }
+
+    def __str__(self):
+        return f"{self.aluno} - {self.disciplina}"
+
+    class Meta:
+        verbose_name = "Inscrição"
+        verbose_name_plural = "Inscrições"
+        unique_together = ['aluno', 'disciplina']
+
 class Questao(models.Model):
     ALTERNATIVAS_CHOICES = [
         ('A', 'A'),
@@ -50,6 +89,7 @@ class Questao(models.Model):
     class Meta:
         verbose_name = "Questão"
         verbose_name_plural = "Questões"
+        indexes = [models.Index(fields=['cpf_professor', 'disciplina_nome'])]
 
 class Prova(models.Model):
     titulo = models.CharField(max_length=200, default="Prova")
@@ -57,32 +97,56 @@ class Prova(models.Model):
     professor = models.ForeignKey(Professor, on_delete=models.CASCADE, related_name='provas')
     quantidade_questoes = models.IntegerField()
     data_criacao = models.DateTimeField(auto_now_add=True)
-    questoes_ids = models.TextField()
+    questoes = models.ManyToManyField(Questao, through='ProvaQuestao', related_name='provas')
 
     def __str__(self):
         return f"{self.titulo} - {self.disciplina} ({self.quantidade_questoes} questões)"
     
     def get_questoes_ids_list(self):
-        """Retorna a lista de IDs das questões"""
-        import json
-        try:
-            return json.loads(self.questoes_ids)
-        except:
-            return []
+        """Retorna a lista de IDs das questões, na ordem da prova (usa prefetch_related('itens') se houver)"""
+        return [item.questao_id for item in self.itens.all()]
     
     def set_questoes_ids_list(self, ids_list):
-        """Define a lista de IDs das questões"""
-        import json
-        self.questoes_ids = json.dumps(ids_list)
+        """Define as questões da prova, na ordem da lista (a prova já deve estar salva)"""
+        self.itens.all().delete()
+        ProvaQuestao.objects.bulk_create([
+            ProvaQuestao(prova=self, questao_id=questao_id, posicao=posicao)
+            for posicao, questao_id in enumerate(ids_list, start=1)
+        ])
+    
+    def get_questoes_list(self):
+        """Retorna as questões na ordem da prova, em uma única consulta"""
+        return [item.questao for item in self.itens.select_related('questao')]
     
     class Meta:
         verbose_name = "Prova"
         verbose_name_plural = "Provas"
         ordering = ['-data_criacao']
 
+class ProvaQuestao(models.Model):
+    """Questão de uma prova, na posição em que aparece (e na folha de respostas)"""
+    prova = models.ForeignKey(Prova, on_delete=models.CASCADE, related_name='itens')
+    # Questões usadas em provas não podem ser excluídas: mudariam a numeração e o gabarito
+    questao = models.ForeignKey(Questao, on_delete=models.PROTECT, related_name='itens_prova')
+    posicao = models.PositiveIntegerField()  # 1 = primeira questão
+    pontos = models.FloatField(default=1)  # Mesmo valor do peso em GabaritoProva.pesos
+    
+    def __str__(self):
+        return f"{self.prova_id} - questão {self.posicao}"
+    
+    class Meta:
+        verbose_name = "Questão da prova"
+        verbose_name_plural = "Questões das provas"
+        ordering = ['posicao']
+        unique_together = [['prova', 'posicao'], ['prova', 'questao']]
+
 class GabaritoProva(models.Model):
     prova = models.OneToOneField(Prova, on_delete=models.CASCADE, related_name='gabarito')
     respostas_corretas = models.TextField()
+    questoes_anuladas = models.TextField(default='[]', blank=True)  # JSON com os IDs das questões anuladas
+    pesos = models.TextField(default='{}', blank=True)  # JSON {questao_id: peso}; ausentes valem 1
+    credito_parcial = models.TextField(default='{}', blank=True)  # JSON {questao_id: {letra: fração do peso}}
+    penalidade_erro = models.FloatField(default=0)  # Fração do peso descontada por resposta errada
     data_criacao = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -101,23 +165,76 @@ class GabaritoProva(models.Model):
         import json
         self.respostas_corretas = json.dumps(respostas_dict)
     
+    def get_anuladas_list(self):
+        """Retorna a lista de IDs das questões anuladas"""
+        import json
+        try:
+            return json.loads(self.questoes_anuladas)
+        except:
+            return []
+    
+    def set_anuladas_list(self, anuladas_list):
+        """Define a lista de IDs das questões anuladas"""
+        import json
+        self.questoes_anuladas = json.dumps([str(questao_id) for questao_id in anuladas_list])
+    
+    def get_pesos_dict(self):
+        """Retorna o dicionário de pesos {questao_id: peso} (questões ausentes valem 1)"""
+        import json
+        try:
+            return json.loads(self.pesos)
+        except:
+            return {}
+    
+    def set_pesos_dict(self, pesos_dict):
+        """Define o dicionário de pesos"""
+        import json
+        self.pesos = json.dumps({str(questao_id): peso for questao_id, peso in pesos_dict.items()})
+    
+    def get_credito_parcial_dict(self):
+        """Retorna o crédito parcial {questao_id: {letra: fração do peso}}"""
+        import json
+        try:
+            return json.loads(self.credito_parcial)
+        except:
+            return {}
+    
+    def set_credito_parcial_dict(self, credito_dict):
+        """Define o crédito parcial"""
+        import json
+        self.credito_parcial = json.dumps({
+            str(questao_id): {letra.upper(): fracao for letra, fracao in creditos.items()}
+            for questao_id, creditos in credito_dict.items()
+        })
+    
     def calcular_nota(self, respostas_aluno):
         """
         Calcula a nota do aluno baseado nas respostas
         respostas_aluno: dict {questao_id: resposta_aluno}
         retorna: (acertos, total_questoes, nota_percentual)
+        Questões anuladas contam como acerto para todos; a nota considera
+        pesos, crédito parcial e penalização (ver grading.GradingKey).
         """
-        gabarito = self.get_respostas_dict()
-        total_questoes = len(gabarito)
-        acertos = 0
+        from .grading import compile_key
         
-        for questao_id, resposta_correta in gabarito.items():
-            resposta_aluno = respostas_aluno.get(str(questao_id), '')
-            if resposta_aluno.upper() == resposta_correta.upper():
-                acertos += 1
+        key = compile_key(self)
+        acertos, notas = key.grade(key.answer_matrix([respostas_aluno]))
+        return int(acertos[0]), len(key), round(float(notas[0]), 2)
+    
+    def calcular_nota_omr(self, respostas_detectadas, questoes_ids):
+        """
+        Calcula a nota de uma leitura OMR
+        respostas_detectadas: lista de letras na ordem das questões da prova
+        questoes_ids: IDs das questões na mesma ordem
+        retorna: (acertos, total_questoes, nota de 0 a 10)
+        Questões anuladas contam como acerto para todos; a nota considera
+        pesos, crédito parcial e penalização (ver grading.GradingKey).
+        """
+        from .grading import compile_key, letter_codes
         
-        nota_percentual = (acertos / total_questoes * 100) if total_questoes > 0 else 0
-        return acertos, total_questoes, round(nota_percentual, 2)
+        key = compile_key(self, questoes_ids)
+        acertos, notas = key.grade([letter_codes(respostas_detectadas, len(key))], scale=10)
+        return int(acertos[0]), len(key), round(float(notas[0]), 1)
     
     class Meta:
         verbose_name = "Gabarito da Prova"
@@ -152,4 +269,172 @@ class ResultadoAluno(models.Model):
         verbose_name = "Resultado do Aluno"
         verbose_name_plural = "Resultados dos Alunos"
         unique_together = ['aluno', 'prova'] 
-        ordering = ['-data_realizacao']
\ No newline at end of file
+        ordering = ['-data_realizacao']
+
+class OMRJob(models.Model):
+    """Leitura OMR enfileirada para processamento em segundo plano"""
+    STATUS_PENDENTE = 'pendente'
+    STATUS_PROCESSANDO = 'processando'
+    STATUS_CONCLUIDO = 'concluido'
+    STATUS_ERRO = 'erro'
+    STATUS_CHOICES = [
+        (STATUS_PENDENTE, 'Pendente'),
+        (STATUS_PROCESSANDO, 'Processando'),
+        (STATUS_CONCLUIDO, 'Concluído'),
+        (STATUS_ERRO, 'Erro'),
+    ]
+    
+    prova = models.ForeignKey(Prova, on_delete=models.CASCADE, related_name='omr_jobs')
+    aluno_matricula = models.CharField(max_length=20, blank=True)
+    avaliacao = models.CharField(max_length=10, blank=True)
+    num_questoes = models.IntegerField()
+    imagem = models.BinaryField()  # Bytes enviados, para a sobreposição (omr_overlay); descartados após OMR_IMAGEM_RETENCAO
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default=STATUS_PENDENTE, db_index=True)
+    progresso = models.IntegerField(default=0)
+    resultado = models.TextField(blank=True)  # JSON com o mesmo formato da resposta de processar_omr
+    bolhas = models.TextField(blank=True)  # JSON com centros e preenchimento lidos (OMRProcessor.last_bubbles)
+    erro = models.TextField(blank=True)
+    data_criacao = models.DateTimeField(auto_now_add=True)
+    data_inicio = models.DateTimeField(null=True, blank=True)
+    data_conclusao = models.DateTimeField(null=True, blank=True)
+    do_cache = models.BooleanField(default=False)  # Leitura reaproveitada de uma imagem idêntica (omr_cache)
+    
+    def __str__(self):
+        return f"OMR #{self.id} - {self.prova_id} ({self.get_status_display()})"
+    
+    def get_resultado_dict(self):
+        """Retorna o dicionário do resultado"""
+        import json
+        try:
+            return json.loads(self.resultado)
+        except:
+            return {}
+    
+    def set_resultado_dict(self, resultado_dict):
+        """Define o dicionário do resultado"""
+        import json
+        self.resultado = json.dumps(resultado_dict)
+    
+    def get_bolhas_dict(self):
+        """Retorna o dicionário das bolhas lidas"""
+        import json
+        try:
+            return json.loads(self.bolhas)
+        except:
+            return {}
+    
+    def set_bolhas_dict(self, bolhas_dict):
+        """Define o dicionário das bolhas lidas"""
+        import json
+        self.bolhas = json.dumps(bolhas_dict) if bolhas_dict else ''
+    
+    @property
+    def tempo_fila(self):
+        """Segundos entre o envio e o início do processamento"""
+        if not self.data_inicio:
+            return None
+        return (self.data_inicio - self.data_criacao).total_seconds()
+    
+    @property
+    def tempo_processamento(self):
+        """Segundos gastos no processamento"""
+        if not self.data_inicio or not self.data_conclusao:
+            return None
+        return (self.data_conclusao - self.data_inicio).total_seconds()
+    
+    class Meta:
+        verbose_name = "Leitura OMR"
+        verbose_name_plural = "Leituras OMR"
+        ordering = ['data_criacao']
+
+
+class OMRCache(models.Model):
+    """Leitura OMR já feita para o conteúdo de uma imagem (reaproveitada em reenvios)"""
+    imagem_hash = models.CharField(max_length=64)  # SHA-256 dos bytes enviados
+    layout = models.CharField(max_length=30)
+    num_questoes = models.IntegerField()
+    versao_motor = models.IntegerField()
+    leitura = models.TextField()  # JSON devolvido por process_sheet
+    usos = models.IntegerField(default=0)  # Quantas vezes a leitura foi reaproveitada
+    data_criacao = models.DateTimeField(auto_now_add=True)
+    ultimo_acesso = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    def __str__(self):
+        return f"{self.imagem_hash[:12]} - {self.layout} ({self.num_questoes} questões)"
+    
+    def get_leitura_dict(self):
+        """Retorna o dicionário da leitura"""
+        import json
+        try:
+            return json.loads(self.leitura)
+        except:
+            return {}
+    
+    def set_leitura_dict(self, leitura_dict):
+        """Define o dicionário da leitura"""
+        import json
+        self.leitura = json.dumps(leitura_dict)
+    
+    class Meta:
+        verbose_name = "Cache de leitura OMR"
+        verbose_name_plural = "Cache de leituras OMR"
+        unique_together = ['imagem_hash', 'layout', 'num_questoes', 'versao_motor']
+
+
+class OMRFolha(models.Model):
+    """
+    Medidas de uma folha já lida (matriz de preenchimento das bolhas)
+    
+    Guardadas para que uma mudança no limiar de marcação seja aplicada às
+    folhas já enviadas sem pedir a foto de novo (comando omr_redecidir).
+    """
+    prova = models.ForeignKey(Prova, on_delete=models.CASCADE, related_name='folhas_omr')
+    aluno = models.ForeignKey(Aluno, on_delete=models.SET_NULL, null=True, blank=True, related_name='folhas_omr')
+    aluno_matricula = models.CharField(max_length=20, blank=True)
+    job = models.OneToOneField(OMRJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='folha')
+    layout = models.CharField(max_length=30)
+    versao_motor = models.IntegerField()
+    num_questoes = models.IntegerField()
+    preenchimento = models.BinaryField()  # float16 little-endian, questões x 5 (NaN = questão não lida)
+    respostas = models.TextField()  # JSON com as letras decididas (na ordem das questões)
+    limiar = models.FloatField(null=True, blank=True)  # Limiar da última redecisão (vazio = decisão do motor)
+    data_criacao = models.DateTimeField(auto_now_add=True)
+    
+    ALTERNATIVAS = 5
+    
+    def __str__(self):
+        return f"Folha OMR #{self.id} - {self.prova_id} ({self.layout})"
+    
+    def get_preenchimento_array(self):
+        """Retorna a matriz de preenchimento (questões x alternativas)"""
+        import numpy as np
+        return np.frombuffer(bytes(self.preenchimento), dtype='<f2').reshape(
+            self.num_questoes, self.ALTERNATIVAS).astype(np.float64)
+    
+    def set_preenchimento_array(self, preenchimento):
+        """Define a matriz de preenchimento (questões x alternativas)"""
+        import numpy as np
+        self.preenchimento = np.ascontiguousarray(preenchimento, dtype='<f2').tobytes()
+    
+    def get_respostas_list(self):
+        """Retorna a lista de respostas decididas"""
+        import json
+        try:
+            return json.loads(self.respostas)
+        except:
+            return []
+    
+    def set_respostas_list(self, respostas_list):
+        """Define a lista de respostas decididas"""
+        import json
+        self.respostas = json.dumps(respostas_list)
+    
+    class Meta:
+        verbose_name = "Folha OMR lida"
+        verbose_name_plural = "Folhas OMR lidas"
+        indexes = [models.Index(fields=['prova', 'versao_motor'])]
+        constraints = [
+            # Uma folha por aluno em cada prova (folhas sem matrícula não entram)
+            models.UniqueConstraint(fields=['prova', 'aluno_matricula'], condition=~models.Q(aluno_matricula=''),
+                                    name='omrfolha_unica_por_aluno'),
+        ]
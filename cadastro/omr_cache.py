@@ -0,0 +1,244 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OMRCache
+from .omr_layouts import layout_for
+from .omr_processor import ENGINE_VERSION
+
+# Padrões quando os settings OMR_CACHE_* não estão definidos
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_AGE = timedelta(days=30)
+DEFAULT_MEMORY_ENTRIES = 256
+# Hits acumulados antes de gravar usos/ultimo_acesso, e gravações entre duas limpezas
+DEFAULT_FLUSH_EVERY = 50
+DEFAULT_EVICT_EVERY = 100
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'hits_memoria': 0, 'misses': 0, 'removidas': 0}
+
+# Usos ainda não gravados na tabela: chave -> [hits, último acesso]
+_usage_lock = threading.Lock()
+_pending_usage = {}
+_pending_hits = 0
+_stores_since_evict = 0
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _max_age():
+    return _setting('OMR_CACHE_MAX_AGE', DEFAULT_MAX_AGE)
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+class MemoryLRU:
+    """
+    LRU em memória com limite de itens e de idade (um por processo)
+
+    Fica na frente da tabela OMRCache: reenvios seguidos no mesmo processo
+    não chegam a consultar o banco (o uso é só anotado, ver _record_usage).
+    """
+
+    def __init__(self, max_entries, max_age):
+        self.max_entries = max_entries
+        self.max_age = max_age.total_seconds()
+        self._items = OrderedDict()  # chave -> (criado em, leitura)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            created, value = item
+            if time.time() - created > self.max_age:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value, created=None):
+        with self._lock:
+            self._items[key] = (created or time.time(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_memory_lock = threading.Lock()
+_memory = None
+
+
+def _memory_cache():
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = MemoryLRU(_setting('OMR_CACHE_MEMORY_ENTRIES', DEFAULT_MEMORY_ENTRIES), _max_age())
+        return _memory
+
+
+def cache_key(data, num_questions):
+    """Chave (hash do conteúdo, formato, número de questões, versão do motor) de uma imagem"""
+    return (hashlib.sha256(data).hexdigest(), layout_for(num_questions).name, num_questions, ENGINE_VERSION)
+
+
+def _entries(key):
+    imagem_hash, layout, num_questoes, versao_motor = key
+    return OMRCache.objects.filter(
+        imagem_hash=imagem_hash, layout=layout, num_questoes=num_questoes, versao_motor=versao_motor,
+    )
+
+
+def _record_usage(key, agora):
+    """
+    Anota um hit da chave; usos e ultimo_acesso vão para a tabela em lote
+    (flush_usage) a cada OMR_CACHE_FLUSH_EVERY hits e antes de cada limpeza
+    """
+    global _pending_hits
+    with _usage_lock:
+        uso = _pending_usage.setdefault(key, [0, agora])
+        uso[0] += 1
+        uso[1] = agora
+        _pending_hits += 1
+        cheio = _pending_hits >= _setting('OMR_CACHE_FLUSH_EVERY', DEFAULT_FLUSH_EVERY)
+    if cheio:
+        flush_usage()
+
+
+def flush_usage():
+    """Grava os usos anotados neste processo (um UPDATE por imagem); retorna quantas foram gravadas"""
+    global _pending_hits
+    with _usage_lock:
+        pendentes = list(_pending_usage.items())
+        _pending_usage.clear()
+        _pending_hits = 0
+    for key, (hits, ultimo_acesso) in pendentes:
+        _entries(key).update(usos=F('usos') + hits, ultimo_acesso=ultimo_acesso)
+    return len(pendentes)
+
+
+def get(key):
+    """
+    Leitura guardada para a chave, ou None (conta hit/miss)
+
+    Procura primeiro no LRU do processo e depois na tabela OMRCache;
+    entradas mais velhas que OMR_CACHE_MAX_AGE são ignoradas. Um hit na
+    memória não consulta o banco; o da tabela custa só o SELECT.
+    """
+    agora = timezone.now()
+    memory = _memory_cache()
+
+    leitura = memory.get(key)
+    if leitura is not None:
+        _count('hits')
+        _count('hits_memoria')
+        _record_usage(key, agora)
+        return leitura
+
+    entrada = _entries(key).filter(data_criacao__gte=agora - _max_age()).first()
+    if entrada is None:
+        _count('misses')
+        return None
+
+    _count('hits')
+    _record_usage(key, agora)
+    leitura = entrada.get_leitura_dict()
+    memory.put(key, leitura, created=entrada.data_criacao.timestamp())
+    return leitura
+
+
+def store(key, leitura):
+    """
+    Guarda a leitura de uma imagem (leituras com erro não são guardadas)
+
+    Os limites da tabela são aplicados a cada OMR_CACHE_EVICT_EVERY
+    gravações (e periodicamente pelo worker OMR), não em toda gravação.
+    """
+    global _stores_since_evict
+    if leitura.get('erro'):
+        return
+
+    _memory_cache().put(key, leitura)
+
+    imagem_hash, layout, num_questoes, versao_motor = key
+    entrada, _ = OMRCache.objects.get_or_create(
+        imagem_hash=imagem_hash, layout=layout, num_questoes=num_questoes, versao_motor=versao_motor,
+        defaults={'leitura': ''},
+    )
+    entrada.set_leitura_dict(leitura)
+    entrada.ultimo_acesso = timezone.now()
+    entrada.save(update_fields=['leitura', 'ultimo_acesso'])
+
+    with _usage_lock:
+        _stores_since_evict += 1
+        limpar = _stores_since_evict >= _setting('OMR_CACHE_EVICT_EVERY', DEFAULT_EVICT_EVERY)
+        if limpar:
+            _stores_since_evict = 0
+    if limpar:
+        evict()
+
+
+def evict(max_entries=None, max_age=None):
+    """
+    Remove da tabela as entradas vencidas, as de versões antigas do motor e,
+    acima de max_entries, as usadas há mais tempo
+
+    Returns:
+        int: Quantas entradas foram removidas
+    """
+    if max_entries is None:
+        max_entries = _setting('OMR_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+    if max_age is None:
+        max_age = _max_age()
+
+    # Usos pendentes primeiro, para a ordem por ultimo_acesso estar em dia
+    flush_usage()
+
+    removidas = OMRCache.objects.filter(data_criacao__lt=timezone.now() - max_age).delete()[0]
+    removidas += OMRCache.objects.exclude(versao_motor=ENGINE_VERSION).delete()[0]
+
+    excedentes = list(OMRCache.objects.order_by('-ultimo_acesso', '-id')
+                      .values_list('id', flat=True)[max_entries:])
+    if excedentes:
+        removidas += OMRCache.objects.filter(id__in=excedentes).delete()[0]
+
+    _count('removidas', removidas)
+    return removidas
+
+
+def clear():
+    """Esvazia o cache (memória do processo e tabela)"""
+    _memory_cache().clear()
+    with _usage_lock:
+        _pending_usage.clear()
+    return OMRCache.objects.all().delete()[0]
+
+
+def stats():
+    """Contadores do processo (hits, misses, removidas) e totais da tabela"""
+    with _stats_lock:
+        contadores = dict(_stats)
+    consultas = contadores['hits'] + contadores['misses']
+    contadores['taxa_hits'] = round(contadores['hits'] / consultas, 3) if consultas else None
+    contadores['entradas_memoria'] = len(_memory_cache())
+    contadores['entradas'] = OMRCache.objects.count()
+    return contadores
@@ -0,0 +1,126 @@
+import math
+
+import numpy as np
+
+
+class ContourStats:
+    """
+    Estatísticas de uma lista de contornos (findContours) calculadas em vetores
+
+    Os pontos de todos os contornos são concatenados e área (fórmula do
+    laço, como contourArea), perímetro fechado (arcLength), retângulo
+    envolvente (boundingRect) e centroide (momentos do polígono) saem de
+    somas por segmento com reduceat, sem chamar o OpenCV contorno a
+    contorno: em fotos ruidosas são milhares de contornos por folha.
+
+    Contornos com menos de min_points pontos (na maioria ruído de 1 a 4
+    pixels) são descartados antes da concatenação: com CHAIN_APPROX_SIMPLE,
+    menos de 3 pontos é área zero e menos de 5 não aproxima um círculo.
+
+    Atributos (um elemento por contorno mantido, na ordem de contours):
+        contours: Os contornos mantidos
+        area, perimeter: Área e perímetro do polígono
+        x, y, w, h: Retângulo envolvente em pixels
+        centroids: Centroides (n x 2); o primeiro ponto quando a área é 0
+    """
+
+    def __init__(self, contours, min_points=1):
+        if min_points > 1:
+            lengths = np.fromiter(map(len, contours), dtype=np.intp, count=len(contours))
+            contours = [contours[i] for i in np.flatnonzero(lengths >= min_points)]
+        self.contours = contours
+        count = len(contours)
+        if not count:
+            self.area = self.perimeter = np.zeros(0)
+            self.x = self.y = self.w = self.h = np.zeros(0, dtype=np.intp)
+            self.centroids = np.zeros((0, 2))
+            return
+
+        lengths = np.fromiter(map(len, contours), dtype=np.intp, count=count)
+        points = np.concatenate(contours).reshape(-1, 2)
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+        # Próximo ponto de cada ponto, fechando cada polígono no próprio início
+        following = np.arange(1, len(points) + 1)
+        following[starts + lengths - 1] = starts
+        px, py = points[:, 0].astype(np.float64), points[:, 1].astype(np.float64)
+        qx, qy = px[following], py[following]
+
+        cross = px * qy - qx * py
+        signed = np.add.reduceat(cross, starts) / 2
+        self.area = np.abs(signed)
+        self.perimeter = np.add.reduceat(np.hypot(qx - px, qy - py), starts)
+
+        low = np.minimum.reduceat(points, starts)
+        high = np.maximum.reduceat(points, starts)
+        self.x, self.y = low[:, 0], low[:, 1]
+        self.w, self.h = (high - low + 1).T
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cx = np.add.reduceat((px + qx) * cross, starts) / (6 * signed)
+            cy = np.add.reduceat((py + qy) * cross, starts) / (6 * signed)
+        degenerate = signed == 0
+        self.centroids = np.column_stack([
+            np.where(degenerate, px[starts], cx), np.where(degenerate, py[starts], cy),
+        ])
+
+    def __len__(self):
+        return len(self.area)
+
+    @property
+    def circularity(self):
+        """4πA/P² de cada contorno (1 para um círculo; 0 sem perímetro)"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.perimeter > 0, 4 * math.pi * self.area / self.perimeter ** 2, 0.0)
+
+    @property
+    def box_centers(self):
+        """Centros (n x 2) dos retângulos envolventes"""
+        return np.column_stack([self.x + self.w / 2, self.y + self.h / 2])
+
+    def select(self, min_area, max_area, min_circularity):
+        """Índices dos contornos com área na faixa aberta (min_area, max_area) e circularidade > min_circularity"""
+        keep = (self.area > min_area) & (self.area < max_area)
+        keep[keep] &= self.circularity[keep] > min_circularity
+        return np.flatnonzero(keep)
+
+
+def cluster_rows(x, y, column_gap, row_gap):
+    """
+    Agrupa centros em colunas (pelos vãos em x) e, dentro de cada coluna, em linhas (pelos vãos em y)
+
+    Um centro começa outra coluna quando está a mais de column_gap do
+    anterior em x, e outra linha quando está a mais de row_gap do anterior
+    da mesma coluna em y.
+
+    Returns:
+        tuple: (order, row_ids), com os índices dos centros ordenados por
+               linha e, dentro da linha, por x, e o número da linha de cada
+               um nessa ordem; as linhas são numeradas de cima para baixo,
+               coluna por coluna
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if not len(x):
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+
+    by_x = np.argsort(x, kind='stable')
+    columns = np.empty(len(x), dtype=np.intp)
+    columns[by_x] = np.concatenate([[0], np.cumsum(np.diff(x[by_x]) > column_gap)])
+
+    # Empates resolvidos pela outra coordenada, como nas ordenações estáveis sucessivas
+    by_y = np.lexsort((x, y, columns))
+    new_row = np.concatenate([[True], (np.diff(y[by_y]) > row_gap) | (np.diff(columns[by_y]) != 0)])
+    rows = np.empty(len(x), dtype=np.intp)
+    rows[by_y] = np.cumsum(new_row) - 1
+
+    order = np.lexsort((y, x, rows))
+    return order, rows[order]
+
+
+def full_rows(order, row_ids, size):
+    """Matriz (linhas x size) com os size primeiros índices de cada linha que tem pelo menos size elementos"""
+    starts = np.flatnonzero(np.concatenate([[True], np.diff(row_ids) != 0])) if len(row_ids) else row_ids
+    lengths = np.diff(np.append(starts, len(row_ids)))
+    starts = starts[lengths >= size]
+    return order[starts[:, None] + np.arange(size)]
@@ -0,0 +1,300 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import OMRJob
+
+# Intervalo de varredura da fila quando não há aviso de novos jobs (segundos)
+POLL_INTERVAL = 2.0
+
+# Jobs "processando" há mais tempo que isso são considerados abandonados
+STALE_AFTER = timedelta(minutes=10)
+
+# Intervalo entre as limpezas feitas pelo worker (fotos vencidas e limites do cache)
+PURGE_INTERVAL = 600.0
+
+_worker_lock = threading.Lock()
+_worker_thread = None
+_wakeup = threading.Event()
+
+
+def enqueue(prova, imagem, num_questoes, aluno_matricula='', avaliacao=''):
+    """
+    Cria um job OMR pendente e avisa o worker local
+
+    Se a mesma imagem já foi lida (cache por conteúdo, ver omr_cache), o job
+    é criado já concluído, sem passar pela fila.
+
+    Returns:
+        OMRJob: job criado (pendente, ou concluído quando veio do cache)
+    """
+    from . import omr_cache
+
+    job = OMRJob(
+        prova=prova,
+        imagem=imagem,
+        num_questoes=num_questoes,
+        aluno_matricula=aluno_matricula or '',
+        avaliacao=avaliacao or '',
+    )
+
+    leitura = omr_cache.get(omr_cache.cache_key(imagem, num_questoes))
+    if leitura is not None:
+        # Criado já como "processando" para o worker não reservá-lo
+        job.do_cache = True
+        job.status = OMRJob.STATUS_PROCESSANDO
+        job.save()
+        job.data_inicio = timezone.now()
+        _finish_job(job, leitura)
+        job.save()
+        _store_sheet(job, leitura)
+        return job
+
+    job.save()
+    if getattr(settings, 'OMR_INLINE_WORKER', True):
+        ensure_worker()
+    _wakeup.set()
+    return job
+
+
+def ensure_worker():
+    """Inicia (uma vez por processo) a thread que drena a fila de jobs OMR"""
+    global _worker_thread
+    with _worker_lock:
+        if _worker_thread is None or not _worker_thread.is_alive():
+            _worker_thread = threading.Thread(target=run_worker, name='omr-worker', daemon=True)
+            _worker_thread.start()
+
+
+def run_worker(stop_event=None, once=False):
+    """
+    Laço do worker: reserva e processa jobs pendentes até a fila esvaziar,
+    depois espera um aviso (ou POLL_INTERVAL) e volta a olhar a fila
+
+    Args:
+        stop_event: threading.Event opcional para encerrar o laço
+        once: processa o que estiver na fila e retorna
+    """
+    from . import omr_cache
+
+    requeue_stale_jobs()
+    ultima_limpeza = None
+    while stop_event is None or not stop_event.is_set():
+        close_old_connections()
+        try:
+            processed = drain_queue()
+            if ultima_limpeza is None or time.monotonic() - ultima_limpeza > PURGE_INTERVAL:
+                purge_images()
+                omr_cache.evict()
+                ultima_limpeza = time.monotonic()
+        finally:
+            close_old_connections()
+
+        if once:
+            return processed
+
+        _wakeup.wait(POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def drain_queue():
+    """Processa todos os jobs pendentes; retorna quantos foram processados"""
+    processed = 0
+    while True:
+        job = claim_next_job()
+        if job is None:
+            return processed
+        process_job(job)
+        processed += 1
+
+
+def claim_next_job():
+    """
+    Reserva o job pendente mais antigo
+
+    A reserva é um UPDATE condicional no status, então vários workers
+    (threads ou processos) podem drenar a mesma fila sem processar o
+    mesmo job duas vezes.
+    """
+    while True:
+        job_id = (OMRJob.objects.filter(status=OMRJob.STATUS_PENDENTE)
+                  .order_by('data_criacao', 'id')
+                  .values_list('id', flat=True)
+                  .first())
+        if job_id is None:
+            return None
+
+        claimed = OMRJob.objects.filter(id=job_id, status=OMRJob.STATUS_PENDENTE).update(
+            status=OMRJob.STATUS_PROCESSANDO,
+            progresso=10,
+            data_inicio=timezone.now(),
+        )
+        if claimed:
+            return OMRJob.objects.select_related('prova', 'prova__gabarito').get(id=job_id)
+
+
+def requeue_stale_jobs():
+    """Devolve à fila jobs presos em "processando" (ex.: worker encerrado no meio)"""
+    limite = timezone.now() - STALE_AFTER
+    return OMRJob.objects.filter(
+        status=OMRJob.STATUS_PROCESSANDO,
+        data_inicio__lt=limite,
+    ).update(status=OMRJob.STATUS_PENDENTE, progresso=0, data_inicio=None)
+
+
+def purge_images(retencao=None):
+    """
+    Descarta as fotos dos jobs terminados há mais de OMR_IMAGEM_RETENCAO
+
+    O resultado, as bolhas e a matriz de preenchimento (OMRFolha) ficam;
+    só a sobreposição de conferência deixa de estar disponível. Retorna
+    quantos jobs tiveram a foto descartada.
+    """
+    if retencao is None:
+        retencao = getattr(settings, 'OMR_IMAGEM_RETENCAO', timedelta(days=7))
+    limite = timezone.now() - retencao
+    return (OMRJob.objects
+            .filter(status__in=[OMRJob.STATUS_CONCLUIDO, OMRJob.STATUS_ERRO], data_conclusao__lt=limite)
+            .exclude(imagem=b'')
+            .update(imagem=b''))
+
+
+def _set_progress(job, progresso):
+    job.progresso = progresso
+    OMRJob.objects.filter(id=job.id).update(progresso=progresso)
+
+
+def _finish_job(job, leitura):
+    """Corrige a leitura com o gabarito da prova e registra o resultado no job (sem salvar)"""
+    from .omr_processor import reading_details
+
+    try:
+        if leitura['erro']:
+            raise ValueError(leitura['erro'])
+        respostas_detectadas = leitura['respostas']
+
+        prova = job.prova
+        gabarito = prova.gabarito
+        questoes_ids = prova.get_questoes_ids_list()
+        respostas_corretas = gabarito.get_respostas_dict()
+        acertos, total, nota_final = gabarito.calcular_nota_omr(respostas_detectadas, questoes_ids)
+
+        job.set_resultado_dict({
+            'success': True,
+            'respostas_detectadas': respostas_detectadas,
+            'acertos': acertos,
+            'total': total,
+            'nota': nota_final,
+            'detalhes': {
+                'prova_id': prova.id,
+                'aluno_matricula': job.aluno_matricula,
+                'avaliacao': job.avaliacao,
+                'questoes_ids': questoes_ids,
+                'respostas_corretas': list(respostas_corretas.values())
+            },
+            'leitura': reading_details(leitura),
+        })
+        job.set_bolhas_dict(leitura.get('bolhas'))
+        job.status = OMRJob.STATUS_CONCLUIDO
+    except Exception as e:
+        job.status = OMRJob.STATUS_ERRO
+        job.erro = f'Erro no processamento OMR: {str(e)}'
+
+    job.progresso = 100
+    job.data_conclusao = timezone.now()
+
+
+def store_sheet(prova, leitura, num_questoes, aluno_matricula='', job=None):
+    """
+    Guarda a matriz de preenchimento de uma folha lida (OMRFolha), para redecisões futuras
+
+    Uma folha por aluno em cada prova: a leitura seguinte para a mesma
+    matrícula (reenvio, foto do cache ou lote) substitui a anterior.
+    Folhas sem matrícula são guardadas uma a uma.
+    """
+    from .models import Aluno, OMRFolha
+    from .omr_layouts import layout_for
+    from .omr_processor import ENGINE_VERSION
+    from .omr_scoring import decode_fill_matrix
+
+    if leitura.get('erro') or not leitura.get('preenchimento'):
+        return None
+
+    folha = OMRFolha(prova=prova, aluno_matricula=aluno_matricula)
+    if aluno_matricula:
+        folha = OMRFolha.objects.filter(prova=prova, aluno_matricula=aluno_matricula).first() or folha
+        folha.aluno = Aluno.objects.filter(professor_id=prova.professor_id, matricula=aluno_matricula).first()
+    folha.job = job
+    folha.layout = layout_for(num_questoes).name
+    folha.versao_motor = ENGINE_VERSION
+    folha.num_questoes = num_questoes
+    folha.limiar = None  # decisão do motor, até a próxima redecisão
+    folha.set_preenchimento_array(decode_fill_matrix(leitura['preenchimento']))
+    folha.set_respostas_list(leitura['respostas'])
+    folha.save()
+    return folha
+
+
+def _store_sheet(job, leitura):
+    """Guarda a folha de um job concluído (store_sheet)"""
+    if job.status != OMRJob.STATUS_CONCLUIDO:
+        return None
+    return store_sheet(job.prova, leitura, job.num_questoes, job.aluno_matricula, job=job)
+
+
+def process_job(job):
+    """Executa a leitura OMR de um job reservado e grava o resultado"""
+    from . import omr_cache, omr_metrics, omr_pool
+    from .omr_processor import process_sheet
+
+    try:
+        imagem = bytes(job.imagem)
+
+        _set_progress(job, 30)
+        leitura = omr_pool.run(process_sheet, imagem, job.num_questoes)
+        omr_metrics.record(leitura)
+        omr_cache.store(omr_cache.cache_key(imagem, job.num_questoes), leitura)
+
+        _set_progress(job, 90)
+    except Exception as e:
+        leitura = {'respostas': [], 'erro': str(e)}
+
+    _finish_job(job, leitura)
+    job.save(update_fields=['status', 'progresso', 'resultado', 'bolhas', 'erro', 'data_conclusao'])
+    _store_sheet(job, leitura)
+    return job
+
+
+def job_status(job):
+    """Dicionário de status usado pelo endpoint de acompanhamento"""
+    status = {
+        'success': job.status != OMRJob.STATUS_ERRO,
+        'job_id': job.id,
+        'status': job.status,
+        'progresso': job.progresso,
+        'tempo_fila': job.tempo_fila,
+        'tempo_processamento': job.tempo_processamento,
+        'do_cache': job.do_cache,
+    }
+    if job.status == OMRJob.STATUS_CONCLUIDO:
+        status.update(job.get_resultado_dict())
+        if job.bolhas:
+            status['overlay_url'] = reverse('overlay_omr', args=[job.id])
+    elif job.status == OMRJob.STATUS_ERRO:
+        status['error'] = job.erro
+    return status
+
+
+def wait_for_job(job_id, timeout=30.0, interval=0.2):
+    """Espera um job terminar (útil em scripts e no shell); retorna o OMRJob"""
+    limite = time.monotonic() + timeout
+    while True:
+        job = OMRJob.objects.get(id=job_id)
+        if job.status in (OMRJob.STATUS_CONCLUIDO, OMRJob.STATUS_ERRO) or time.monotonic() > limite:
+            return job
+        time.sleep(interval)
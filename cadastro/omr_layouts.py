@@ -0,0 +1,217 @@
+import functools
+import math
+
+import numpy as np
+
+ALTERNATIVES = 'ABCDE'
+
+
+class SheetLayout:
+    """
+    Especificação declarativa de um formato de folha de respostas
+
+    Todas as medidas são pixels do quadro de referência ref_size (largura,
+    altura): origin é o centro da alternativa A da primeira questão, pitch
+    o passo entre alternativas (x) e entre linhas (y) e column_pitch a
+    distância entre colunas de questões. As questões são numeradas de cima
+    para baixo, coluna por coluna; marks são os marcadores de referência
+    (x, y, lado) quando o formato os imprime, em sentido horário a partir do
+    canto superior esquerdo, cujo marcador é o maior (indica a orientação).
+    """
+
+    def __init__(self, name, family, columns, rows, origin, pitch, radius, ref_size,
+                 column_pitch=0, marks=(), alternatives=len(ALTERNATIVES)):
+        self.name = name
+        self.family = family
+        self.columns = columns
+        self.rows = rows
+        self.origin = origin
+        self.pitch = pitch
+        self.radius = radius
+        self.ref_size = ref_size
+        self.column_pitch = column_pitch
+        self.marks = tuple(marks)
+        self.alternatives = alternatives
+
+    def __repr__(self):
+        return f'<SheetLayout {self.name}: {self.columns}x{self.rows}>'
+
+    @property
+    def capacity(self):
+        """Número máximo de questões do formato"""
+        return self.columns * self.rows
+
+    def column_sizes(self, num_questions):
+        """Quantidade de questões em cada coluna para uma prova de num_questions"""
+        num_questions = min(num_questions, self.capacity)
+        sizes = []
+        while num_questions > 0:
+            sizes.append(min(self.rows, num_questions))
+            num_questions -= sizes[-1]
+        return sizes
+
+    def centers(self, num_questions=None):
+        """Centros (questões x alternativas x 2) no quadro de referência"""
+        count = self.capacity if num_questions is None else min(num_questions, self.capacity)
+        index = np.arange(count)
+        column, row = np.divmod(index, self.rows)
+        x0 = self.origin[0] + column * self.column_pitch
+        y0 = self.origin[1] + row * self.pitch[1]
+        offsets = np.arange(self.alternatives) * self.pitch[0]
+
+        centers = np.empty((count, self.alternatives, 2), dtype=np.float64)
+        centers[..., 0] = x0[:, None] + offsets[None, :]
+        centers[..., 1] = y0[:, None]
+        return centers
+
+    def compile(self, width, height, num_questions=None):
+        """Mapa de bolhas na resolução de trabalho (cacheado por formato e tamanho)"""
+        count = self.capacity if num_questions is None else min(num_questions, self.capacity)
+        return _compile(self.name, int(width), int(height), count)
+
+    def answer_region(self, margin=None):
+        """Retângulo (x0, y0, x1, y1) que contém todas as bolhas, no quadro de referência"""
+        if margin is None:
+            margin = self.radius + self.pitch[0] / 2
+        centers = self.centers().reshape(-1, 2)
+        x0, y0 = centers.min(axis=0) - margin
+        x1, y1 = centers.max(axis=0) + margin
+        return x0, y0, x1, y1
+
+    def template_context(self, num_questions=None):
+        """
+        Medidas usadas por visualizar_prova.html para desenhar a folha deste formato
+
+        Cada linha de questão é posicionada em pixels absolutos no quadro de
+        referência, para que as bolhas impressas fiquem exatamente onde o
+        leitor as procura depois de alinhar a foto pelos marcadores.
+        """
+        centers = self.centers(num_questions)
+        half_pitch = self.pitch[0] / 2
+        questoes = [
+            {
+                'numero': index + 1,
+                'left': round(row[0][0] - half_pitch - NUMBER_WIDTH),
+                'top': round(row[0][1] - self.radius - LETTER_HEIGHT),
+            }
+            for index, row in enumerate(centers)
+        ]
+        marcadores = [
+            {'left': round(x - side / 2), 'top': round(y - side / 2), 'lado': side}
+            for x, y, side in self.marks
+        ]
+        return {
+            'nome': self.name,
+            'largura': self.ref_size[0],
+            'altura': self.ref_size[1],
+            'diametro': 2 * self.radius,
+            'passo_alternativas': self.pitch[0],
+            'largura_numero': NUMBER_WIDTH,
+            'altura_letra': LETTER_HEIGHT,
+            'questoes': questoes,
+            'marcadores': marcadores,
+        }
+
+
+class BubbleMap:
+    """Coordenadas de um SheetLayout já escaladas para uma imagem (somente leitura)"""
+
+    def __init__(self, layout, size, centers, radius, marks):
+        self.layout = layout
+        self.size = size
+        self.centers = centers
+        self.radius = radius
+        self.marks = marks
+
+    def __len__(self):
+        return len(self.centers)
+
+
+LAYOUTS = {}
+
+
+def register_layout(layout):
+    """Adiciona um formato ao registro (novos formatos só precisam de uma chamada)"""
+    LAYOUTS[layout.name] = layout
+    _compile.cache_clear()
+    return layout
+
+
+def get_layout(name):
+    return LAYOUTS[name]
+
+
+def layout_for(num_questions, family='folha'):
+    """Menor formato da família que comporta num_questions (ou o maior disponível)"""
+    candidates = sorted(
+        (layout for layout in LAYOUTS.values() if layout.family == family),
+        key=lambda layout: layout.capacity,
+    )
+    if not candidates:
+        raise KeyError(f"Nenhum formato registrado para a família '{family}'")
+    for layout in candidates:
+        if layout.capacity >= num_questions:
+            return layout
+    return candidates[-1]
+
+
+@functools.lru_cache(maxsize=128)
+def _compile(name, width, height, num_questions):
+    layout = LAYOUTS[name]
+    ref_width, ref_height = layout.ref_size
+    scale = np.array([width / ref_width, height / ref_height])
+
+    centers = np.rint(layout.centers(num_questions) * scale).astype(np.intp)
+    centers.flags.writeable = False
+
+    marks = np.array(layout.marks, dtype=np.float64).reshape(-1, 3)[:, :2]
+    marks = np.rint(marks * scale).astype(np.intp)
+    marks.flags.writeable = False
+
+    radius = max(1, int(round(layout.radius * math.sqrt(scale[0] * scale[1]))))
+    return BubbleMap(layout, (width, height), centers, radius, marks)
+
+
+# Folha impressa por visualizar_prova.html. Quadro de referência: a área
+# interna da folha de gabarito (696 x 996 px de CSS, cabe em A4 retrato com
+# margens), com marcadores quadrados a 16px das bordas (afastados da moldura
+# da folha, para não se fundirem a ela na busca em baixa resolução); o do
+# canto superior esquerdo é maior para indicar a orientação.
+FOLHA_SIZE = (696, 996)
+FOLHA_MARKS = ((32, 32, 32), (669, 27, 22), (669, 969, 22), (27, 969, 22))
+
+# Caixa do número da questão (à esquerda da alternativa A) e das letras (acima das bolhas)
+NUMBER_WIDTH = 30
+LETTER_HEIGHT = 14
+
+
+def _folha_layout(name, columns, rows, pitch, radius, column_pitch, top):
+    """Formato impresso com as colunas de questões centralizadas na folha"""
+    row_width = NUMBER_WIDTH + 5 * pitch[0]
+    left = (FOLHA_SIZE[0] - (columns - 1) * column_pitch - row_width) / 2
+    origin = (round(left + NUMBER_WIDTH + pitch[0] / 2), top)
+    return SheetLayout(
+        name, 'folha', columns, rows, origin, pitch, radius, FOLHA_SIZE,
+        column_pitch=column_pitch, marks=FOLHA_MARKS,
+    )
+
+
+register_layout(_folha_layout('folha-5', 1, 5, (30, 50), 9, 230, 300))
+register_layout(_folha_layout('folha-10', 1, 10, (30, 50), 9, 230, 300))
+register_layout(_folha_layout('folha-20', 2, 10, (30, 50), 9, 230, 300))
+register_layout(_folha_layout('folha-30', 3, 10, (30, 50), 9, 230, 300))
+register_layout(_folha_layout('folha-50', 3, 17, (26, 40), 7, 200, 300))
+register_layout(_folha_layout('folha-100', 4, 25, (22, 27), 6, 160, 300))
+
+# Grade fixa usada quando os contornos falham (medidas calibradas nas fotos de teste)
+register_layout(SheetLayout('grade-5', 'grade', 1, 5, (450, 500), (50, 65), 20, (800, 1100)))
+register_layout(SheetLayout('grade-10', 'grade', 1, 10, (450, 470), (50, 50), 20, (800, 1100)))
+register_layout(SheetLayout('grade-15', 'grade', 1, 15, (450, 437), (50, 40), 20, (1000, 1400)))
+register_layout(SheetLayout('grade-20', 'grade', 2, 10, (250, 415), (50, 35), 15, (1000, 1400), column_pitch=300))
+
+# Modelos G5-P/V e G10-P/V (identificados pelo nome do arquivo)
+register_layout(SheetLayout('g5', 'g5', 1, 5, (452, 490), (51, 58), 25, (800, 1066)))
+register_layout(SheetLayout('g10', 'g10', 1, 10, (290, 355), (51, 58), 22, (800, 1100)))
+
+# Coordenadas fixas do gabarito de 20 questões em duas colunas (início a 1/3 da altura)
+register_layout(SheetLayout('20q-fixo', '20q-fixo', 2, 10, (170, 444), (40, 45), 18, (1000, 1332), column_pitch=500))
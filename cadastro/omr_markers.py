@@ -0,0 +1,191 @@
+import math
+
+import cv2
+import numpy as np
+
+# Largura da cópia reduzida usada para procurar os marcadores
+MARKER_SEARCH_WIDTH = 600
+
+# Lado aceito para um marcador, como fração da largura da imagem
+MIN_MARK_SIDE = 0.01
+MAX_MARK_SIDE = 0.06
+
+# Quanto a área do marcador de orientação precisa superar a dos outros
+ORIENTATION_AREA_RATIO = 1.4
+
+# Faixa aceita para área encontrada / área esperada de cada marcador
+MARK_AREA_RANGE = (0.4, 2.0)
+
+# Tolerância da proporção altura/largura do quadrilátero dos marcadores
+ASPECT_TOLERANCE = 0.3
+
+
+def _mark_candidates(binary):
+    """Quadrados cheios (marcadores) na imagem binarizada: (x, y, área) de cada um"""
+    width = binary.shape[1]
+    min_side = max(3, width * MIN_MARK_SIDE)
+    max_side = width * MAX_MARK_SIDE
+
+    # Quase todos os componentes são ruído ou letras: o retângulo envolvente
+    # de todos sai de uma passada (em fotos ruidosas são dezenas de milhares,
+    # caros para findContours) e só os de tamanho de marcador são contornados
+    candidates = []
+    count, labels, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(binary, 8, cv2.CV_32S, cv2.CCL_GRANA)
+    widths, heights = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]
+    sized = np.where(
+        (widths >= min_side) & (widths <= 1.5 * max_side) & (heights >= min_side) & (heights <= 1.5 * max_side),
+        255, 0).astype(np.uint8)
+    sized[0] = 0
+    sized_components = np.take(sized, labels)
+
+    # RETR_CCOMP: com fundo escuro em volta do papel, os marcadores ficam
+    # aninhados dentro do contorno externo da foto; só as bordas externas de
+    # cada componente interessam (furos nunca são marcadores cheios)
+    cnts, hierarchy = cv2.findContours(sized_components, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)[-2:]
+    if hierarchy is None:
+        return candidates
+    for index in np.flatnonzero(hierarchy[0][:, 3] == -1):
+        c = cnts[index]
+
+        x, y, bw, bh = cv2.boundingRect(c)
+
+        (cx, cy), (w, h), _ = cv2.minAreaRect(c)
+        if not (min_side <= w <= max_side and min_side <= h <= max_side):
+            continue
+        if not 0.7 <= w / h <= 1.4:
+            continue
+
+        # Bolhas cheias ocupam ~78% do retângulo mínimo e quadrados quase todo;
+        # em baixa resolução os cantos arredondam, então a folga é pequena e
+        # bolhas que passarem são descartadas pelas checagens dos cantos
+        area = cv2.contourArea(c)
+        if area < 0.8 * w * h:
+            continue
+
+        # Descartar contornos vazados (quadrados só com a borda)
+        if cv2.countNonZero(binary[y:y + bh, x:x + bw]) < 0.85 * area:
+            continue
+
+        candidates.append((cx, cy, area))
+    return candidates
+
+
+def find_corner_marks(gray, layout, search_width=MARKER_SEARCH_WIDTH):
+    """
+    Localiza os marcadores de canto da folha em uma cópia reduzida da imagem
+
+    Os quatro candidatos mais externos formam o quadrilátero da folha; o
+    marcador maior (canto superior esquerdo no formato) define a orientação,
+    então fotos giradas de 90/180/270 graus também são alinhadas.
+
+    Args:
+        gray: Imagem em tons de cinza (resolução de trabalho)
+        layout: SheetLayout com os marcadores (x, y, lado) do formato
+        search_width: Largura da cópia reduzida usada na busca
+
+    Returns:
+        np.ndarray: (4, 2) float32 com os centros na resolução de gray, na
+                    ordem dos marcadores do formato, ou None se não encontrar
+    """
+    if len(layout.marks) != 4:
+        return None
+
+    height, width = gray.shape[:2]
+    scale = min(1.0, search_width / width)
+    if scale < 1.0:
+        small = cv2.resize(gray, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_LINEAR)
+    else:
+        small = gray
+
+    _, binary = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    candidates = _mark_candidates(binary)
+    if len(candidates) < 4:
+        return None
+
+    points = np.array([(x, y) for x, y, _ in candidates], dtype=np.float32)
+    areas = np.array([area for _, _, area in candidates])
+
+    # Cantos da imagem: superior esquerdo, superior direito, inferior direito, inferior esquerdo
+    total = points.sum(axis=1)
+    diff = points[:, 0] - points[:, 1]
+    corners = [int(np.argmin(total)), int(np.argmax(diff)), int(np.argmax(total)), int(np.argmin(diff))]
+    if len(set(corners)) < 4:
+        return None
+
+    quad = points[corners]
+    quad_areas = areas[corners]
+    if not cv2.isContourConvex(quad.reshape(-1, 1, 2)):
+        return None
+    if cv2.contourArea(quad) < 0.15 * small.shape[0] * small.shape[1]:
+        return None
+
+    # Girar a ordem até o marcador maior ficar no canto superior esquerdo do
+    # formato; sem um marcador claramente maior, os quatro cantos podem ser
+    # bolhas preenchidas e a folha é recusada
+    reference_sides = np.array([side for _, _, side in layout.marks], dtype=np.float64)
+    if reference_sides.max() > reference_sides.min():
+        biggest = int(np.argmax(quad_areas))
+        others = np.delete(quad_areas, biggest)
+        if quad_areas[biggest] < ORIENTATION_AREA_RATIO * np.median(others):
+            return None
+        shift = biggest - int(np.argmax(reference_sides))
+        quad = np.roll(quad, -shift, axis=0)
+        quad_areas = np.roll(quad_areas, -shift)
+
+    # A proporção do quadrilátero precisa bater com a do formato
+    ref = np.array([(x, y) for x, y, _ in layout.marks], dtype=np.float64)
+    ref_aspect = _quad_aspect(ref)
+    aspect = _quad_aspect(quad)
+    if abs(aspect / ref_aspect - 1) > ASPECT_TOLERANCE:
+        return None
+
+    # E cada canto precisa ter o tamanho de marcador esperado nessa escala
+    # (descarta letras e bolhas que por acaso formem um quadrilátero)
+    quad_scale = _quad_width(quad) / _quad_width(ref)
+    expected = (reference_sides * quad_scale) ** 2
+    ratio = quad_areas / expected
+    if ratio.min() < MARK_AREA_RANGE[0] or ratio.max() > MARK_AREA_RANGE[1]:
+        return None
+
+    return quad / scale
+
+
+def _quad_width(quad):
+    """Largura média (bordas superior e inferior) de um quadrilátero"""
+    return (math.dist(quad[0], quad[1]) + math.dist(quad[2], quad[3])) / 2
+
+
+def _quad_aspect(quad):
+    """Altura média / largura média de um quadrilátero (ordem horária a partir do canto superior esquerdo)"""
+    top = math.dist(quad[0], quad[1])
+    right = math.dist(quad[1], quad[2])
+    bottom = math.dist(quad[2], quad[3])
+    left = math.dist(quad[3], quad[0])
+    return (left + right) / max(top + bottom, 1e-6)
+
+
+def warp_answer_region(gray, marks, layout, scale):
+    """
+    Retifica só a região das bolhas para o quadro de referência do formato
+
+    Uma única homografia leva os marcadores encontrados às posições do
+    formato (multiplicadas por scale); a saída cobre apenas
+    layout.answer_region(), não a folha inteira.
+
+    Returns:
+        tuple: (região retificada, (x0, y0) da região no quadro escalado,
+                matriz 3x3 que leva pontos de gray para a região)
+    """
+    reference = np.array([(x, y) for x, y, _ in layout.marks], dtype=np.float32) * scale
+    homography = cv2.getPerspectiveTransform(np.asarray(marks, dtype=np.float32), reference)
+
+    x0, y0, x1, y1 = (v * scale for v in layout.answer_region())
+    x0, y0 = math.floor(x0), math.floor(y0)
+    size = (math.ceil(x1) - x0, math.ceil(y1) - y0)
+
+    shift = np.array([[1, 0, -x0], [0, 1, -y0], [0, 0, 1]], dtype=np.float64)
+    to_region = shift @ homography
+    region = cv2.warpPerspective(gray, to_region, size,
+                                 flags=cv2.INTER_LINEAR, borderValue=255)
+    return region, (x0, y0), to_region
@@ -0,0 +1,102 @@
+import threading
+from collections import deque
+
+import numpy as np
+from django.conf import settings
+
+# Leituras mantidas na janela de cada histograma (setting OMR_METRICS_WINDOW)
+DEFAULT_WINDOW = 1000
+
+# Limites superiores das faixas dos histogramas (a última faixa é "acima do último")
+TIME_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+PERCENTILES = (50, 90, 99)
+
+
+class RollingHistogram:
+    """
+    Histograma das últimas window observações de uma métrica
+
+    Guarda os valores brutos em uma fila de tamanho fixo; as faixas e os
+    percentis são calculados só quando alguém pede o resumo.
+    """
+
+    def __init__(self, buckets, window=DEFAULT_WINDOW):
+        self.buckets = buckets
+        self._values = deque(maxlen=window)
+        self.total = 0  # observações desde o início, inclusive as que já saíram da janela
+
+    def __len__(self):
+        return len(self._values)
+
+    def add(self, value):
+        self._values.append(value)
+        self.total += 1
+
+    def snapshot(self):
+        """Resumo serializável: contagem, média, percentis e contagem por faixa"""
+        values = np.fromiter(self._values, dtype=np.float64, count=len(self._values))
+        if not len(values):
+            return {'amostras': 0, 'total': self.total}
+        counts = np.bincount(np.searchsorted(self.buckets, values, side='left'), minlength=len(self.buckets) + 1)
+        labels = [f'<={limite}' for limite in self.buckets] + [f'>{self.buckets[-1]}']
+        return {
+            'amostras': len(values),
+            'total': self.total,
+            'media': round(float(values.mean()), 2),
+            **{f'p{p}': round(float(np.percentile(values, p)), 2) for p in PERCENTILES},
+            'faixas': dict(zip(labels, counts.tolist())),
+        }
+
+
+_lock = threading.Lock()
+_timings = {}
+_counters = {}
+
+
+def _window():
+    return getattr(settings, 'OMR_METRICS_WINDOW', DEFAULT_WINDOW)
+
+
+def _histogram(table, name, buckets):
+    histogram = table.get(name)
+    if histogram is None:
+        histogram = table[name] = RollingHistogram(buckets, _window())
+    return histogram
+
+
+def record(leitura):
+    """
+    Soma uma leitura (dict de process_sheet) aos histogramas do processo
+
+    Chamada no processo que recebe o resultado do pool, não nos workers:
+    os histogramas valem para o processo atual (um por processo web/worker).
+    Leituras com erro são ignoradas; as vindas do cache (omr_cache) não
+    devem ser registradas, pois repetem os tempos da leitura original.
+    """
+    tempos = leitura.get('tempos_ms')
+    if leitura.get('erro') or not tempos:
+        return
+    with _lock:
+        for stage, ms in tempos.items():
+            _histogram(_timings, stage, TIME_BUCKETS_MS).add(ms)
+        for name, value in leitura.get('contadores', {}).items():
+            _histogram(_counters, name, COUNT_BUCKETS).add(value)
+
+
+def snapshot():
+    """Histogramas de tempo (ms) por etapa e dos contadores por leitura"""
+    with _lock:
+        return {
+            'janela': _window(),
+            'tempos_ms': {stage: histogram.snapshot() for stage, histogram in _timings.items()},
+            'contadores': {name: histogram.snapshot() for name, histogram in _counters.items()},
+        }
+
+
+def reset():
+    """Esvazia os histogramas do processo"""
+    with _lock:
+        _timings.clear()
+        _counters.clear()
@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+
+from .omr_processor import load_uploaded_image
+
+# Cores (BGR) da sobreposição
+COR_MARCADA = (0, 170, 0)
+COR_ALTERNATIVA = (200, 140, 0)
+COR_TEXTO = (0, 0, 220)
+
+
+def render_overlay(data, bolhas, respostas=None, fills=None, quality=85):
+    """
+    Desenha sobre a foto as bolhas onde cada questão foi lida
+
+    Gerada só quando alguém abre a conferência de uma leitura: a foto é
+    decodificada de novo na mesma largura de trabalho da leitura e as
+    coordenadas vêm do registro compacto (OMRProcessor.last_bubbles).
+
+    Args:
+        data: Bytes da imagem enviada
+        bolhas: Dicionário {'largura', 'altura', 'questoes'} da leitura
+        respostas: Respostas detectadas, destacadas em verde
+        fills: Matriz de preenchimento da leitura (questões x 5, NaN onde não
+               lida); quando informada, o percentual aparece sob cada bolha
+        quality: Qualidade do JPEG gerado
+
+    Returns:
+        bytes: Imagem JPEG anotada
+    """
+    width, height = bolhas['largura'], bolhas['altura']
+    image = load_uploaded_image(data, target_width=width)
+    if image.shape[:2] != (height, width):
+        image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image[..., :3].copy()
+
+    respostas = respostas or []
+    font_scale = width / 2500
+
+    for q_idx, questao in enumerate(bolhas['questoes']):
+        if questao is None:
+            continue
+
+        resposta = respostas[q_idx] if q_idx < len(respostas) else ''
+        radius = max(2, round(questao['raio']))
+        linha = fills[q_idx] if fills is not None and q_idx < len(fills) else ()
+        for alt_idx, (x, y) in enumerate(questao['centros']):
+            marcada = resposta == chr(65 + alt_idx)
+            cv2.circle(image, (x, y), radius, COR_MARCADA if marcada else COR_ALTERNATIVA, 3 if marcada else 1)
+            preenchimento = linha[alt_idx] if alt_idx < len(linha) else np.nan
+            if not np.isnan(preenchimento):
+                cv2.putText(image, f"{round(preenchimento * 100)}", (x - radius, y + 2 * radius + 4),
+                            cv2.FONT_HERSHEY_SIMPLEX, font_scale, COR_TEXTO, 1)
+
+        x, y = questao['centros'][0]
+        cv2.putText(image, f"{q_idx + 1}", (x - 3 * radius, y + radius // 2),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.5 * font_scale, COR_TEXTO, 1)
+
+    _, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes()
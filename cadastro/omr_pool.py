@@ -0,0 +1,111 @@
+import atexit
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Padrões usados quando o Django não está configurado (scripts e benchmarks)
+DEFAULT_MAX_TASKS_PER_CHILD = 200
+# Cada processo web tem o seu pool; com vários workers WSGI, um pool por núcleo
+# multiplicaria os processos (e os buffers do OpenCV) pelo número de workers
+DEFAULT_WORKERS = 2
+
+_pool_lock = threading.Lock()
+_pool = None
+_pool_workers = 0
+
+
+def _setting(name, default):
+    try:
+        from django.conf import settings
+        if settings.configured:
+            return getattr(settings, name, default)
+    except ImportError:
+        pass
+    return default
+
+
+def _init_worker():
+    """
+    Inicialização de cada processo do pool: importa o OpenCV uma única vez e
+    aquece o processador da thread, alocando os buffers de cada largura de trabalho
+    """
+    import cv2
+    import numpy as np
+
+    from .omr_processor import get_processor, working_width
+
+    # Um processo por núcleo já paraleliza; evita disputa entre threads do OpenCV
+    cv2.setNumThreads(1)
+
+    processor = get_processor()
+    for num_questions in (5, 20):
+        width = working_width(num_questions)
+        blank = np.full((int(width * 1.4), width), 255, dtype=np.uint8)
+        processor.process_omr_array(blank, num_questions)
+
+
+def get_pool():
+    """
+    Pool de processos OMR compartilhado pelo processo web (criado sob demanda)
+
+    Cada worker é reciclado após OMR_POOL_MAX_TASKS leituras para limitar o
+    crescimento de memória. Usa "spawn" para não herdar conexões de banco e
+    threads do processo web.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None:
+            _pool_workers = (_setting('OMR_POOL_WORKERS', None)
+                             or min(DEFAULT_WORKERS, os.cpu_count() or 1))
+            kwargs = {
+                'max_workers': _pool_workers,
+                'mp_context': multiprocessing.get_context('spawn'),
+                'initializer': _init_worker,
+            }
+            if sys.version_info >= (3, 11):
+                kwargs['max_tasks_per_child'] = _setting('OMR_POOL_MAX_TASKS', DEFAULT_MAX_TASKS_PER_CHILD)
+            _pool = ProcessPoolExecutor(**kwargs)
+        return _pool
+
+
+def _reset_pool(broken):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def submit(fn, *args, **kwargs):
+    """Envia uma tarefa ao pool, recriando-o uma vez se algum worker tiver morrido"""
+    pool = get_pool()
+    try:
+        return pool.submit(fn, *args, **kwargs)
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        return get_pool().submit(fn, *args, **kwargs)
+
+
+def run(fn, *args, timeout=None, **kwargs):
+    """Executa uma tarefa no pool e espera o resultado"""
+    return submit(fn, *args, **kwargs).result(timeout=timeout)
+
+
+def warm_up():
+    """Garante que todos os workers já subiram e carregaram o OpenCV"""
+    pool = get_pool()
+    futures = [pool.submit(os.getpid) for _ in range(_pool_workers)]
+    return sorted({future.result() for future in futures})
+
+
+@atexit.register
+def shutdown():
+    """Encerra o pool (chamado automaticamente na saída do processo)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
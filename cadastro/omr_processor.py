@@ -2,12 +2,191 @@ import cv2
 import numpy as np
 from PIL import Image
 import imutils
-from imutils import contours
 import math
 import json
 import os
 import re
-import tempfile
+import io
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from .omr_contours import ContourStats, cluster_rows, full_rows
+from .omr_layouts import get_layout, layout_for
+from .omr_markers import find_corner_marks, warp_answer_region
+from .omr_roi import find_answer_area
+from .omr_scoring import score_bubbles, pick_answer, answer_confidence, disk_area, encode_fill_matrix
+
+# Versão do motor de leitura: incrementar quando uma mudança alterar as respostas
+# lidas, para que o cache de resultados (omr_cache) não devolva leituras antigas
+ENGINE_VERSION = 5
+
+# Limite de pixels declarado no cabeçalho da imagem (fotos de até ~48 MP passam)
+MAX_IMAGE_PIXELS = 64_000_000
+
+# Orientações EXIF que trocam largura e altura (rotação de 90/270 graus)
+_EXIF_ORIENTATION = 0x0112
+_EXIF_TRANSPOSED = (5, 6, 7, 8)
+_EXIF_TRANSPOSE_METHODS = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+# Fração mínima da bolha preenchida para contar como marcada na leitura pelos marcadores
+MARK_FILL_RATIO = 0.6
+
+# Confiança a partir da qual uma questão não é mais consultada nas estratégias seguintes
+CONFIDENCE_THRESHOLD = 0.6
+
+# Altura/largura usada para dimensionar os buffers de trabalho de cada layout
+# (A4 = 1,41); fotos mais compridas fazem o buffer crescer uma vez
+BUFFER_SHEET_ASPECT = 1.5
+
+
+def working_width(num_questions):
+    """Largura de trabalho do pipeline OMR para o número de questões"""
+    # Para gabaritos de 20 questões, usar tamanho maior para melhor precisão
+    return 1000 if num_questions > 10 else 800
+
+
+class PreparedSheet:
+    """
+    Folha na resolução de trabalho, compartilhada pelas estratégias da cascata
+    
+    A binarização (CLAHE, limiar e morfologia) só é feita na primeira vez
+    que alguma estratégia usa thresh: uma folha lida pelos marcadores de
+    canto não passa por ela.
+    """
+    
+    def __init__(self, image, gray, num_questions, source_name=None, binarize=None, span=None):
+        self.image = image
+        self.gray = gray
+        self.num_questions = num_questions
+        self.filename = source_name.lower() if source_name else ""
+        self._binarize = binarize
+        self._span = span or (lambda stage: nullcontext())
+        self._thresh = None
+        self._resized = {}
+        self._contours = {}
+        self._contour_stats = {}
+        self._bubbles = {}
+    
+    @property
+    def thresh(self):
+        """Imagem binarizada (bolhas e marcações != 0), calculada sob demanda"""
+        if self._thresh is None:
+            self._thresh = self._binarize(self.gray)
+        return self._thresh
+    
+    def thresh_at(self, size):
+        """Imagem binarizada em outro tamanho (largura, altura), redimensionada uma vez só"""
+        height, width = self.thresh.shape[:2]
+        if size == (width, height):
+            return self.thresh
+        if size not in self._resized:
+            self._resized[size] = cv2.resize(self.thresh, size)
+        return self._resized[size]
+    
+    def contours(self, size=None):
+        """Contornos externos da imagem binarizada (no tamanho pedido), calculados uma vez só"""
+        thresh = self.thresh if size is None else self.thresh_at(size)
+        key = thresh.shape[:2]
+        if key not in self._contours:
+            with self._span('find_contours'):
+                cnts = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            self._contours[key] = imutils.grab_contours(cnts)
+        return self._contours[key]
+    
+    def contour_stats(self, size=None):
+        """
+        Área, perímetro e retângulo dos contornos (ContourStats), calculados uma vez só
+        
+        Compartilhado pelas estratégias que procuram bolhas pelos contornos
+        no mesmo tamanho (contornos e 20q na largura de 1000 px). Contornos
+        com menos de 3 pontos têm área zero e ficam de fora.
+        """
+        contours = self.contours(size)
+        key = (self.thresh if size is None else self.thresh_at(size)).shape[:2]
+        if key not in self._contour_stats:
+            with self._span('circularidade'):
+                self._contour_stats[key] = ContourStats(contours, min_points=3)
+        return self._contour_stats[key]
+    
+    def record_bubbles(self, questions, centers, radius, fills, frame_size=None):
+        """
+        Guarda onde a estratégia em execução leu cada questão
+        
+        Args:
+            questions: Índices das questões lidas
+            centers: Centros (questões x 5 x 2) das alternativas
+            radius: Raio das bolhas, no mesmo quadro dos centros
+            fills: Fração preenchida (questões x 5) de cada alternativa
+            frame_size: (largura, altura) do quadro dos centros, se não for o
+                        da imagem de trabalho (convertidos para ela aqui)
+        """
+        if not len(questions):
+            return
+        height, width = self.gray.shape[:2]
+        scale = np.ones(2) if frame_size is None else np.array([width / frame_size[0], height / frame_size[1]])
+        centers = np.asarray(centers, dtype=np.float64) * scale
+        radius = float(radius * math.sqrt(scale[0] * scale[1]))
+        for q_idx, row_centers, row_fills in zip(questions, centers, fills):
+            self._bubbles[int(q_idx)] = (row_centers, radius, row_fills)
+    
+    def take_bubbles(self):
+        """Registro da estratégia que acabou de rodar (e limpa para a próxima)"""
+        bubbles, self._bubbles = self._bubbles, {}
+        return bubbles
+
+
+class OMRResult:
+    """
+    Resultado estruturado de uma leitura
+    
+    Além das letras, traz a matriz de preenchimento (questões x 5, NaN onde
+    nenhuma estratégia leu), a confiança e a estratégia de cada questão, o
+    tempo de cada etapa e os contadores da leitura: quem recebe pode decidir
+    de novo os casos ambíguos sem reprocessar a imagem.
+    """
+    
+    # Campos de to_dict() repassados nas respostas da API (além das letras)
+    API_FIELDS = ('confianca', 'estrategias', 'preenchimento', 'tempos_ms', 'contadores')
+    
+    def __init__(self, answers, fills, confidence, strategies, timings=None, bubbles=None, counters=None):
+        self.answers = answers
+        self.fills = fills
+        self.confidence = confidence
+        self.strategies = strategies
+        self.timings = timings or {}
+        self.bubbles = bubbles
+        self.counters = counters or {}
+    
+    @classmethod
+    def blank(cls, num_questions):
+        """Leitura vazia (imagem que não pôde ser processada)"""
+        return cls(
+            [''] * num_questions,
+            np.full((num_questions, 5), np.nan),
+            np.zeros(num_questions),
+            [''] * num_questions,
+        )
+    
+    def to_dict(self):
+        """Versão serializável em JSON (matriz de preenchimento em base64)"""
+        return {
+            'respostas': self.answers,
+            'confianca': [round(float(c), 3) for c in self.confidence],
+            'estrategias': self.strategies,
+            'preenchimento': encode_fill_matrix(self.fills),
+            'tempos_ms': {stage: round(ms, 2) for stage, ms in self.timings.items()},
+            'contadores': dict(self.counters),
+        }
 
 
 class OMRProcessor:
@@ -16,6 +195,36 @@ class OMRProcessor:
     def __init__(self):
         self.debug = False
         self.debug_dir = None
+        # Objetos reaproveitados entre leituras (um processador por thread/processo)
+        self.clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
+        self.kernel_2x2 = np.ones((2, 2), np.uint8)
+        self.kernel_3x3 = np.ones((3, 3), np.uint8)
+        self._buffers = {}
+        # Confiança por questão, estratégias executadas, bolhas lidas, tempos e contadores da última leitura
+        self.last_confidence = []
+        self.last_strategies = []
+        self.last_bubbles = None
+        self.last_timings = {}
+        self.last_counters = {}
+        self.last_result = None
+        self._nested_ms = 0.0
+        
+    def _buffer(self, name, shape, width):
+        """
+        Buffer de trabalho reutilizável com a forma pedida
+
+        Um bloco por nome e largura de trabalho (a do layout), com capacidade
+        para a folha inteira nessa largura. O recorte da área de respostas e
+        as fotos de proporções diferentes usam o começo do mesmo bloco (uma
+        visão contígua), então o bloco só é realocado para crescer.
+        """
+        size = shape[0] * shape[1]
+        block = self._buffers.get((name, width))
+        if block is None or block.size < size:
+            capacity = max(size, width * int(width * BUFFER_SHEET_ASPECT))
+            block = np.empty(capacity, dtype=np.uint8)
+            self._buffers[(name, width)] = block
+        return block[:size].reshape(shape)
         
     def set_debug(self, debug=True):
         """Ativa modo debug para salvar imagens de análise"""
@@ -35,316 +244,477 @@ class OMRProcessor:
         Returns:
             list: Respostas detectadas ['A', 'B', 'C', ...] ou [''] para não detectadas
         """
-        try:
-            # Carregar e preprocessar a imagem
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError(f"Não foi possível carregar a imagem: {image_path}")
-            
-            # Para gabaritos de 20 questões, usar tamanho maior para melhor precisão
-            if num_questions > 10:
-                image = imutils.resize(image, width=1000)
-            else:
-                image = imutils.resize(image, width=800)
-            original = image.copy()
-            
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
-            clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-            enhanced = clahe.apply(gray)
-            
-            blurred = cv2.GaussianBlur(enhanced, (5, 5), 0)
-            
-            if num_questions > 10:
-                _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-                kernel = np.ones((2, 2), np.uint8)
-                thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-                thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel)
-            else:
-                thresh = cv2.adaptiveThreshold(
-                    blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                    cv2.THRESH_BINARY_INV, 13, 3
-                )
-                kernel = np.ones((3, 3), np.uint8)
-                thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel)
-            
-            if self.debug and self.debug_dir:
-                cv2.imwrite(os.path.join(self.debug_dir, "original_image.jpg"), original)
-                cv2.imwrite(os.path.join(self.debug_dir, "enhanced_image.jpg"), enhanced)
-                cv2.imwrite(os.path.join(self.debug_dir, "threshold_image.jpg"), thresh)
-            
-            cnts = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            cnts = imutils.grab_contours(cnts)
-            
-            question_cnts = []
-            
-            for c in cnts:
-                area = cv2.contourArea(c)
-                perimeter = cv2.arcLength(c, True)
-                
-                if area > 100 and area < 2500:
-                    # Calcular circularidade
-                    if perimeter > 0:
-                        circularity = 4 * math.pi * area / (perimeter * perimeter)
-                        
-                        # Aceitar contornos circulares
-                        if circularity > 0.6:
-                            # Aproximar o contorno
-                            approx = cv2.approxPolyDP(c, 0.02 * perimeter, True)
-                            
-                            # Aceitar contornos com forma aproximadamente circular
-                            if len(approx) >= 5:
-                                question_cnts.append(c)
-            
-            # Ordenar contornos da esquerda para direita, de cima para baixo
-            if len(question_cnts) == 0:
-                return self._fallback_detection(thresh, num_questions)
-            
-            y_coords = [cv2.boundingRect(c)[1] for c in question_cnts]
-            question_rows = []
-            current_row = []
-            last_y = -100
-            threshold_same_row = 20
-            
-            sorted_indices = sorted(range(len(y_coords)), key=lambda i: y_coords[i])
-            sorted_cnts = [question_cnts[i] for i in sorted_indices]
-            
-            for cnt in sorted_cnts:
-                y = cv2.boundingRect(cnt)[1]
-                if abs(y - last_y) > threshold_same_row and current_row:
-                    if len(current_row) > 0:
-                        question_rows.append(current_row)
-                    current_row = []
-                current_row.append(cnt)
-                last_y = y
-            
-            if current_row:
-                question_rows.append(current_row)
-            
-            question_rows = [contours.sort_contours(row, method="left-to-right")[0] for row in question_rows]
-            
-            detected_answers = []
-            questions_per_row = 5
-            
-            for row_cnts in question_rows:
-                if len(row_cnts) < questions_per_row:
-                    continue
-                
-                if len(row_cnts) > questions_per_row:
-                    row_cnts = row_cnts[:questions_per_row]
-                
-                max_filled = 0
-                answer_index = -1 # Usar -1 para indicar nenhuma resposta
-                filled_percentages = []
-                
-                for j, cnt in enumerate(row_cnts):
-                    # Criar máscara para o contorno
-                    x, y, w, h = cv2.boundingRect(cnt)
-                    mask = np.zeros(thresh.shape, dtype="uint8")
-                    cv2.drawContours(mask, [cnt], -1, 255, -1)
-                    
-                    # Calcular pixels preenchidos
-                    mask = cv2.bitwise_and(thresh, thresh, mask=mask)
-                    filled_pixels = cv2.countNonZero(mask)
-                    
-                    total_area = cv2.contourArea(cnt)
-                    fill_percentage = filled_pixels / max(total_area, 1) * 100
-                    filled_percentages.append(fill_percentage)
-                    
-                    if filled_pixels > max_filled:
-                        max_filled = filled_pixels
-                        answer_index = j
-                        
-                if len(filled_percentages) >= 2:
-                    sorted_percentages = sorted(filled_percentages, reverse=True)
-                    if len(sorted_percentages) > 1 and sorted_percentages[0] - sorted_percentages[1] < 15:
-                        if max_filled < 40:
-                            answer_index = -1
-                
-                if answer_index != -1 and max_filled > 30:
-                    detected_answers.append(chr(65 + answer_index))
-                else:
-                    detected_answers.append('')
-            
-            while len(detected_answers) < num_questions:
-                detected_answers.append('')
-                
-            if detected_answers.count('') > num_questions * 0.5:
-                print("Detecção regular com muitos resultados vazios, tentando abordagem de grade fixa")
-                grid_results = self._try_grid_approach(image, thresh, num_questions)
-                
-                if grid_results.count('') < detected_answers.count(''):
-                    print(f"Abordagem de grade melhor: {grid_results.count('')} vs {detected_answers.count('')} questões vazias")
-                    detected_answers = grid_results
-                else:
-                    print("Mantendo resultados da detecção regular")
-                    
-            filename = os.path.basename(image_path).lower() if image_path else ""
+        image = cv2.imread(image_path) if image_path else None
+        if image is None:
+            print(f"Erro no processamento OMR: Não foi possível carregar a imagem: {image_path}")
+            return [''] * num_questions
+        
+        return self.process_omr_array(image, num_questions, source_name=os.path.basename(image_path))
+    
+    def process_omr_bytes(self, data, num_questions=5, source_name=None):
+        """
+        Processa gabarito OMR a partir dos bytes de uma imagem codificada (JPEG, PNG...)
+        
+        Args:
+            data: bytes, bytearray, memoryview ou objeto com read() (ex.: UploadedFile)
+            num_questions: Número de questões no gabarito
+            source_name: Nome do arquivo de origem (usado só para detectar G5/G10)
             
-            if num_questions == 20:
-                print("Detectado gabarito de 20 questões, usando reconhecimento otimizado")
-                specific_results = self._process_20_questions_gabarito(image, thresh)
-                
-                if specific_results and specific_results.count('') < num_questions * 0.5:
-                    print(f"Método de 20 questões bem-sucedido: {specific_results.count('')} questões vazias de {num_questions}")
-                    return specific_results
-                else:
-                    print("Método de 20 questões falhou, tentando método genérico")
-            
-            # Verificar se estamos processando um gabarito específico (G5-P, G5-V, G10-P, etc.)
-            if image_path:
-                # Verificar se é um gabarito de 5 questões
-                if re.search(r'g5\-(p|v)', filename) and num_questions == 5:
-                    print("Detectado gabarito G5 específico, usando reconhecimento otimizado")
-                    specific_results = self._process_specific_g5(image, thresh)
-                    
-                    if specific_results and specific_results.count('') < detected_answers.count(''):
-                        detected_answers = specific_results
-                
-                elif re.search(r'g10\-(p|v)', filename) and num_questions == 10:
-                    print("Detectado gabarito G10 específico, usando reconhecimento otimizado")
-                    specific_results = self._process_specific_g10(image, thresh)
-                    
-                    print(f"Resultados específicos G10: {specific_results}")
-                    print(f"Resultados detectados originais: {detected_answers}")
-                    print(f"Específicos vazios: {specific_results.count('') if specific_results else 'N/A'}")
-                    print(f"Originais vazios: {detected_answers.count('')}")
-                    
-                    if specific_results and len(specific_results) == num_questions:
-                        print("Usando resultados específicos G10")
-                        detected_answers = specific_results
-                    else:
-                        print("Mantendo resultados originais")
+        Returns:
+            list: Respostas detectadas ['A', 'B', 'C', ...] ou [''] para não detectadas
+        """
+        try:
+            image = load_uploaded_image(data, target_width=working_width(num_questions))
+        except Exception as e:
+            print(f"Erro no processamento OMR: Não foi possível decodificar a imagem enviada: {str(e)}")
+            return [''] * num_questions
+        
+        return self.process_omr_array(image, num_questions, source_name=source_name)
+    
+    def process_omr_array(self, image, num_questions=5, source_name=None):
+        """
+        Processa gabarito OMR já carregado em memória, sem passar por arquivo temporário
+        
+        Returns:
+            list: Respostas detectadas ['A', 'B', 'C', ...] ou [''] para não detectadas
+                  (o resultado completo fica em last_result; ver read)
+        """
+        return self.read(image, num_questions, source_name).answers
+    
+    def read(self, image, num_questions=5, source_name=None):
+        """
+        Lê um gabarito já carregado em memória e devolve o resultado estruturado
+        
+        A imagem é preparada (redimensionada e binarizada) uma única vez e as
+        estratégias de leitura rodam em cascata sobre ela: cada uma devolve
+        respostas com uma confiança por questão e as seguintes só são
+        consultadas para as questões que continuam incertas. A cascata para
+        assim que todas as questões passam de CONFIDENCE_THRESHOLD.
+        
+        Args:
+            image: np.ndarray BGR, BGRA ou em tons de cinza
+            num_questions: Número de questões (5, 10, 15 ou 20)
+            source_name: Nome do arquivo de origem (usado só para detectar G5/G10)
             
-            return detected_answers[:num_questions]
+        Returns:
+            OMRResult: Respostas, matriz de preenchimento, confiança,
+                       estratégia por questão, tempos das etapas e contadores
+        """
+        self.last_confidence = [0.0] * num_questions
+        self.last_strategies = []
+        self.last_bubbles = None
+        self.last_timings = {}
+        self.last_counters = {'contornos_examinados': 0, 'estrategias_tentadas': 0, 'fallbacks': 0}
+        self._nested_ms = 0.0
+        start = time.perf_counter()
+        try:
+            sheet = self._timed('preparo', self._prepare_sheet, image, num_questions, source_name)
+            result = self._run_cascade(sheet)
             
         except Exception as e:
             print(f"Erro no processamento OMR: {str(e)}")
-            return [''] * num_questions
-            
-    def _try_grid_approach(self, image, thresh, num_questions=5):
+            result = OMRResult.blank(num_questions)
+        
+        self.last_timings['total'] = (time.perf_counter() - start) * 1000
+        result.timings = self.last_timings
+        result.counters = self.last_counters
+        self.last_result = result
+        return result
+    
+    @contextmanager
+    def _span(self, stage):
+        """
+        Soma o tempo (ms) do bloco em last_timings[stage]
+        
+        Etapas aninhadas (ex.: a binarização, feita sob demanda dentro da
+        primeira estratégia que a usa) são descontadas da etapa de fora, de
+        modo que os tempos somados dão o total da leitura. Sempre ativo: não
+        depende do modo debug.
+        """
+        outer_nested = self._nested_ms
+        self._nested_ms = 0.0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.last_timings[stage] = self.last_timings.get(stage, 0.0) + elapsed - self._nested_ms
+            self._nested_ms = outer_nested + elapsed
+    
+    def _timed(self, stage, fn, *args):
+        """Executa fn(*args) dentro de _span(stage)"""
+        with self._span(stage):
+            return fn(*args)
+    
+    def _count(self, name, amount=1):
+        """Soma amount no contador name da leitura atual (last_counters)"""
+        self.last_counters[name] = self.last_counters.get(name, 0) + amount
+    
+    def _prepare_sheet(self, image, num_questions, source_name=None):
+        """Redimensiona a folha para a largura de trabalho e converte para tons de cinza"""
+        if image is None or image.size == 0:
+            raise ValueError("Imagem vazia")
+        
+        if image.ndim == 3 and image.shape[2] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        
+        image = imutils.resize(image, width=working_width(num_questions))
+        
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        
+        if self.debug and self.debug_dir:
+            cv2.imwrite(os.path.join(self.debug_dir, "original_image.jpg"), image)
+        
+        return PreparedSheet(
+            image, gray, num_questions, source_name,
+            binarize=lambda gray: self._timed('binarizacao', self._binarize, gray, num_questions),
+            span=self._span,
+        )
+    
+    def _binarize(self, gray, num_questions):
+        """
+        Realça e binariza a área de respostas (usado pelas estratégias sem marcadores)
+        
+        A área das bolhas é localizada antes em uma miniatura (omr_roi); CLAHE,
+        desfoque, limiar e morfologia rodam só nesse recorte, na resolução de
+        trabalho, e o resto da imagem binária fica preto. Sem grade na
+        miniatura, a folha inteira é binarizada.
+        """
+        with self._span('roi'):
+            area = find_answer_area(gray)
+        if area is None:
+            area = (0, 0, gray.shape[1], gray.shape[0])
+        x0, y0, x1, y1 = area
+        self._count('area_binarizada_pct', round(100 * (x1 - x0) * (y1 - y0) / gray.size))
+        
+        width = gray.shape[1]  # largura de trabalho do layout (working_width)
+        thresh_full = self._buffer('thresh', gray.shape, width)
+        if (x1 - x0, y1 - y0) != (gray.shape[1], gray.shape[0]):
+            thresh_full.fill(0)
+        crop = gray[y0:y1, x0:x1]
+        thresh = thresh_full[y0:y1, x0:x1]
+        shape = crop.shape
+        
+        with self._span('clahe'):
+            enhanced = self.clahe.apply(crop, self._buffer('enhanced', shape, width))
+        
+        with self._span('desfoque'):
+            blurred = cv2.GaussianBlur(enhanced, (5, 5), 0, dst=self._buffer('blurred', shape, width))
+        
+        # Limiarização e morfologia alternam entre dois buffers fixos
+        morph = self._buffer('morph', shape, width)
+        if num_questions > 10:
+            with self._span('limiar'):
+                cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU, dst=thresh)
+            with self._span('morfologia'):
+                cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, self.kernel_2x2, dst=morph)
+                cv2.morphologyEx(morph, cv2.MORPH_OPEN, self.kernel_2x2, dst=thresh)
+        else:
+            with self._span('limiar'):
+                cv2.adaptiveThreshold(
+                    blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                    cv2.THRESH_BINARY_INV, 13, 3, dst=morph
+                )
+            with self._span('morfologia'):
+                cv2.morphologyEx(morph, cv2.MORPH_OPEN, self.kernel_3x3, dst=thresh)
+        
+        if self.debug and self.debug_dir:
+            cv2.imwrite(os.path.join(self.debug_dir, "enhanced_image.jpg"), enhanced)
+            cv2.imwrite(os.path.join(self.debug_dir, "threshold_image.jpg"), thresh_full)
+        
+        return thresh_full
+    
+    def _cascade(self, sheet):
+        """Estratégias de leitura aplicáveis à folha, da mais direta para as de coordenadas fixas"""
+        strategies = [('marcadores', self._read_markers), ('contornos', self._read_contours)]
+        
+        if sheet.num_questions == 20:
+            strategies.append(('20q', self._process_20_questions_gabarito))
+        
+        # Gabaritos específicos (G5-P, G5-V, G10-P, etc.) identificados pelo nome do arquivo
+        if re.search(r'g5\-(p|v)', sheet.filename) and sheet.num_questions == 5:
+            strategies.append(('g5', self._process_specific_g5))
+        elif re.search(r'g10\-(p|v)', sheet.filename) and sheet.num_questions == 10:
+            strategies.append(('g10', self._process_specific_g10))
+        
+        strategies.append(('grade', self._try_grid_approach))
+        return strategies
+    
+    def _run_cascade(self, sheet):
+        """
+        Executa as estratégias em ordem, consultando cada uma só para as questões incertas
+        
+        Cada estratégia recebe os índices das questões pendentes e devolve
+        (respostas, confiança). Uma resposta só substitui a atual quando vem
+        com confiança maior; questões que a estratégia não leu têm confiança NaN.
+        """
+        num_questions = sheet.num_questions
+        answers = [''] * num_questions
+        confidence = np.full(num_questions, -1.0)
+        bubbles = [None] * num_questions
+        
+        for name, strategy in self._cascade(sheet):
+            pending = np.flatnonzero(confidence < CONFIDENCE_THRESHOLD)
+            if len(pending) == 0:
+                break
+            
+            if self.debug:
+                print(f"Estratégia {name}: {len(pending)} questões incertas")
+            
+            strategy_answers, strategy_confidence = self._timed(name, strategy, sheet, pending)
+            strategy_bubbles = sheet.take_bubbles()
+            self._count('estrategias_tentadas')
+            self.last_strategies.append(name)
+            
+            for q_idx in pending:
+                if strategy_confidence[q_idx] > confidence[q_idx]:
+                    answers[q_idx] = strategy_answers[q_idx]
+                    confidence[q_idx] = strategy_confidence[q_idx]
+                    if q_idx in strategy_bubbles:
+                        bubbles[q_idx] = (name,) + strategy_bubbles[q_idx]
+        
+        fills = np.full((num_questions, 5), np.nan)
+        strategies = [''] * num_questions
+        for q_idx, entry in enumerate(bubbles):
+            if entry is not None:
+                strategies[q_idx] = entry[0]
+                fills[q_idx] = entry[3]
+        
+        if (confidence < 0).all():
+            # Nenhuma estratégia encontrou as bolhas: dividir a folha em faixas
+            if self.debug:
+                print("Nenhuma bolha localizada, usando detecção alternativa")
+            answers = self._timed('fallback', self._fallback_detection, sheet.thresh, num_questions)
+            self._count('fallbacks')
+            self.last_strategies.append('fallback')
+            strategies = ['fallback'] * num_questions
+        
+        confidence = np.clip(confidence, 0, 1)
+        self.last_confidence = [round(float(c), 3) for c in confidence]
+        self.last_bubbles = self._bubble_report(sheet, bubbles)
+        return OMRResult(answers, fills, confidence, strategies, bubbles=self.last_bubbles)
+    
+    @staticmethod
+    def _bubble_report(sheet, bubbles):
+        """
+        Registro compacto (serializável em JSON) de onde cada questão foi lida
+        
+        Substitui as imagens de debug: guarda só centros e raio das
+        alternativas no quadro da imagem de trabalho (o preenchimento vai na
+        matriz do OMRResult), e a sobreposição anotada é desenhada sob
+        demanda (omr_overlay).
+        """
+        height, width = sheet.gray.shape[:2]
+        questoes = []
+        for entry in bubbles:
+            if entry is None:
+                questoes.append(None)
+                continue
+            _, centers, radius, _ = entry
+            questoes.append({
+                'raio': round(radius, 1),
+                'centros': np.rint(centers).astype(int).tolist(),
+            })
+        return {'largura': width, 'altura': height, 'questoes': questoes}
+    
+    def _read_markers(self, sheet, questions):
+        """
+        Leitura direta pelos marcadores de canto da folha impressa (visualizar_prova.html)
+        
+        Os marcadores são procurados em uma cópia reduzida; uma homografia
+        retifica só a região das bolhas para o quadro do formato e cada bolha é
+        lida na posição do mapa compilado, sem busca por contornos.
+        """
+        num_questions = sheet.num_questions
+        answers = [''] * num_questions
+        fills = np.full((num_questions, 5), np.nan)
+        
+        layout = layout_for(num_questions)
+        marks = find_corner_marks(sheet.gray, layout)
+        if marks is None:
+            return answers, np.full(num_questions, np.nan)
+        
+        # Quadro retificado na mesma escala da largura de trabalho
+        scale = sheet.gray.shape[1] / layout.ref_size[0]
+        region, (x0, y0), to_region = warp_answer_region(sheet.gray, marks, layout, scale)
+        region = cv2.GaussianBlur(region, (5, 5), 0)
+        _, region_thresh = cv2.threshold(region, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        
+        if self.debug and self.debug_dir:
+            cv2.imwrite(os.path.join(self.debug_dir, "marcadores_regiao.jpg"), region_thresh)
+        
+        ref_width, ref_height = layout.ref_size
+        bubble_map = layout.compile(round(ref_width * scale), round(ref_height * scale), num_questions)
+        questions = [q_idx for q_idx in questions if q_idx < len(bubble_map)]
+        centers = bubble_map.centers[questions] - np.array([x0, y0])
+        filled = score_bubbles(region_thresh, centers, bubble_map.radius)
+        
+        area = disk_area(bubble_map.radius)
+        for q_idx, row_filled in zip(questions, filled):
+            max_idx, max_filled = pick_answer(row_filled)
+            fills[q_idx] = row_filled / area
+            if max_idx >= 0 and max_filled >= MARK_FILL_RATIO * area:
+                answers[q_idx] = chr(65 + max_idx)
+        
+        # Centros de volta para a foto (inversa da homografia)
+        if len(questions):
+            photo_centers = cv2.perspectiveTransform(
+                centers.reshape(-1, 1, 2).astype(np.float64), np.linalg.inv(to_region)
+            ).reshape(centers.shape)
+            sheet.record_bubbles(questions, photo_centers, bubble_map.radius, fills[questions])
+        
+        if self.debug:
+            print(f"Marcadores encontrados ({layout.name}): {answers}")
+        
+        return answers, answer_confidence(fills, answers)
+    
+    def _read_contours(self, sheet, questions=None):
+        """
+        Leitura principal: localiza as bolhas pelos contornos e agrupa em colunas e linhas
+        
+        As colunas de questões são separadas pelos vãos horizontais entre as
+        bolhas e numeradas de cima para baixo, coluna por coluna. Se o número de
+        linhas completas não bater com o de questões, a numeração é duvidosa e
+        a confiança cai pela metade.
+        """
+        num_questions = sheet.num_questions
+        thresh = sheet.thresh
+        answers = [''] * num_questions
+        fills = np.full((num_questions, 5), np.nan)
+        
+        self._count('contornos_examinados', len(sheet.contours()))
+        
+        # Área, perímetro e retângulo de todos os contornos de uma vez; só os
+        # poucos que passam pela área e pela circularidade são aproximados
+        # por polígono (bolhas têm 5 vértices ou mais)
+        stats = sheet.contour_stats()
+        with self._span('circularidade'):
+            candidates = np.array([
+                i for i in stats.select(100, 2500, 0.6)
+                if len(cv2.approxPolyDP(stats.contours[i], 0.02 * stats.perimeter[i], True)) >= 5
+            ], dtype=np.intp)
+        
+        if len(candidates) == 0:
+            return answers, np.full(num_questions, np.nan)
+        
+        # Descartar dígitos e letras: bolhas são quase quadradas no retângulo
+        # envolvente e têm o tamanho típico dos candidatos
+        w, h = stats.w[candidates], stats.h[candidates]
+        bubble_w = np.median(w)
+        bubble_h = np.median(h)
+        aspect = w / h
+        bubbles = candidates[(aspect >= 0.75) & (aspect <= 1.33) & (w >= 0.6 * bubble_w) & (w <= 1.5 * bubble_w)]
+        
+        # Colunas de questões separadas pelos vãos maiores que duas bolhas e,
+        # em cada coluna, linhas pelos vãos maiores que meia bolha
+        centers = stats.box_centers[bubbles]
+        order, row_ids = cluster_rows(centers[:, 0], centers[:, 1], 2 * bubble_w, bubble_h / 2)
+        
+        questions_per_row = 5
+        question_rows = bubbles[full_rows(order, row_ids, questions_per_row)]
+        rows = question_rows[:num_questions]
+        
+        filled = np.array([self._contour_fill(thresh, stats.contours[i]) for i in rows.ravel()], dtype=np.float64)
+        filled = filled.reshape(rows.shape)
+        filled_percentages = filled / np.maximum(stats.area[rows], 1) * 100
+        
+        # Alternativa com mais pixels marcados, a não ser que empate com a
+        # segunda (menos de 15 pontos) em uma marcação fraca
+        max_filled = filled.max(axis=1, initial=0)
+        answer_index = filled.argmax(axis=1) if len(rows) else np.zeros(0, dtype=np.intp)
+        top_two = np.sort(filled_percentages, axis=1)[:, -2:]
+        ambiguous = (top_two[:, 1] - top_two[:, 0] < 15) & (max_filled < 40)
+        for q_idx in np.flatnonzero(~ambiguous & (max_filled > 30)):
+            answers[q_idx] = chr(65 + answer_index[q_idx])
+        
+        fills[:len(rows)] = filled_percentages / 100
+        
+        sheet.record_bubbles(range(len(rows)), stats.box_centers[rows], (bubble_w + bubble_h) / 4, fills[:len(rows)])
+        
+        confidence = answer_confidence(fills, answers)
+        if len(question_rows) != num_questions:
+            if self.debug:
+                print(f"Contornos: {len(question_rows)} linhas de bolhas para {num_questions} questões")
+            confidence = confidence / 2
+        
+        return answers, confidence
+    
+    @staticmethod
+    def _contour_fill(thresh, cnt):
+        """Pixels marcados dentro de um contorno, usando só o retângulo envolvente dele"""
+        x, y, w, h = cv2.boundingRect(cnt)
+        mask = np.zeros((h, w), dtype="uint8")
+        cv2.drawContours(mask, [cnt], -1, 255, -1, offset=(-x, -y))
+        return cv2.countNonZero(cv2.bitwise_and(thresh[y:y + h, x:x + w], mask))
+            
+    def _try_grid_approach(self, sheet, questions):
         """Detecção usando abordagem de grade fixa"""
+        num_questions = sheet.num_questions
         try:
-            if num_questions <= 10:
-                target_size = (800, 1100)
-            else:
-                target_size = (1000, 1400)
-            
-            image = cv2.resize(image, target_size)
-            thresh = cv2.resize(thresh, target_size)
-            
-            roi_regions = []
-            
-            if num_questions <= 5:
-                roi_regions = [
-                    [475, 525, [450, 500, 550, 600, 650]],
-                    [540, 590, [450, 500, 550, 600, 650]],
-                    [605, 655, [450, 500, 550, 600, 650]],
-                    [670, 720, [450, 500, 550, 600, 650]],
-                    [735, 785, [450, 500, 550, 600, 650]],
-                ]
-            elif num_questions <= 10:
-                base_y = 450
-                y_gap = 50
-                x_positions = [450, 500, 550, 600, 650]
-                
-                for i in range(num_questions):
-                    y_start = base_y + (i * y_gap)
-                    y_end = y_start + 40
-                    roi_regions.append([y_start, y_end, x_positions])
-                    
-            elif num_questions <= 15:
-                base_y = 420
-                y_gap = 40
-                x_positions = [450, 500, 550, 600, 650]
-                
-                for i in range(num_questions):
-                    y_start = base_y + (i * y_gap)
-                    y_end = y_start + 35
-                    roi_regions.append([y_start, y_end, x_positions])
-                    
-            else:
-                left_x_positions = [250, 300, 350, 400, 450]
-                right_x_positions = [550, 600, 650, 700, 750]
-                
-                base_y = 400
-                y_gap = 35
-                
-                for i in range(10):
-                    y_start = base_y + (i * y_gap)
-                    y_end = y_start + 30
-                    roi_regions.append([y_start, y_end, left_x_positions])
-                
-                for i in range(10):
-                    y_start = base_y + (i * y_gap)
-                    y_end = y_start + 30
-                    roi_regions.append([y_start, y_end, right_x_positions])
+            thresh = sheet.thresh
+            height, width = thresh.shape[:2]
+            bubble_map = layout_for(num_questions, 'grade').compile(width, height, num_questions)
             
-            detected_answers = []
-            circle_radius = 15 if num_questions > 15 else 20
+            detected_answers = [''] * num_questions
+            fills = np.full((num_questions, 5), np.nan)
+            circle_radius = bubble_map.radius
             
             # Criar uma cópia da imagem para visualização se debug ativado
             if self.debug and self.debug_dir:
                 debug_image = cv2.cvtColor(thresh.copy(), cv2.COLOR_GRAY2BGR)
                 cv2.imwrite(os.path.join(self.debug_dir, "threshold_grid.jpg"), thresh)
             
-            for q_idx, (y_start, y_end, x_positions) in enumerate(roi_regions):
-                if q_idx >= num_questions:
-                    break
-                    
-                max_filled = 0
-                answer_idx = -1
+            # Alternativas das questões pendentes, pontuadas em uma única passada
+            centers = bubble_map.centers
+            questions, filled = self._score_layout(thresh, bubble_map, questions)
+            
+            for q_idx, row_filled in zip(questions, filled):
+                answer_idx, max_filled = pick_answer(row_filled)
+                fills[q_idx] = row_filled / disk_area(circle_radius)
                 
-                for alt_idx, x_center in enumerate(x_positions):
-                    # Criar uma máscara circular
-                    y_center = (y_start + y_end) // 2
-                    mask = np.zeros(thresh.shape, dtype=np.uint8)
-                    cv2.circle(mask, (x_center, y_center), circle_radius, 255, -1)
-                    
-                    # Aplicar máscara e contar pixels preenchidos
-                    masked = cv2.bitwise_and(thresh, thresh, mask=mask)
-                    filled_pixels = cv2.countNonZero(masked)
-                    
-                    # Debug info
-                    if self.debug:
+                # Debug info
+                if self.debug:
+                    running_max = 0
+                    for alt_idx, filled_pixels in enumerate(row_filled):
+                        x_center, y_center = (int(v) for v in centers[q_idx][alt_idx])
                         print(f"Grid Q{q_idx+1}, Alt {chr(65+alt_idx)}: {filled_pixels} pixels")
                         
                         if self.debug_dir:
                             # Desenhar círculo na imagem de debug
-                            color = (0, 0, 255) if filled_pixels > max_filled else (0, 255, 0)
+                            color = (0, 0, 255) if filled_pixels > running_max else (0, 255, 0)
                             cv2.circle(debug_image, (x_center, y_center), circle_radius, color, 2)
                             cv2.putText(debug_image, f"Q{q_idx+1}", (x_center - 10, y_center - 25), 
                                         cv2.FONT_HERSHEY_SIMPLEX, 0.3, color, 1)
-                    
-                    # Atualizar se for a alternativa mais preenchida
-                    if filled_pixels > max_filled:
-                        max_filled = filled_pixels
-                        answer_idx = alt_idx
+                        running_max = max(running_max, filled_pixels)
                 
                 # Adicionar resposta detectada (threshold ajustado para mais questões)
                 threshold = 25 if num_questions > 15 else 30
                 if answer_idx != -1 and max_filled > threshold:
-                    detected_answers.append(chr(65 + answer_idx))
+                    detected_answers[q_idx] = chr(65 + answer_idx)
                     if self.debug:
                         print(f"Questão {q_idx+1}: {chr(65 + answer_idx)} (preenchimento: {max_filled})")
                 else:
-                    detected_answers.append('')
                     if self.debug:
                         print(f"Questão {q_idx+1}: Não detectada (preenchimento: {max_filled})")
             
+            sheet.record_bubbles(questions, centers[questions], circle_radius, fills[questions])
+            
             # Salvar imagem de debug
             if self.debug and self.debug_dir:
                 cv2.imwrite(os.path.join(self.debug_dir, "debug_grid.jpg"), debug_image)
             
-            # Garantir que temos o número correto de respostas
-            while len(detected_answers) < num_questions:
-                detected_answers.append('')
-                
-            return detected_answers
+            return detected_answers, answer_confidence(fills, detected_answers)
                 
         except Exception as e:
             print(f"Erro na abordagem de grade: {str(e)}")
-            return [''] * num_questions
+            return [''] * num_questions, np.full(num_questions, np.nan)
+    
+    @staticmethod
+    def _score_layout(thresh, bubble_map, questions):
+        """Pontua as questões pendentes que existem no mapa de bolhas compilado"""
+        questions = [q_idx for q_idx in questions if q_idx < len(bubble_map)]
+        filled = score_bubbles(thresh, bubble_map.centers[questions], bubble_map.radius)
+        return questions, filled
     
     def _fallback_detection(self, thresh, num_questions):
         """Método alternativo quando detecção principal falha"""
@@ -390,22 +760,10 @@ class OMRProcessor:
                         # Ordenar círculos da esquerda para a direita
                         circles.sort(key=lambda c: c[0])
                         
-                        # Verificar qual círculo está mais preenchido
-                        max_filled = 0
-                        answer_index = -1
-                        
-                        for j, (cx, cy, cr) in enumerate(circles[:5]):  # Considerar no máximo 5 círculos
-                            # Criar máscara para o círculo
-                            circle_mask = np.zeros(region.shape, dtype="uint8")
-                            cv2.circle(circle_mask, (cx, cy), cr, 255, -1)
-                            
-                            # Calcular pixels preenchidos
-                            masked = cv2.bitwise_and(region, region, mask=circle_mask)
-                            filled_pixels = cv2.countNonZero(masked)
-                            
-                            if filled_pixels > max_filled and filled_pixels > 20:
-                                max_filled = filled_pixels
-                                answer_index = j
+                        # Verificar qual círculo está mais preenchido (no máximo 5 círculos)
+                        answer_index, max_filled = pick_answer(score_bubbles(region, circles[:5]))
+                        if max_filled <= 20:
+                            answer_index = -1
                         
                         if answer_index != -1 and answer_index < 5:
                             answers.append(chr(65 + answer_index))
@@ -452,19 +810,9 @@ class OMRProcessor:
                         # Processo semelhante ao caso acima
                         circles.sort(key=lambda c: c[0])
                         
-                        max_filled = 0
-                        answer_index = -1
-                        
-                        for j, (cx, cy, cr) in enumerate(circles[:5]):
-                            circle_mask = np.zeros(region.shape, dtype="uint8")
-                            cv2.circle(circle_mask, (cx, cy), cr, 255, -1)
-                            
-                            masked = cv2.bitwise_and(region, region, mask=circle_mask)
-                            filled_pixels = cv2.countNonZero(masked)
-                            
-                            if filled_pixels > max_filled and filled_pixels > 20:
-                                max_filled = filled_pixels
-                                answer_index = j
+                        answer_index, max_filled = pick_answer(score_bubbles(region, circles[:5]))
+                        if max_filled <= 20:
+                            answer_index = -1
                         
                         if answer_index != -1:
                             answers.append(chr(65 + answer_index))
@@ -483,125 +831,99 @@ class OMRProcessor:
             print(f"Erro no fallback: {str(e)}")
             return [''] * num_questions
             
-    def _process_specific_g5(self, image, thresh):
+    def _process_specific_g5(self, sheet, questions):
         """
         Processamento otimizado para o gabarito G5-P/V
         """
+        thresh = sheet.thresh
         try:
-            positions = [
-                [490, [452, 503, 554, 605, 656]],
-                [548, [452, 503, 554, 605, 656]],
-                [606, [452, 503, 554, 605, 656]],
-                [664, [452, 503, 554, 605, 656]],
-                [722, [452, 503, 554, 605, 656]]
-            ]
+            height, width = thresh.shape[:2]
+            bubble_map = get_layout('g5').compile(width, height, sheet.num_questions)
             
             if self.debug and self.debug_dir:
                 debug_image = cv2.cvtColor(thresh.copy(), cv2.COLOR_GRAY2BGR)
                 cv2.imwrite(os.path.join(self.debug_dir, "thresh_g5_specific.jpg"), thresh)
             
-            results = []
-            radius = 25
+            results = [''] * sheet.num_questions
+            fills = np.full((sheet.num_questions, 5), np.nan)
+            radius = bubble_map.radius
             
-            for q_idx, (y, x_positions) in enumerate(positions):
-                max_filled = 0
-                max_idx = -1
+            centers = bubble_map.centers
+            questions, filled = self._score_layout(thresh, bubble_map, questions)
+            
+            for q_idx, row_filled in zip(questions, filled):
+                max_idx, max_filled = pick_answer(row_filled)
+                fills[q_idx] = row_filled / disk_area(radius)
                 
-                for alt_idx, x in enumerate(x_positions):
-                    mask = np.zeros(thresh.shape, dtype=np.uint8)
-                    cv2.circle(mask, (x, y), radius, 255, -1)
-                    
-                    masked = cv2.bitwise_and(thresh, thresh, mask=mask)
-                    filled_pixels = cv2.countNonZero(masked)
-                    
-                    # Debug info
-                    if self.debug:
+                # Debug info
+                if self.debug:
+                    running_max = 0
+                    for alt_idx, filled_pixels in enumerate(row_filled):
+                        x, y = (int(v) for v in centers[q_idx][alt_idx])
                         print(f"G5 específico Q{q_idx+1}, Alt {chr(65+alt_idx)}: {filled_pixels} pixels")
                         
                         if self.debug_dir:
                             # Desenhar círculo na imagem de debug
-                            color = (0, 0, 255) if filled_pixels > max_filled else (0, 255, 0)
+                            color = (0, 0, 255) if filled_pixels > running_max else (0, 255, 0)
                             cv2.circle(debug_image, (x, y), radius, color, 2)
                             cv2.putText(debug_image, f"{filled_pixels}", (x - 15, y - 30), 
                                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
-                    
-                    # Atualizar se for o maior preenchimento
-                    if filled_pixels > max_filled:
-                        max_filled = filled_pixels
-                        max_idx = alt_idx
+                        running_max = max(running_max, filled_pixels)
                 
                 # Adicionar resultado
                 if max_idx >= 0 and max_filled > 50:  # Limiar um pouco mais alto para maior precisão
-                    results.append(chr(65 + max_idx))
-                else:
-                    results.append('')
+                    results[q_idx] = chr(65 + max_idx)
+            
+            sheet.record_bubbles(questions, centers[questions], radius, fills[questions])
             
             # Salvar imagem de debug
             if self.debug and self.debug_dir:
                 cv2.imwrite(os.path.join(self.debug_dir, "debug_g5_specific.jpg"), debug_image)
             
-            return results
+            return results, answer_confidence(fills, results)
             
         except Exception as e:
             print(f"Erro no processamento específico G5: {str(e)}")
-            return []
+            return [''] * sheet.num_questions, np.full(sheet.num_questions, np.nan)
     
-    def _process_specific_g10(self, image, thresh):
+    def _process_specific_g10(self, sheet, questions):
         """Processamento otimizado para gabarito G10"""
         try:
-            image = cv2.resize(image, (800, 1100))
-            thresh = cv2.resize(thresh, (800, 1100))
-            
-            positions = [
-                [355, [290, 341, 392, 443, 494]],
-                [413, [290, 341, 392, 443, 494]],
-                [471, [290, 341, 392, 443, 494]],
-                [529, [290, 341, 392, 443, 494]],
-                [587, [290, 341, 392, 443, 494]],
-                [645, [290, 341, 392, 443, 494]],
-                [703, [290, 341, 392, 443, 494]],
-                [761, [290, 341, 392, 443, 494]],
-                [819, [290, 341, 392, 443, 494]],
-                [877, [290, 341, 392, 443, 494]]
-            ]
+            thresh = sheet.thresh
+            height, width = thresh.shape[:2]
+            bubble_map = get_layout('g10').compile(width, height, sheet.num_questions)
             
             if self.debug and self.debug_dir:
                 debug_image = cv2.cvtColor(thresh.copy(), cv2.COLOR_GRAY2BGR)
                 cv2.imwrite(os.path.join(self.debug_dir, "thresh_g10_specific.jpg"), thresh)
             
-            results = []
-            radius = 22  # Raio ajustado para G10
+            results = [''] * sheet.num_questions
+            fills = np.full((sheet.num_questions, 5), np.nan)
+            radius = bubble_map.radius
             
             # Respostas corretas conhecidas para validação
             known_answers = ['A', 'A', 'B', 'B', 'C', 'D', 'E', 'A', 'C', 'B']
             
-            for q_idx, (y, x_positions) in enumerate(positions):
-                max_filled = 0
-                max_idx = -1
-                filled_counts = []
+            centers = bubble_map.centers
+            questions, filled = self._score_layout(thresh, bubble_map, questions)
+            
+            for q_idx, row_filled in zip(questions, filled):
+                max_idx, max_filled = pick_answer(row_filled)
+                filled_counts = row_filled.tolist()
+                fills[q_idx] = row_filled / disk_area(radius)
                 
-                for alt_idx, x in enumerate(x_positions):
-                    # Criar máscara circular
-                    mask = np.zeros(thresh.shape, dtype=np.uint8)
-                    cv2.circle(mask, (x, y), radius, 255, -1)
-                    
-                    # Aplicar máscara
-                    masked = cv2.bitwise_and(thresh, thresh, mask=mask)
-                    filled_pixels = cv2.countNonZero(masked)
-                    filled_counts.append(filled_pixels)
-                    
-                    if self.debug:
+                if self.debug:
+                    running_max = 0
+                    for alt_idx, filled_pixels in enumerate(filled_counts):
+                        x, y = (int(v) for v in centers[q_idx][alt_idx])
                         print(f"G10 específico Q{q_idx+1}, Alt {chr(65+alt_idx)}: {filled_pixels} pixels")
                         
                         if self.debug_dir:
-                            color = (0, 0, 255) if filled_pixels > max_filled else (0, 255, 0)
+                            color = (0, 0, 255) if filled_pixels > running_max else (0, 255, 0)
                             cv2.circle(debug_image, (x, y), radius, color, 2)
                             cv2.putText(debug_image, f"{filled_pixels}", (x - 15, y - 30), 
                                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
-                    
-                    if filled_pixels > max_filled:
-                        max_filled = filled_pixels
-                        max_idx = alt_idx
+                        running_max = max(running_max, filled_pixels)
                 
                 if self.debug:
                     print(f"Questão {q_idx+1} - valores: {filled_counts}, max_idx: {max_idx}, max_filled: {max_filled}")
@@ -609,96 +931,89 @@ class OMRProcessor:
                 corrected_answer = None
                 
                 if q_idx == 9:
-                    print(f"Questão 10 ESPECIAL - valores de preenchimento: {filled_counts}")
-                    print(f"A={filled_counts[0]}, B={filled_counts[1]}, C={filled_counts[2]}, D={filled_counts[3]}, E={filled_counts[4]}")
+                    if self.debug:
+                        print(f"Questão 10 ESPECIAL - valores de preenchimento: {filled_counts}")
+                        print(f"A={filled_counts[0]}, B={filled_counts[1]}, C={filled_counts[2]}, D={filled_counts[3]}, E={filled_counts[4]}")
                     
                     if filled_counts[1] > 200:
                         corrected_answer = 'B'
-                        print(f"Questão 10: Correção aplicada - forçando B (preenchimento: {filled_counts[1]})")
-                    else:
+                        if self.debug:
+                            print(f"Questão 10: Correção aplicada - forçando B (preenchimento: {filled_counts[1]})")
+                    elif self.debug:
                         print(f"Questão 10: B tem preenchimento baixo ({filled_counts[1]}), usando detecção normal")
                 
                 if corrected_answer:
-                    results.append(corrected_answer)
+                    results[q_idx] = corrected_answer
                     if self.debug:
                         print(f"Questão {q_idx+1}: Resposta corrigida = {corrected_answer}")
                 elif max_idx >= 0 and max_filled > 30:  # Usar detecção normal
-                    results.append(chr(65 + max_idx))
+                    results[q_idx] = chr(65 + max_idx)
                     if self.debug:
                         print(f"Questão {q_idx+1}: Resposta detectada = {chr(65 + max_idx)}")
                 else:
-                    results.append('')
                     if self.debug:
                         print(f"Questão {q_idx+1}: Nenhuma resposta detectada (max_filled={max_filled})")
             
+            sheet.record_bubbles(questions, centers[questions], radius, fills[questions])
+            
             # Salvar imagem de debug
             if self.debug and self.debug_dir:
                 cv2.imwrite(os.path.join(self.debug_dir, "debug_g10_specific.jpg"), debug_image)
             
-            return results
+            return results, answer_confidence(fills, results)
             
         except Exception as e:
             print(f"Erro no processamento específico G10: {str(e)}")
-            return []
+            return [''] * sheet.num_questions, np.full(sheet.num_questions, np.nan)
     
-    def _process_20_questions_gabarito(self, image, thresh):
+    def _process_20_questions_gabarito(self, sheet, questions):
         """
         Processamento otimizado para gabarito de 20 questões em formato de duas colunas
         """
         try:
-            # Redimensionar para tamanho padrão - manter proporção original
-            original_height, original_width = image.shape[:2]
+            # Tamanho padrão mantendo a proporção original (já é a largura de trabalho)
+            original_height, original_width = sheet.thresh.shape[:2]
             target_width = 1000
             target_height = int(original_height * target_width / original_width)
-            image = cv2.resize(image, (target_width, target_height))
-            thresh = cv2.resize(thresh, (target_width, target_height))
+            thresh = sheet.thresh_at((target_width, target_height))
             
             if self.debug and self.debug_dir:
                 debug_image = cv2.cvtColor(thresh.copy(), cv2.COLOR_GRAY2BGR)
                 cv2.imwrite(os.path.join(self.debug_dir, "thresh_20q.jpg"), thresh)
             
-            contours = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            contours = imutils.grab_contours(contours)
-            
-            circles = []
-            for contour in contours:
-                area = cv2.contourArea(contour)
-                if 80 < area < 2000:  # Tamanho esperado dos círculos (mais permissivo)
-                    perimeter = cv2.arcLength(contour, True)
-                    if perimeter > 0:
-                        circularity = 4 * math.pi * area / (perimeter * perimeter)
-                        if circularity > 0.3:  # Mais permissivo para formas circulares
-                            x, y, w, h = cv2.boundingRect(contour)
-                            center_x = x + w // 2
-                            center_y = y + h // 2
-                            circles.append((center_x, center_y, area))
+            self._count('contornos_examinados', len(sheet.contours((target_width, target_height))))
+            stats = sheet.contour_stats((target_width, target_height))
+            with self._span('circularidade'):
+                # Tamanho esperado dos círculos e circularidade mais permissivos
+                selected = stats.select(80, 2000, 0.3)
+                circles = np.column_stack([
+                    stats.x[selected] + stats.w[selected] // 2,
+                    stats.y[selected] + stats.h[selected] // 2,
+                    stats.area[selected],
+                ])
             
             if len(circles) < 50:  # Esperamos pelo menos 50 círculos (20 questões × 5 alternativas × 2 colunas)
-                print(f"Poucos círculos detectados ({len(circles)}), usando coordenadas fixas")
-                return self._use_fixed_coordinates_20q(image, thresh, target_height)
-            
-            # Organizar círculos por posição
-            # Separar em coluna esquerda e direita
-            circles.sort(key=lambda c: c[0])  # Ordenar por X
+                if self.debug:
+                    print(f"Poucos círculos detectados ({len(circles)}), usando coordenadas fixas")
+                self._count('fallbacks')
+                return self._use_fixed_coordinates_20q(thresh, questions, sheet)
             
-            # Dividir em duas colunas
+            # Dividir em coluna esquerda e direita
             mid_x = target_width // 2
-            left_circles = [c for c in circles if c[0] < mid_x]
-            right_circles = [c for c in circles if c[0] >= mid_x]
+            left_circles = circles[circles[:, 0] < mid_x]
+            right_circles = circles[circles[:, 0] >= mid_x]
             
             # Organizar por linhas
             def organize_by_rows(column_circles):
-                rows = {}
-                for x, y, area in column_circles:
-                    row_key = y // 35 * 35  # Agrupar em intervalos menores (35 pixels)
-                    if row_key not in rows:
-                        rows[row_key] = []
-                    rows[row_key].append((x, y, area))
+                # Agrupar em intervalos de 35 pixels, cada faixa ordenada por X
+                row_keys = column_circles[:, 1] // 35
+                column_circles = column_circles[np.lexsort((column_circles[:, 0], row_keys))]
+                row_keys = np.sort(row_keys)
+                starts = np.flatnonzero(np.diff(row_keys, prepend=-1))
                 
-                # Ordenar cada linha por X e pegar apenas os 5 primeiros
                 organized_rows = []
-                for row_y in sorted(rows.keys()):
-                    row_circles = sorted(rows[row_y], key=lambda c: c[0])
+                for row in np.split(column_circles, starts[1:]):
+                    row_circles = [tuple(c) for c in row.tolist()]
                     # Aceitar linhas com pelo menos 4 círculos (algumas podem estar mal detectadas)
                     if len(row_circles) >= 4:
                         # Garantir que temos exatamente 5 círculos, preenchendo com posições interpoladas se necessário
@@ -715,238 +1030,148 @@ class OMRProcessor:
             right_rows = organize_by_rows(right_circles)
             
             results = [''] * 20
+            fills = np.full((20, 5), np.nan)
             circle_radius = 18
             
-            # Processar coluna esquerda (questões 1-10)
-            for row_idx, row_circles in enumerate(left_rows):
-                if row_idx >= 10:
-                    break
-                
-                max_filled = 0
-                max_idx = -1
-                filled_values = []
+            # Coluna esquerda (questões 1-10) e coluna direita (questões 11-20)
+            columns = [
+                (left_rows[:10], 0, self._apply_manual_corrections_left),
+                (right_rows[:10], 10, self._apply_manual_corrections_right),
+            ]
+            
+            read_centers = []
+            for column_rows, first_question, apply_corrections in columns:
+                centers = [[(x, y) for x, y, _ in row_circles] for row_circles in column_rows]
+                filled = score_bubbles(thresh, centers, circle_radius)
+                read_centers.extend(centers)
                 
-                for alt_idx, (x, y, _) in enumerate(row_circles):
-                    # Garantir que x e y são inteiros
-                    x, y = int(x), int(y)
-                    
-                    # Criar máscara circular
-                    mask = np.zeros(thresh.shape, dtype=np.uint8)
-                    cv2.circle(mask, (x, y), circle_radius, 255, -1)
-                    
-                    # Aplicar máscara
-                    masked = cv2.bitwise_and(thresh, thresh, mask=mask)
-                    filled_pixels = cv2.countNonZero(masked)
-                    filled_values.append(filled_pixels)
+                for row_idx, row_filled in enumerate(filled):
+                    question_idx = row_idx + first_question
+                    max_idx, max_filled = pick_answer(row_filled)
+                    filled_values = row_filled.tolist()
+                    if len(filled_values) == 5:
+                        fills[question_idx] = row_filled / disk_area(circle_radius)
                     
                     if self.debug:
-                        print(f"Q{row_idx+1}, Alt {chr(65+alt_idx)}: {filled_pixels} pixels")
-                        
-                        if self.debug_dir:
-                            color = (0, 0, 255) if filled_pixels > max_filled else (0, 255, 0)
-                            cv2.circle(debug_image, (x, y), circle_radius, color, 2)
-                            cv2.putText(debug_image, f"Q{row_idx+1}{chr(65+alt_idx)}", 
-                                       (x - 20, y - 25), cv2.FONT_HERSHEY_SIMPLEX, 0.3, color, 1)
-                    
-                    if filled_pixels > max_filled:
-                        max_filled = filled_pixels
-                        max_idx = alt_idx
-                
-                # Definir resposta com threshold mais baixo e análise mais refinada
-                if len(filled_values) >= 5:
-                    # Ordenar valores para análise
-                    sorted_values = sorted(filled_values, reverse=True)
+                        running_max = 0
+                        for alt_idx, filled_pixels in enumerate(filled_values):
+                            x, y = (int(v) for v in centers[row_idx][alt_idx])
+                            print(f"Q{question_idx+1}, Alt {chr(65+alt_idx)}: {filled_pixels} pixels")
+                            
+                            if self.debug_dir:
+                                color = (0, 0, 255) if filled_pixels > running_max else (0, 255, 0)
+                                cv2.circle(debug_image, (x, y), circle_radius, color, 2)
+                                cv2.putText(debug_image, f"Q{question_idx+1}{chr(65+alt_idx)}", 
+                                           (x - 20, y - 25), cv2.FONT_HERSHEY_SIMPLEX, 0.3, color, 1)
+                            running_max = max(running_max, filled_pixels)
                     
-                    # Se há uma diferença clara entre o maior e o segundo maior
-                    if max_filled > 40 and (len(sorted_values) < 2 or max_filled > sorted_values[1] * 1.5):
-                        results[row_idx] = chr(65 + max_idx)
-                        if self.debug:
-                            print(f"Questão {row_idx+1}: {chr(65 + max_idx)} (preenchimento: {max_filled}, diferença clara)")
-                    else:
-                        # Aplicar correções específicas baseadas na análise visual
-                        corrected_answer = self._apply_manual_corrections_left(row_idx, filled_values)
-                        if corrected_answer:
-                            results[row_idx] = corrected_answer
-                            if self.debug:
-                                print(f"Questão {row_idx+1}: {corrected_answer} (correção manual)")
-                        elif max_filled > 30:
-                            results[row_idx] = chr(65 + max_idx)
+                    # Definir resposta com threshold mais baixo e análise mais refinada
+                    if len(filled_values) >= 5:
+                        # Ordenar valores para análise
+                        sorted_values = sorted(filled_values, reverse=True)
+                        
+                        # Se há uma diferença clara entre o maior e o segundo maior
+                        if max_filled > 40 and (len(sorted_values) < 2 or max_filled > sorted_values[1] * 1.5):
+                            results[question_idx] = chr(65 + max_idx)
                             if self.debug:
-                                print(f"Questão {row_idx+1}: {chr(65 + max_idx)} (preenchimento: {max_filled}, threshold baixo)")
+                                print(f"Questão {question_idx+1}: {chr(65 + max_idx)} (preenchimento: {max_filled}, diferença clara)")
                         else:
-                            if self.debug:
-                                print(f"Questão {row_idx+1}: Não detectada (preenchimento: {max_filled})")
-                else:
-                    if max_idx >= 0 and max_filled > 30:
-                        results[row_idx] = chr(65 + max_idx)
-                        if self.debug:
-                            print(f"Questão {row_idx+1}: {chr(65 + max_idx)} (preenchimento: {max_filled})")
-                    else:
-                        if self.debug:
-                            print(f"Questão {row_idx+1}: Não detectada (preenchimento: {max_filled})")
-            
-            # Processar coluna direita (questões 11-20)
-            for row_idx, row_circles in enumerate(right_rows):
-                if row_idx >= 10:
-                    break
-                
-                question_idx = row_idx + 10  # Questões 11-20
-                max_filled = 0
-                max_idx = -1
-                filled_values = []
-                
-                for alt_idx, (x, y, _) in enumerate(row_circles):
-                    # Garantir que x e y são inteiros
-                    x, y = int(x), int(y)
-                    
-                    # Criar máscara circular
-                    mask = np.zeros(thresh.shape, dtype=np.uint8)
-                    cv2.circle(mask, (x, y), circle_radius, 255, -1)
-                    
-                    # Aplicar máscara
-                    masked = cv2.bitwise_and(thresh, thresh, mask=mask)
-                    filled_pixels = cv2.countNonZero(masked)
-                    filled_values.append(filled_pixels)
-                    
-                    if self.debug:
-                        print(f"Q{question_idx+1}, Alt {chr(65+alt_idx)}: {filled_pixels} pixels")
-                        
-                        if self.debug_dir:
-                            color = (0, 0, 255) if filled_pixels > max_filled else (0, 255, 0)
-                            cv2.circle(debug_image, (x, y), circle_radius, color, 2)
-                            cv2.putText(debug_image, f"Q{question_idx+1}{chr(65+alt_idx)}", 
-                                       (x - 20, y - 25), cv2.FONT_HERSHEY_SIMPLEX, 0.3, color, 1)
-                    
-                    if filled_pixels > max_filled:
-                        max_filled = filled_pixels
-                        max_idx = alt_idx
-                
-                # Definir resposta com análise refinada
-                if len(filled_values) >= 5:
-                    # Ordenar valores para análise
-                    sorted_values = sorted(filled_values, reverse=True)
-                    
-                    # Se há uma diferença clara entre o maior e o segundo maior
-                    if max_filled > 40 and (len(sorted_values) < 2 or max_filled > sorted_values[1] * 1.5):
-                        results[question_idx] = chr(65 + max_idx)
-                        if self.debug:
-                            print(f"Questão {question_idx+1}: {chr(65 + max_idx)} (preenchimento: {max_filled}, diferença clara)")
+                            # Aplicar correções específicas baseadas na análise visual
+                            corrected_answer = apply_corrections(row_idx, filled_values)
+                            if corrected_answer:
+                                results[question_idx] = corrected_answer
+                                if self.debug:
+                                    print(f"Questão {question_idx+1}: {corrected_answer} (correção manual)")
+                            elif max_filled > 30:
+                                results[question_idx] = chr(65 + max_idx)
+                                if self.debug:
+                                    print(f"Questão {question_idx+1}: {chr(65 + max_idx)} (preenchimento: {max_filled}, threshold baixo)")
+                            else:
+                                if self.debug:
+                                    print(f"Questão {question_idx+1}: Não detectada (preenchimento: {max_filled})")
                     else:
-                        # Aplicar correções específicas baseadas na análise visual
-                        corrected_answer = self._apply_manual_corrections_right(row_idx, filled_values)
-                        if corrected_answer:
-                            results[question_idx] = corrected_answer
-                            if self.debug:
-                                print(f"Questão {question_idx+1}: {corrected_answer} (correção manual)")
-                        elif max_filled > 30:
+                        if max_idx >= 0 and max_filled > 30:
                             results[question_idx] = chr(65 + max_idx)
                             if self.debug:
-                                print(f"Questão {question_idx+1}: {chr(65 + max_idx)} (preenchimento: {max_filled}, threshold baixo)")
+                                print(f"Questão {question_idx+1}: {chr(65 + max_idx)} (preenchimento: {max_filled})")
                         else:
                             if self.debug:
                                 print(f"Questão {question_idx+1}: Não detectada (preenchimento: {max_filled})")
-                else:
-                    if max_idx >= 0 and max_filled > 30:
-                        results[question_idx] = chr(65 + max_idx)
-                        if self.debug:
-                            print(f"Questão {question_idx+1}: {chr(65 + max_idx)} (preenchimento: {max_filled})")
-                    else:
-                        if self.debug:
-                            print(f"Questão {question_idx+1}: Não detectada (preenchimento: {max_filled})")
+            
+            # Linhas lidas: as da coluna esquerda e depois as da direita
+            read = list(range(len(left_rows[:10]))) + list(range(10, 10 + len(right_rows[:10])))
+            sheet.record_bubbles(read, read_centers, circle_radius, fills[read],
+                                 frame_size=(target_width, target_height))
             
             # Salvar imagem de debug
             if self.debug and self.debug_dir:
                 cv2.imwrite(os.path.join(self.debug_dir, "debug_20q.jpg"), debug_image)
             
-            return results
+            return results, answer_confidence(fills, results)
             
         except Exception as e:
             print(f"Erro no processamento de 20 questões: {str(e)}")
-            return [''] * 20
+            return [''] * 20, np.full(20, np.nan)
     
-    def _use_fixed_coordinates_20q(self, image, thresh, target_height):
+    def _use_fixed_coordinates_20q(self, thresh, questions=range(20), sheet=None):
         """
         Método fallback com coordenadas fixas para gabarito de 20 questões
         """
         try:
-            # Configurações baseadas na análise da imagem real
-            target_width = 1000
-            
-            # Posições aproximadas das colunas
-            left_column_x = target_width // 4  # Coluna esquerda
-            right_column_x = target_width * 3 // 4  # Coluna direita
-            
-            # Detectar início das questões automaticamente
-            start_y = target_height // 3  # Começar em 1/3 da altura
-            
-            # Configurações
-            questions_per_column = 10
-            question_height = 45  # Altura entre questões
-            circle_radius = 18
-            
-            # Posições das alternativas A, B, C, D, E
-            alternatives_offset = [-80, -40, 0, 40, 80]
+            # Duas colunas de 10 questões começando a 1/3 da altura (formato 20q-fixo)
+            height, width = thresh.shape[:2]
+            bubble_map = get_layout('20q-fixo').compile(width, height)
+            circle_radius = bubble_map.radius
             
             results = [''] * 20
+            fills = np.full((20, 5), np.nan)
             
             if self.debug and self.debug_dir:
                 debug_image = cv2.cvtColor(thresh.copy(), cv2.COLOR_GRAY2BGR)
             
-            for col in range(2):  # 2 colunas
-                base_x = left_column_x if col == 0 else right_column_x
+            # Centros (2 colunas x 10 questões x 5 alternativas) das questões pendentes
+            centers = bubble_map.centers
+            questions, filled = self._score_layout(thresh, bubble_map, questions)
+            
+            for question_idx, row_filled in zip(questions, filled):
+                max_idx, max_filled = pick_answer(row_filled)
+                fills[question_idx] = row_filled / disk_area(circle_radius)
                 
-                for row in range(questions_per_column):
-                    question_idx = col * questions_per_column + row
-                    if question_idx >= 20:
-                        break
-                    
-                    y_pos = start_y + row * question_height
-                    
-                    max_filled = 0
-                    max_idx = -1
-                    
-                    for alt_idx, x_offset in enumerate(alternatives_offset):
-                        x_pos = base_x + x_offset
-                        
-                        # Criar máscara circular
-                        mask = np.zeros(thresh.shape, dtype=np.uint8)
-                        cv2.circle(mask, (x_pos, y_pos), circle_radius, 255, -1)
-                        
-                        # Aplicar máscara
-                        masked = cv2.bitwise_and(thresh, thresh, mask=mask)
-                        filled_pixels = cv2.countNonZero(masked)
-                        
-                        if self.debug:
-                            print(f"FIXED Q{question_idx+1}, Alt {chr(65+alt_idx)}: {filled_pixels} pixels")
-                            
-                            if self.debug_dir:
-                                color = (255, 0, 0) if filled_pixels > max_filled else (0, 255, 255)
-                                cv2.circle(debug_image, (x_pos, y_pos), circle_radius, color, 2)
-                                cv2.putText(debug_image, f"F{question_idx+1}{chr(65+alt_idx)}", 
-                                           (x_pos - 20, y_pos - 25), cv2.FONT_HERSHEY_SIMPLEX, 0.3, color, 1)
+                if self.debug:
+                    running_max = 0
+                    for alt_idx, filled_pixels in enumerate(row_filled):
+                        x_pos, y_pos = (int(v) for v in centers[question_idx][alt_idx])
+                        print(f"FIXED Q{question_idx+1}, Alt {chr(65+alt_idx)}: {filled_pixels} pixels")
                         
-                        if filled_pixels > max_filled:
-                            max_filled = filled_pixels
-                            max_idx = alt_idx
-                    
-                    # Definir resposta
-                    if max_idx >= 0 and max_filled > 25:  # Threshold um pouco mais baixo
-                        results[question_idx] = chr(65 + max_idx)
-                        if self.debug:
-                            print(f"FIXED Questão {question_idx+1}: {chr(65 + max_idx)} (preenchimento: {max_filled})")
-                    else:
-                        if self.debug:
-                            print(f"FIXED Questão {question_idx+1}: Não detectada (preenchimento: {max_filled})")
+                        if self.debug_dir:
+                            color = (255, 0, 0) if filled_pixels > running_max else (0, 255, 255)
+                            cv2.circle(debug_image, (x_pos, y_pos), circle_radius, color, 2)
+                            cv2.putText(debug_image, f"F{question_idx+1}{chr(65+alt_idx)}", 
+                                       (x_pos - 20, y_pos - 25), cv2.FONT_HERSHEY_SIMPLEX, 0.3, color, 1)
+                        running_max = max(running_max, filled_pixels)
+                
+                # Definir resposta
+                if max_idx >= 0 and max_filled > 25:  # Threshold um pouco mais baixo
+                    results[question_idx] = chr(65 + max_idx)
+                    if self.debug:
+                        print(f"FIXED Questão {question_idx+1}: {chr(65 + max_idx)} (preenchimento: {max_filled})")
+                else:
+                    if self.debug:
+                        print(f"FIXED Questão {question_idx+1}: Não detectada (preenchimento: {max_filled})")
+            
+            if sheet is not None:
+                sheet.record_bubbles(questions, centers[questions], circle_radius, fills[questions],
+                                     frame_size=(width, height))
             
             # Salvar imagem de debug
             if self.debug and self.debug_dir:
                 cv2.imwrite(os.path.join(self.debug_dir, "debug_20q_fixed.jpg"), debug_image)
             
-            return results
+            return results, answer_confidence(fills, results)
             
         except Exception as e:
             print(f"Erro no método de coordenadas fixas: {str(e)}")
-            return [''] * 20
+            return [''] * 20, np.full(20, np.nan)
     
     def _apply_manual_corrections_left(self, question_idx, filled_values):
         """
@@ -1042,40 +1267,98 @@ class OMRProcessor:
             else:
                 # Tentar detectar contornos circulares
                 cnts = cv2.findContours(region, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                cnts = imutils.grab_contours(cnts)
-                
-                circles = []
-                for c in cnts:
-                    # Calcular área e perímetro
-                    area = cv2.contourArea(c)
-                    perimeter = cv2.arcLength(c, True)
-                    
-                    # Filtrar por área
-                    if area > 100 and area < 2000:
-                        # Calcular circularidade
-                        circularity = 4 * math.pi * area / (perimeter * perimeter) if perimeter > 0 else 0
-                        
-                        # Aceitar contornos circulares
-                        if circularity > 0.6:
-                            # Calcular centro e raio aproximado
-                            M = cv2.moments(c)
-                            if M["m00"] != 0:
-                                cx = int(M["m10"] / M["m00"])
-                                cy = int(M["m01"] / M["m00"])
-                                r = int(np.sqrt(area / np.pi))
-                                circles.append((cx, cy, r))
+                stats = ContourStats(imutils.grab_contours(cnts), min_points=3)
                 
-                return circles
+                # Contornos circulares na faixa de área; centro pelos momentos e raio pela área
+                selected = stats.select(100, 2000, 0.6)
+                centers = stats.centroids[selected].astype(int)
+                radii = np.sqrt(stats.area[selected] / np.pi).astype(int)
+                return [(int(cx), int(cy), int(r)) for (cx, cy), r in zip(centers, radii)]
             
         except Exception as e:
             print(f"Erro na detecção de círculos: {str(e)}")
             return []
 
 
+def process_omr_array(image, num_questions=5):
+    """
+    Processa um gabarito já decodificado (np.ndarray BGR ou tons de cinza)
+    
+    Returns:
+        list: Respostas detectadas ['A', 'B', 'C', ...] ou [''] para vazias
+    """
+    return OMRProcessor().process_omr_array(image, num_questions)
+
+
+def process_omr_bytes(data, num_questions=5):
+    """
+    Processa um gabarito a partir dos bytes da imagem codificada, todo em memória
+    
+    Returns:
+        list: Respostas detectadas ['A', 'B', 'C', ...] ou [''] para vazias
+    """
+    return OMRProcessor().process_omr_bytes(data, num_questions)
+
+
+def load_uploaded_image(uploaded_file, target_width=None, max_pixels=MAX_IMAGE_PIXELS):
+    """
+    Decodifica o arquivo enviado direto para tons de cinza, já na largura de trabalho
+    
+    O tamanho é lido do cabeçalho antes de decodificar: imagens acima de
+    max_pixels são recusadas e, em JPEG, o decodificador reduz a escala
+    (1/2, 1/4, 1/8) no próprio DCT e só decodifica a luminância. A orientação
+    EXIF é aplicada no final, sobre a imagem já reduzida.
+    
+    Args:
+        uploaded_file: Arquivo enviado (InMemoryUploadedFile), bytes ou buffer
+        target_width: Largura mínima desejada após a orientação (None = resolução total)
+        max_pixels: Limite de pixels (largura x altura) aceito
+        
+    Returns:
+        np.ndarray: Imagem uint8 em tons de cinza pronta para OMRProcessor.process_omr_array
+    """
+    if isinstance(uploaded_file, (bytes, bytearray, memoryview)):
+        uploaded_file = io.BytesIO(uploaded_file)
+    
+    image = Image.open(uploaded_file)
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ValueError(f"Imagem muito grande: {width}x{height} pixels (limite {max_pixels})")
+    
+    orientation = image.getexif().get(_EXIF_ORIENTATION, 1)
+    
+    if target_width:
+        # Largura final corresponde à altura armazenada quando a foto está de lado
+        stored_width = height if orientation in _EXIF_TRANSPOSED else width
+        scale = min(1.0, target_width / stored_width)
+        image.draft('L', (max(1, int(width * scale)), max(1, int(height * scale))))
+    
+    if image.mode != 'L':
+        image = image.convert('L')
+    
+    if target_width:
+        # Formatos sem redução no decodificador (PNG, BMP...) são reduzidos por blocos
+        stored_width = image.height if orientation in _EXIF_TRANSPOSED else image.width
+        factor = stored_width // target_width
+        if factor >= 2:
+            image = image.reduce(factor)
+    
+    transpose = _EXIF_TRANSPOSE_METHODS.get(orientation)
+    if transpose is not None:
+        image = image.transpose(transpose)
+    
+    return np.asarray(image)
+
+
 def process_uploaded_image(uploaded_file, num_questions=5):
     """
     Processa arquivo de gabarito enviado via sistema de cadastro Django
     
+    A imagem é decodificada em tons de cinza já perto da largura de trabalho
+    e processada inteiramente em memória, sem arquivo temporário. Não grava
+    imagens de debug: onde cada questão foi lida fica em
+    get_processor().last_bubbles (ver omr_overlay).
+    
     Args:
         uploaded_file: Arquivo enviado (InMemoryUploadedFile)
         num_questions: Número de questões no gabarito
@@ -1084,36 +1367,76 @@ def process_uploaded_image(uploaded_file, num_questions=5):
         list: Respostas detectadas ['A', 'B', 'C', ...] ou [''] para vazias
     """
     try:
-        image = Image.open(uploaded_file)
-        image_array = np.array(image)
-        
-        if len(image_array.shape) == 3:
-            image_array = cv2.cvtColor(image_array, cv2.COLOR_RGB2BGR)
-        
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-            cv2.imwrite(temp_file.name, image_array)
-            temp_path = temp_file.name
-        
-        try:
-            # Processar com OMR
-            processor = OMRProcessor()
-            
-            if num_questions > 10:
-                processor.set_debug(True)
-                print(f"Debug ativado para gabarito de {num_questions} questões")
-            
-            results = processor.process_omr_image(temp_path, num_questions)
-            
-            if results.count('') > num_questions * 0.4 and not processor.debug:
-                print(f"Muitas questões vazias ({results.count('')}/{num_questions}), reprocessando com debug...")
-                processor.set_debug(True)
-                results = processor.process_omr_image(temp_path, num_questions)
-            
-            return results
-        finally:
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+        image_array = load_uploaded_image(uploaded_file, target_width=working_width(num_questions))
+        return get_processor().process_omr_array(image_array, num_questions)
                 
     except Exception as e:
         print(f"Erro ao processar arquivo enviado: {str(e)}")
         return [''] * num_questions
+
+
+_local = threading.local()
+
+
+def get_processor():
+    """OMRProcessor reaproveitado pela thread atual (mantém CLAHE, kernels e buffers)"""
+    processor = getattr(_local, 'processor', None)
+    if processor is None:
+        processor = _local.processor = OMRProcessor()
+    return processor
+
+
+def process_sheet(data, num_questions=5, name=None):
+    """
+    Processa um gabarito (bytes da imagem) e devolve um resultado serializável
+    
+    Feita para rodar em processos de um pool: não usa modo debug, que grava
+    arquivos em um diretório compartilhado.
+    
+    Returns:
+        dict: {'arquivo', 'erro', 'bolhas'} mais os campos de
+              OMRResult.to_dict() ('respostas', 'confianca', 'estrategias',
+              'preenchimento', 'tempos_ms', 'contadores'); 'bolhas' é o
+              registro compacto de OMRProcessor.last_bubbles. tempos_ms
+              inclui a decodificação da imagem ('decodificacao')
+    """
+    start = time.perf_counter()
+    try:
+        image_array = load_uploaded_image(data, target_width=working_width(num_questions))
+    except Exception as e:
+        return {'arquivo': name, 'respostas': [], 'erro': f'Imagem inválida: {str(e)}'}
+    decode_ms = (time.perf_counter() - start) * 1000
+    
+    result = get_processor().read(image_array, num_questions, source_name=name)
+    result.timings = {'decodificacao': decode_ms, **result.timings}
+    result.timings['total'] += decode_ms
+    return {'arquivo': name, 'erro': None, **result.to_dict(), 'bolhas': result.bubbles}
+
+
+def reading_details(leitura):
+    """Campos estruturados de uma leitura (process_sheet) repassados pela API junto com as respostas"""
+    return {field: leitura[field] for field in OMRResult.API_FIELDS if field in leitura}
+
+
+def process_sheets_batch(sheets, num_questions=5):
+    """
+    Processa vários gabaritos em paralelo no pool de workers OMR
+    
+    Args:
+        sheets: Lista de (nome, bytes) com as imagens enviadas
+        num_questions: Número de questões da prova
+        
+    Returns:
+        list: Um dict de process_sheet por gabarito, na mesma ordem de sheets
+    """
+    from . import omr_metrics, omr_pool
+    
+    futures = [omr_pool.submit(process_sheet, data, num_questions, name) for name, data in sheets]
+    results = []
+    for (name, _), future in zip(sheets, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append({'arquivo': name, 'respostas': [], 'erro': f'Erro no processamento OMR: {str(e)}'})
+        omr_metrics.record(results[-1])
+    return results
@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+
+# Largura mínima da miniatura: a folha é reduzida pela metade (pyrDown)
+# enquanto a metade ainda tiver pelo menos essa largura
+THUMBNAIL_WIDTH = 200
+
+# Lado mínimo (pixels da miniatura) e máximo (fração da largura) de uma bolha
+MIN_BUBBLE_SIDE = 4
+MAX_BUBBLE_SIDE = 0.08
+
+# Bolhas alinhadas em linha e em coluna necessárias para confiar na área
+MIN_GRID_BUBBLES = 10
+
+# Acima disso a miniatura é ruído demais para a comparação par a par
+MAX_CANDIDATES = 1500
+
+# Folga em volta das bolhas encontradas, em diâmetros de bolha
+AREA_MARGIN = 1.5
+
+
+def find_answer_area(gray, thumbnail_width=THUMBNAIL_WIDTH):
+    """
+    Localiza a área das bolhas em uma miniatura da folha
+
+    A folha é reduzida por uma pirâmide gaussiana e binarizada com limiar
+    adaptativo; os componentes do tamanho e do formato de uma bolha (vazia
+    ou cheia) que têm vizinhos parecidos na mesma linha e na mesma coluna
+    formam a grade de respostas. Cabeçalho, instruções e margens ficam de
+    fora: letras e números não se alinham nas duas direções com vizinhos
+    do mesmo tamanho.
+
+    Args:
+        gray: Folha em tons de cinza (resolução de trabalho)
+        thumbnail_width: Largura mínima da miniatura
+
+    Returns:
+        tuple: (x0, y0, x1, y1) da área em pixels de gray, ou None se a
+               grade não for encontrada (quem chama usa a folha inteira)
+    """
+    small = gray
+    while small.shape[1] // 2 >= thumbnail_width:
+        small = cv2.pyrDown(small)
+    scale_x = gray.shape[1] / small.shape[1]
+    scale_y = gray.shape[0] / small.shape[0]
+
+    binary = cv2.adaptiveThreshold(small, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 15, 7)
+    _, _, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(binary, 8, cv2.CV_32S, cv2.CCL_GRANA)
+    x, y, w, h, area = (stats[1:, i].astype(np.float64) for i in range(5))
+
+    # Anéis (bolhas vazias) ocupam ~30% do retângulo envolvente, bolhas cheias ~78%
+    aspect = w / np.maximum(h, 1)
+    fill = area / np.maximum(w * h, 1)
+    bubbles = np.flatnonzero(
+        (w >= MIN_BUBBLE_SIDE) & (h >= MIN_BUBBLE_SIDE) & (w <= MAX_BUBBLE_SIDE * small.shape[1]) &
+        (aspect >= 0.55) & (aspect <= 1.4) & (fill >= 0.2) & (fill <= 0.95)
+    )
+    if not MIN_GRID_BUBBLES <= len(bubbles) <= MAX_CANDIDATES:
+        return None
+
+    x, y, w, h = x[bubbles], y[bubbles], w[bubbles], h[bubbles]
+    cx, cy, side = x + w / 2, y + h / 2, np.maximum(w, h)
+
+    # Vizinhos do mesmo tamanho: na mesma linha até 4 diâmetros de distância,
+    # na mesma coluna até 5
+    pair_side = np.maximum(side[:, None], side[None, :])
+    similar = np.abs(side[:, None] - side[None, :]) <= 0.35 * pair_side
+    dx = np.abs(cx[:, None] - cx[None, :])
+    dy = np.abs(cy[:, None] - cy[None, :])
+    row_neighbors = similar & (dy < 0.5 * pair_side) & (dx > 0.5 * pair_side) & (dx < 4 * pair_side)
+    column_neighbors = similar & (dx < 0.5 * pair_side) & (dy > 0.5 * pair_side) & (dy < 5 * pair_side)
+    grid = row_neighbors.any(axis=1) & column_neighbors.any(axis=1)
+    if grid.sum() < MIN_GRID_BUBBLES:
+        return None
+
+    margin = AREA_MARGIN * np.median(side[grid])
+    x0 = max(0, int((x[grid].min() - margin) * scale_x))
+    y0 = max(0, int((y[grid].min() - margin) * scale_y))
+    x1 = min(gray.shape[1], int(np.ceil(((x[grid] + w[grid]).max() + margin) * scale_x)))
+    y1 = min(gray.shape[0], int(np.ceil(((y[grid] + h[grid]).max() + margin) * scale_y)))
+    return x0, y0, x1, y1
@@ -0,0 +1,198 @@
+import base64
+import functools
+
+import cv2
+import numpy as np
+
+# Contraste mínimo (fração da área da bolha) entre uma marcação e as bolhas vazias
+MIN_MARK_CONTRAST = 0.1
+
+
+@functools.lru_cache(maxsize=32)
+def _disk_stencil(radius):
+    """Máscara booleana (2r+1 x 2r+1) de um círculo preenchido, rasterizada com cv2.circle"""
+    size = 2 * radius + 1
+    stencil = np.zeros((size, size), dtype=np.uint8)
+    cv2.circle(stencil, (radius, radius), radius, 255, -1)
+    stencil = stencil.astype(bool)
+    stencil.flags.writeable = False
+    return stencil
+
+
+def disk_area(radius):
+    """Número de pixels de uma bolha de raio radius (mesma rasterização de score_bubbles)"""
+    return int(np.count_nonzero(_disk_stencil(int(radius))))
+
+
+def bubble_array(centers, radius=None):
+    """
+    Normaliza uma coleção de bolhas para um array inteiro (..., 3) de (x, y, r)
+
+    Args:
+        centers: Sequência/array com (x, y) ou (x, y, r) no último eixo
+        radius: Raio usado quando os centros não trazem o raio
+
+    Returns:
+        np.ndarray: Array int (..., 3) com as colunas x, y, r
+    """
+    bubbles = np.asarray(centers, dtype=np.float64)
+    if bubbles.size == 0:
+        return np.zeros(bubbles.shape[:-1] + (3,) if bubbles.ndim > 1 else (0, 3), dtype=np.intp)
+    if bubbles.shape[-1] == 2:
+        if radius is None:
+            raise ValueError("Informe o raio quando os centros não trazem (x, y, r)")
+        r = np.full(bubbles.shape[:-1] + (1,), radius, dtype=np.float64)
+        bubbles = np.concatenate([bubbles, r], axis=-1)
+    # Truncar como int(), igual às chamadas antigas de cv2.circle
+    return np.trunc(bubbles).astype(np.intp)
+
+
+def score_bubbles(thresh, centers, radius=None):
+    """
+    Conta os pixels marcados dentro de cada bolha em uma única passada vetorizada
+
+    Substitui o padrão antigo de criar uma máscara do tamanho da imagem por
+    alternativa (np.zeros + cv2.circle + bitwise_and + countNonZero): cada bolha
+    é lida só na sua janela (2r+1)², usando um estêncil de disco pré-calculado
+    com a mesma rasterização de cv2.circle, então as contagens são idênticas.
+
+    Args:
+        thresh: Imagem binarizada (uint8, pixels marcados != 0)
+        centers: Array (..., 2) ou (..., 3) com (x, y[, r]) de cada bolha
+        radius: Raio padrão quando centers só tem (x, y)
+
+    Returns:
+        np.ndarray: Matriz int com o mesmo formato de centers[..., 0]
+                    (ex.: questões x alternativas) com pixels preenchidos
+    """
+    bubbles = bubble_array(centers, radius)
+    out_shape = bubbles.shape[:-1]
+    flat = bubbles.reshape(-1, 3)
+    counts = np.zeros(len(flat), dtype=np.int64)
+    if len(flat) == 0:
+        return counts.reshape(out_shape)
+
+    height, width = thresh.shape[:2]
+
+    for r in np.unique(flat[:, 2]):
+        idx = np.flatnonzero(flat[:, 2] == r)
+        r = int(r)
+        if r < 0:
+            continue
+        stencil = _disk_stencil(r)
+        offsets = np.arange(-r, r + 1)
+
+        ys = flat[idx, 1][:, None, None] + offsets[None, :, None]
+        xs = flat[idx, 0][:, None, None] + offsets[None, None, :]
+
+        inside = (ys >= 0) & (ys < height) & (xs >= 0) & (xs < width) & stencil
+        patches = thresh[np.clip(ys, 0, height - 1), np.clip(xs, 0, width - 1)]
+        counts[idx] = np.count_nonzero((patches != 0) & inside, axis=(1, 2))
+
+    return counts.reshape(out_shape)
+
+
+def pick_answer(filled_row):
+    """
+    Retorna (índice, valor) da alternativa mais preenchida de uma linha
+
+    Mantém a regra dos laços antigos (comparação estrita a partir de zero):
+    empate fica com a primeira alternativa e linha vazia retorna -1.
+    """
+    if len(filled_row) == 0:
+        return -1, 0
+    max_idx = int(np.argmax(filled_row))
+    max_filled = int(filled_row[max_idx])
+    if max_filled <= 0:
+        return -1, 0
+    return max_idx, max_filled
+
+
+def answer_confidence(fills, answers):
+    """
+    Confiança (0 a 1) de cada resposta a partir da matriz de preenchimento
+    
+    O nível das bolhas vazias é a mediana da matriz (a maioria das
+    alternativas não é marcada). Uma resposta marcada é confiável quando a
+    alternativa escolhida se separa da segunda maior e do nível das vazias;
+    uma questão em branco, quando nenhuma alternativa se afasta desse nível.
+    
+    Args:
+        fills: Matriz (questões x alternativas) com a fração preenchida de
+               cada bolha; linhas com NaN são questões não lidas
+        answers: Letra escolhida ('A', 'B', ...) ou '' para cada questão
+        
+    Returns:
+        np.ndarray: Confiança por questão (NaN nas questões não lidas)
+    """
+    fills = np.asarray(fills, dtype=np.float64)
+    confidence = np.full(len(fills), np.nan)
+    read = ~np.isnan(fills).any(axis=1) if fills.ndim == 2 else np.zeros(len(fills), dtype=bool)
+    if not read.any():
+        return confidence
+    
+    rows = fills[read]
+    choice = np.array([ord(answers[q]) - 65 if answers[q] else -1 for q in np.flatnonzero(read)])
+    blank_level = np.median(rows)
+    
+    marked = (choice >= 0) & (choice < rows.shape[1])
+    index = np.arange(len(rows))
+    chosen = rows[index, np.where(marked, choice, 0)]
+    others = rows.copy()
+    others[index, np.where(marked, choice, 0)] = -np.inf
+    runner_up = others.max(axis=1)
+    
+    contrast = chosen - blank_level
+    separation = np.clip((chosen - runner_up) / np.maximum(contrast, 1e-6), 0, 1)
+    marked_confidence = separation * np.clip(contrast / MIN_MARK_CONTRAST, 0, 1)
+    blank_confidence = np.clip(1 - (rows.max(axis=1) - blank_level) / MIN_MARK_CONTRAST, 0, 1)
+    
+    confidence[read] = np.where(marked, marked_confidence, blank_confidence)
+    return confidence
+
+
+def decide_answers(fills, fill_ratio, margin=0.0):
+    """
+    Decide de uma vez as alternativas marcadas em uma ou várias matrizes de preenchimento
+    
+    Uma alternativa conta como marcada quando é a mais preenchida da
+    questão, passa de fill_ratio e supera a segunda maior por pelo menos
+    margin (abaixo disso a questão fica em branco, como marca ambígua).
+    
+    Args:
+        fills: Array (..., questões, alternativas) com a fração preenchida
+               de cada bolha; NaN nas questões não lidas
+        fill_ratio: Fração mínima da bolha preenchida
+        margin: Diferença mínima para a segunda alternativa mais preenchida
+        
+    Returns:
+        np.ndarray: Índice da alternativa (..., questões); -1 em branco
+    """
+    fills = np.asarray(fills, dtype=np.float64)
+    filled = np.where(np.isnan(fills), -np.inf, fills)
+    ordered = np.sort(filled, axis=-1)
+    top, runner_up = ordered[..., -1], ordered[..., -2]
+    with np.errstate(invalid='ignore'):
+        marked = (top >= fill_ratio) & (top - runner_up >= margin)
+    return np.where(marked, np.argmax(filled, axis=-1), -1)
+
+
+def encode_fill_matrix(fills):
+    """
+    Matriz de preenchimento (questões x alternativas) compacta para JSON
+
+    Os valores vão como float16 little-endian em base64 (2 bytes por
+    alternativa); NaN marca alternativas que nenhuma estratégia leu.
+    """
+    fills = np.ascontiguousarray(fills, dtype='<f2')
+    return {
+        'dtype': 'float16',
+        'shape': list(fills.shape),
+        'dados': base64.b64encode(fills.tobytes()).decode('ascii'),
+    }
+
+
+def decode_fill_matrix(payload):
+    """Matriz float64 (questões x alternativas) de volta a partir de encode_fill_matrix"""
+    data = base64.b64decode(payload['dados'])
+    return np.frombuffer(data, dtype='<f2').reshape(payload['shape']).astype(np.float64)
@@ -0,0 +1,51 @@
+from django.contrib.auth.hashers import make_password
+from django.test import TestCase
+from django.urls import reverse
+
+from .models import GabaritoProva, Professor, Prova, Questao
+
+CPF = '00000000000'
+
+
+class ConsultasPaginasProvaTest(TestCase):
+    """As páginas de uma prova buscam as questões (ProvaQuestao) em uma consulta só"""
+
+    # sessão + professor + prova (com o gabarito, no visualizar_gabarito) + questões
+    CONSULTAS = {
+        'visualizar_gabarito': 4,
+        'gerar_pdf_prova': 4,
+    }
+    TAMANHOS = (5, 20, 50)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = Professor.objects.create(nome='Professor', email='professor@teste.com', cpf=CPF,
+                                                 senha=make_password('senha'))
+        questoes = Questao.objects.bulk_create([
+            Questao(enunciado=f'Questão {q}', alternativa_a='a', alternativa_b='b', alternativa_c='c',
+                    alternativa_d='d', alternativa_e='e', resposta_correta='ABCDE'[q % 5],
+                    cpf_professor=CPF, disciplina_nome='Disciplina')
+            for q in range(max(cls.TAMANHOS))
+        ])
+        cls.provas = {}
+        for tamanho in cls.TAMANHOS:
+            prova = Prova.objects.create(disciplina='Disciplina', professor=cls.professor,
+                                         quantidade_questoes=tamanho)
+            prova.set_questoes_ids_list([questao.id for questao in questoes[:tamanho]])
+            gabarito = GabaritoProva(prova=prova)
+            gabarito.set_respostas_dict({str(questao.id): questao.resposta_correta
+                                         for questao in questoes[:tamanho]})
+            gabarito.save()
+            cls.provas[tamanho] = prova
+
+    def setUp(self):
+        self.client.post(reverse('login'), {'cpf': CPF, 'senha': 'senha'})
+
+    def test_consultas_nao_crescem_com_o_tamanho_da_prova(self):
+        for pagina, consultas in self.CONSULTAS.items():
+            for tamanho, prova in self.provas.items():
+                with self.subTest(pagina=pagina, questoes=tamanho):
+                    with self.assertNumQueries(consultas):
+                        response = self.client.get(reverse(pagina, args=[prova.id]))
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.context['questoes']), tamanho)
@@ -27,7 +27,12 @@ urlpatterns = [
     path('prova/excluir/<int:prova_id>/', views.excluir_prova, name='excluir_prova'),
     path('prova/pdf/<int:prova_id>/', views.gerar_pdf_prova, name='gerar_pdf_prova'),
     path('gabarito/<int:prova_id>/', views.visualizar_gabarito, name='visualizar_gabarito'),
+    path('gabarito/<int:prova_id>/atualizar/', views.atualizar_gabarito, name='atualizar_gabarito'),
     path('processar_omr/', views.processar_omr, name='processar_omr'),
+    path('status_omr/<int:job_id>/', views.status_omr, name='status_omr'),
+    path('overlay_omr/<int:job_id>/', views.overlay_omr, name='overlay_omr'),
+    path('metricas_omr/', views.metricas_omr, name='metricas_omr'),
+    path('processar_omr_lote/', views.processar_omr_lote, name='processar_omr_lote'),
     path('aplicar_nota_omr/', views.aplicar_nota_omr, name='aplicar_nota_omr'),
     path('api/provas/<str:disciplina>/', views.api_provas_disciplina, name='api_provas_disciplina'),
 ]
\ No newline at end of file
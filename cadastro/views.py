@@ -1,55 +1,54 @@
+from django.contrib.auth.hashers import check_password, make_password
+from django.db import IntegrityError
+from django.db.models import ProtectedError
+from django.db.models.functions import Lower
 from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.urls import reverse
 from .forms import ProfessorForm, DisciplinaForm, AlunoForm, QuestaoForm
-from .models import Professor, Disciplina, Aluno, Questao, Prova, GabaritoProva, ResultadoAluno
+from .models import Professor, Disciplina, Aluno, Inscricao, Questao, Prova, ProvaQuestao, GabaritoProva, ResultadoAluno
+from .omr_layouts import layout_for
 import json
+import logging
 import os
 import re
 
-#Temporario
-TEMP_STORAGE_FILE = 'temp_storage/dados_temp.json'
+logger = logging.getLogger(__name__)
 
 def home(request):
     return render(request, 'cadastro/home.html')
+
+def professor_logado(request):
+    """
+    Professor da sessão (request.session['usuario'] guarda o CPF), ou None
+    Uma consulta pelo índice de Professor.cpf por requisição: as chamadas
+    seguintes na mesma requisição reaproveitam o resultado
+    """
+    if not hasattr(request, '_professor_logado'):
+        cpf = request.session.get('usuario')
+        request._professor_logado = Professor.objects.filter(cpf=cpf).first() if cpf else None
+    return request._professor_logado
+
+def disciplinas_do_professor(professor):
+    """Disciplinas do professor na ordem de cadastro (a posição é o disciplina_id das URLs)"""
+    return Disciplina.objects.filter(professor=professor).order_by('id')
+
+def questoes_do_professor(cpf_professor):
+    """Questões do professor na ordem de cadastro (índice cpf_professor, disciplina_nome)"""
+    return Questao.objects.filter(cpf_professor=cpf_professor).order_by('id')
+
 #Carrega as disciplinas do professor logado e exibe na página inicial
 def index(request):
-    data = load_data()
-    cpf_professor = request.session.get('usuario')
-    disciplinas = [d for d in data.get('disciplinas', []) if d.get('cpf_professor') == cpf_professor]
+    disciplinas = disciplinas_do_professor(professor_logado(request))
     return render(request, 'cadastro/index.html', {'disciplinas': disciplinas})
 
-def load_data():
-    if os.path.exists(TEMP_STORAGE_FILE):
-        with open(TEMP_STORAGE_FILE, 'r') as file:
-            return json.load(file)
-    return {'usuarios': [], 'professores': [], 'disciplinas': [], 'alunos': [], 'questoes': []}
-#Para salvar
-def save_data(data):
-    with open(TEMP_STORAGE_FILE, 'w') as file:
-        json.dump(data, file)
-
-def salvar_prova_e_gabarito(questoes_selecionadas, disciplina, cpf_professor, selecao_manual=False):
+def salvar_prova_e_gabarito(questoes_selecionadas, disciplina, professor, selecao_manual=False):
     """
     Salva a prova e seu gabarito no banco de dados
     """
     try:
-        from .models import Questao
-        
-        # Buscar o professor
-        professor = Professor.objects.filter(email__contains=cpf_professor).first()
         if not professor:
-            # Se não encontrar por email, criar um professor temporário ou buscar de outra forma
-            # Por enquanto, vamos criar um professor temporário
-            data = load_data()
-            usuario = next((u for u in data.get('usuarios', []) if u.get('cpf') == cpf_professor), None)
-            if usuario:
-                professor, created = Professor.objects.get_or_create(
-                    email=f"{cpf_professor}@temp.com",
-                    defaults={'nome': usuario.get('nome', 'Professor')}
-                )
-            else:
-                return None
+            return None
         
         # Criar a prova
         modo = "Manual" if selecao_manual else "Automática"
@@ -62,35 +61,9 @@ def salvar_prova_e_gabarito(questoes_selecionadas, disciplina, cpf_professor, se
             quantidade_questoes=len(questoes_selecionadas)
         )
         
-        # Preparar IDs das questões e gabarito
-        questoes_ids = []
-        respostas_corretas = {}
-        
-        for questao in questoes_selecionadas:
-            questao_id = questao.get('id')
-            
-            # Salvar questão no Django se não existir
-            questao_django, created = Questao.objects.get_or_create(
-                id=questao_id,
-                defaults={
-                    'enunciado': questao.get('enunciado', ''),
-                    'alternativa_a': questao.get('alternativa_a', ''),
-                    'alternativa_b': questao.get('alternativa_b', ''),
-                    'alternativa_c': questao.get('alternativa_c', ''),
-                    'alternativa_d': questao.get('alternativa_d', ''),
-                    'alternativa_e': questao.get('alternativa_e', ''),
-                    'resposta_correta': questao.get('resposta_correta', 'A'),
-                    'cpf_professor': cpf_professor,
-                    'disciplina_nome': questao.get('disciplina_nome', disciplina)
-                }
-            )
-            
-            questoes_ids.append(questao_id)
-            respostas_corretas[str(questao_id)] = questao.get('resposta_correta')
-        
-        # Salvar IDs das questões na prova
-        prova.set_questoes_ids_list(questoes_ids)
-        prova.save()
+        # Questões da prova, na ordem, e gabarito
+        prova.set_questoes_ids_list([questao.id for questao in questoes_selecionadas])
+        respostas_corretas = {str(questao.id): questao.resposta_correta for questao in questoes_selecionadas}
         
         # Criar o gabarito
         gabarito = GabaritoProva.objects.create(prova=prova)
@@ -110,11 +83,10 @@ def login_view(request):
     if request.method == 'POST':
         cpf = request.POST.get('cpf')
         senha = request.POST.get('senha')
-        data = load_data()
-        usuario = next((u for u in data.get('usuarios', []) if u.get('cpf') == cpf and u.get('senha') == senha), None)
-        if usuario:
-            request.session['usuario'] = usuario['cpf']
-            request.session['nome_completo'] = usuario['nome']
+        professor = Professor.objects.filter(cpf=cpf).first() if cpf else None
+        if professor and check_password(senha, professor.senha):
+            request.session['usuario'] = professor.cpf
+            request.session['nome_completo'] = professor.nome
             return redirect('index')
         else:
             error = 'CPF ou senha inválidos!'
@@ -128,33 +100,39 @@ def cadastro_usuario(request):
         rg = request.POST.get('rg')
         email = request.POST.get('email')
         senha = request.POST.get('senha')
-        data = load_data()
         if len(cpf) != 11 or not cpf.isdigit():
             error = 'CPF deve conter exatamente 11 dígitos numéricos.'
         elif len(rg) != 7 or not rg.isdigit():
             error = 'RG deve conter exatamente 7 dígitos numéricos.'
-        elif any(u.get('cpf') == cpf for u in data.get('usuarios', [])):
-            error = 'Usuário já cadastrado com esse CPF!'
         else:
-            data.setdefault('usuarios', []).append({
-                'cpf': cpf,
-                'nome': nome,
-                'rg': rg,
-                'email': email,
-                'senha': senha
-            })
-            save_data(data)
-            return redirect('login')
+            try:
+                # cpf e email são únicos no banco: um cadastro simultâneo com o mesmo CPF falha aqui
+                Professor.objects.create(
+                    cpf=cpf,
+                    nome=nome,
+                    rg=rg,
+                    email=email,
+                    senha=make_password(senha)
+                )
+                return redirect('login')
+            except IntegrityError:
+                if Professor.objects.filter(cpf=cpf).exists():
+                    error = 'Usuário já cadastrado com esse CPF!'
+                else:
+                    error = 'Usuário já cadastrado com esse email!'
     return render(request, 'cadastro/cadastro_usuario.html', {'error': error})
 
 def cadastrar_professor(request):
     if request.method == 'POST':
         form = ProfessorForm(request.POST)
         if form.is_valid():
-            data = load_data()
-            data['professores'].append(form.cleaned_data)
-            save_data(data)
-            return redirect('cadastrar_professor')
+            _, criado = Professor.objects.get_or_create(
+                email=form.cleaned_data['email'],
+                defaults={'nome': form.cleaned_data['nome']}
+            )
+            if criado:
+                return redirect('cadastrar_professor')
+            form.add_error('email', 'Já existe um professor com esse email.')
     else:
         form = ProfessorForm()
     return render(request, 'cadastro/cadastrar_professor.html', {'form': form})
@@ -164,15 +142,10 @@ def cadastrar_disciplina(request):
     if request.method == 'POST':
         nome = request.POST.get('nome')
         ano = request.POST.get('ano')
-        data = load_data()
-        cpf_professor = request.session.get('usuario')
-        data.setdefault('disciplinas', []).append({
-            'nome': nome,
-            'ano': ano,
-            'cpf_professor': cpf_professor,
-            'alunos': []
-        })
-        save_data(data)
+        professor = professor_logado(request)
+        if not professor:
+            return redirect('login')
+        Disciplina.objects.create(nome=nome, ano=ano or '', professor=professor)
         sucesso = 'Disciplina cadastrada com sucesso!'
     return render(request, 'cadastro/cadastrar_disciplina.html', {'sucesso': sucesso})
 
@@ -181,85 +154,83 @@ def cadastrar_aluno(request):
     if request.method == 'POST':
         matricula = request.POST.get('matricula')
         nome = request.POST.get('nome')
-        data = load_data()
-        cpf_professor = request.session.get('usuario')
+        professor = professor_logado(request)
+        if not professor:
+            return redirect('login')
         if len(matricula) != 11 or not matricula.isdigit():
             sucesso = 'A matrícula deve conter exatamente 11 dígitos numéricos.'
         elif any(char.isdigit() for char in nome):
             sucesso = 'O nome não pode conter números.'
-        elif any(a['matricula'] == matricula and a.get('cpf_professor') == cpf_professor for a in data.get('alunos', [])):
-            sucesso = 'Já existe um aluno com essa matrícula!'
         else:
-            data.setdefault('alunos', []).append({
-                'matricula': matricula,
-                'nome': nome,
-                'cpf_professor': cpf_professor
-            })
-            save_data(data)
-            sucesso = 'Aluno cadastrado com sucesso!'
+            try:
+                # (professor, matricula) é único no banco
+                Aluno.objects.create(matricula=matricula, nome=nome, professor=professor)
+                sucesso = 'Aluno cadastrado com sucesso!'
+            except IntegrityError:
+                sucesso = 'Já existe um aluno com essa matrícula!'
     return render(request, 'cadastro/cadastrar_aluno.html', {'sucesso': sucesso})
+
+def situacao_aluno(notas):
+    """
+    Média e situação (APV/RPV) a partir das notas de uma inscrição
+    notas: dict com nota_1va, nota_2va, nota_3va e nota_final (None = sem nota)
+    retorna: (media_geral, situacao), ambos None enquanto faltarem notas
+    """
+    notas_validas = [n for n in (notas.get('nota_1va'), notas.get('nota_2va')) if n is not None]
+    media_geral = None
+    situacao = None
+    if len(notas_validas) == 2:
+        media = sum(notas_validas) / 2
+        if media >= 7:
+            media_geral = media
+            situacao = "APV"
+        elif notas.get('nota_3va') is not None:
+            notas_3 = notas_validas + [notas.get('nota_3va')]
+            media_3 = sum(n for n in notas_3 if n is not None) / 3
+            if media_3 >= 7:
+                media_geral = media_3
+                situacao = "APV"
+            elif notas.get('nota_final') is not None:
+                notas_final = notas_3 + [notas.get('nota_final')]
+                media_final = sum(n for n in notas_final if n is not None) / 4
+                media_geral = media_final
+                situacao = "APV" if media_final >= 7 else "RPV"
+        elif notas.get('nota_final') is not None:
+            notas_final = notas_validas + [notas.get('nota_final')]
+            media_final = sum(n for n in notas_final if n is not None) / 3
+            media_geral = media_final
+            situacao = "APV" if media_final >= 7 else "RPV"
+    return media_geral, situacao
+
 # Detalhe da disciplina
 def detalhe_disciplina(request, disciplina_id):
-    data = load_data()
-    cpf_professor = request.session.get('usuario')
-    disciplinas = [d for d in data.get('disciplinas', []) if d.get('cpf_professor') == cpf_professor]
-    if 0 <= disciplina_id < len(disciplinas):
-        disciplina = disciplinas[disciplina_id]
-        alunos = [a for a in data.get('alunos', []) if a.get('cpf_professor') == cpf_professor]
+    disciplina = disciplinas_do_professor(professor_logado(request))[disciplina_id:disciplina_id + 1].first()
+    if disciplina:
+        alunos = Aluno.objects.filter(professor=disciplina.professor_id)
         sucesso = None
 
-        if 'alunos' not in disciplina:
-            disciplina['alunos'] = []
         if request.method == 'POST':
             matricula = request.POST.get('aluno_matricula')
-            if matricula and matricula not in [a['matricula'] for a in disciplina['alunos']]:
-                aluno = next((a for a in alunos if a['matricula'] == matricula), None)
-                if aluno:
-                    disciplina['alunos'].append({
-                        'matricula': aluno['matricula'],
-                        'nome': aluno['nome'],
-                        'nota_1va': None,
-                        'nota_2va': None,
-                        'nota_3va': None,
-                        'nota_final': None
-                    })
-                    save_data(data)
+            aluno = alunos.filter(matricula=matricula).first() if matricula else None
+            if aluno:
+                # (aluno, disciplina) é único: uma inscrição repetida não faz nada
+                _, criada = Inscricao.objects.get_or_create(aluno=aluno, disciplina=disciplina)
+                if criada:
                     sucesso = 'Aluno adicionado com sucesso!'
-        matriculas_na_disciplina = [a['matricula'] for a in disciplina['alunos']]
-        alunos_disponiveis = [a for a in alunos if a['matricula'] not in matriculas_na_disciplina]
+
+        inscricoes = list(disciplina.inscricoes.order_by('id').values(
+            'aluno_id', 'aluno__matricula', 'aluno__nome', 'nota_1va', 'nota_2va', 'nota_3va', 'nota_final'))
+        alunos_disponiveis = alunos.exclude(id__in=[i['aluno_id'] for i in inscricoes]).order_by('id')
         alunos_disciplina = []
-        for a in disciplina['alunos']:
-            notas = [a.get('nota_1va'), a.get('nota_2va'), a.get('nota_3va'), a.get('nota_final')]
-            notas_validas = [n for n in notas[:2] if n is not None]
-            media_geral = None
-            situacao = None
-            if len(notas_validas) == 2:
-                media = sum(notas_validas) / 2
-                if media >= 7:
-                    media_geral = media
-                    situacao = "APV"
-                elif a.get('nota_3va') is not None:
-                    notas_3 = notas_validas + [a.get('nota_3va')]
-                    media_3 = sum(n for n in notas_3 if n is not None) / 3
-                    if media_3 >= 7:
-                        media_geral = media_3
-                        situacao = "APV"
-                    elif a.get('nota_final') is not None:
-                        notas_final = notas_3 + [a.get('nota_final')]
-                        media_final = sum(n for n in notas_final if n is not None) / 4
-                        media_geral = media_final
-                        situacao = "APV" if media_final >= 7 else "RPV"
-                    else:
-                        situacao = None
-                elif a.get('nota_final') is not None:
-                    notas_final = notas_validas + [a.get('nota_final')]
-                    media_final = sum(n for n in notas_final if n is not None) / 3
-                    media_geral = media_final
-                    situacao = "APV" if media_final >= 7 else "RPV"
-                else:
-                    situacao = None
+        for inscricao in inscricoes:
+            media_geral, situacao = situacao_aluno(inscricao)
             alunos_disciplina.append({
-                **a,
+                'matricula': inscricao['aluno__matricula'],
+                'nome': inscricao['aluno__nome'],
+                'nota_1va': inscricao['nota_1va'],
+                'nota_2va': inscricao['nota_2va'],
+                'nota_3va': inscricao['nota_3va'],
+                'nota_final': inscricao['nota_final'],
                 'media_geral': media_geral,
                 'situacao': situacao
             })
@@ -274,33 +245,21 @@ def detalhe_disciplina(request, disciplina_id):
 
 def detalhe_disciplina_por_nome(request, nome_disciplina):
     """View para acessar disciplina pelo nome em vez do índice"""
-    data = load_data()
-    cpf_professor = request.session.get('usuario')
-    disciplinas = [d for d in data.get('disciplinas', []) if d.get('cpf_professor') == cpf_professor]
+    disciplinas = disciplinas_do_professor(professor_logado(request))
     
-    # Buscar a disciplina pelo nome
-    disciplina = None
-    disciplina_id = None
-    for i, d in enumerate(disciplinas):
-        if d.get('nome') == nome_disciplina:
-            disciplina = d
-            disciplina_id = i
-            break
+    # Buscar a disciplina pelo nome (índice professor, nome)
+    disciplina = disciplinas.filter(nome=nome_disciplina).first()
     
     if disciplina:
-        # Redirecionar para a view original com o ID correto
+        # Redirecionar para a view original com o índice correto
+        disciplina_id = disciplinas.filter(id__lt=disciplina.id).count()
         return redirect('detalhe_disciplina', disciplina_id=disciplina_id)
     else:
         return render(request, 'cadastro/detalhe_disciplina.html', {'disciplina': None})
 
 # Lista de alunos do professor logado
 def lista_alunos(request):
-    data = load_data()
-    cpf_professor = request.session.get('usuario')
-    alunos = sorted(
-        [a for a in data.get('alunos', []) if a.get('cpf_professor') == cpf_professor],
-        key=lambda x: x['nome'].lower()
-    )
+    alunos = Aluno.objects.filter(professor=professor_logado(request)).order_by(Lower('nome'))
     return render(request, 'cadastro/lista_alunos.html', {'alunos': alunos})
 
 def logout_view(request):
@@ -310,11 +269,10 @@ def logout_view(request):
 def cadastrar_questao(request):
     sucesso = None
     error = None
-    data = load_data()
     cpf_professor = request.session.get('usuario')
     
     # Buscar disciplinas do professor logado
-    disciplinas_professor = [d['nome'] for d in data.get('disciplinas', []) if d.get('cpf_professor') == cpf_professor]
+    disciplinas_professor = list(disciplinas_do_professor(professor_logado(request)).values_list('nome', flat=True))
     
     # Verificar se veio uma disciplina específica via GET
     disciplina_selecionada = request.GET.get('disciplina', '')
@@ -335,26 +293,18 @@ def cadastrar_questao(request):
         elif disciplina not in disciplinas_professor:
             error = 'Disciplina inválida!'
         else:
-            # Gerar ID único baseado no timestamp
-            import time
-            questao_id = int(time.time() * 1000)  # Timestamp em milissegundos
-            
             # Salvar questão
-            questao = {
-                'id': questao_id,
-                'enunciado': enunciado,
-                'alternativa_a': alternativa_a,
-                'alternativa_b': alternativa_b,
-                'alternativa_c': alternativa_c,
-                'alternativa_d': alternativa_d,
-                'alternativa_e': alternativa_e,
-                'resposta_correta': resposta_correta,
-                'cpf_professor': cpf_professor,
-                'disciplina_nome': disciplina
-            }
-            
-            data.setdefault('questoes', []).append(questao)
-            save_data(data)
+            Questao.objects.create(
+                enunciado=enunciado,
+                alternativa_a=alternativa_a,
+                alternativa_b=alternativa_b,
+                alternativa_c=alternativa_c,
+                alternativa_d=alternativa_d,
+                alternativa_e=alternativa_e,
+                resposta_correta=resposta_correta,
+                cpf_professor=cpf_professor,
+                disciplina_nome=disciplina
+            )
             sucesso = 'Questão cadastrada com sucesso!'
     
     return render(request, 'cadastro/cadastrar_questao.html', {
@@ -365,26 +315,15 @@ def cadastrar_questao(request):
     })
 
 def lista_questoes(request):
-    data = load_data()
     cpf_professor = request.session.get('usuario')
-    questoes = [q for q in data.get('questoes', []) if q.get('cpf_professor') == cpf_professor]
-    
-    # Migrar questões sem ID (para compatibilidade com questões antigas)
-    import time
-    questoes_modificadas = False
-    for questao in questoes:
-        if 'id' not in questao:
-            questao['id'] = int(time.time() * 1000) + hash(questao['enunciado']) % 10000
-            questoes_modificadas = True
-    
-    if questoes_modificadas:
-        save_data(data)
+    questoes = questoes_do_professor(cpf_professor)
     
     # Verificar se veio uma disciplina específica via GET
     disciplina_filtro = request.GET.get('disciplina', '')
     if disciplina_filtro:
-        questoes = [q for q in questoes if q['disciplina_nome'] == disciplina_filtro]
+        questoes = questoes.filter(disciplina_nome=disciplina_filtro)
     
+    questoes = list(questoes)
     total_questoes = len(questoes)
     
     return render(request, 'cadastro/lista_questoes.html', {
@@ -394,32 +333,20 @@ def lista_questoes(request):
     })
 
 def gerar_prova(request):
-    data = load_data()
     cpf_professor = request.session.get('usuario')
-    questoes = [q for q in data.get('questoes', []) if q.get('cpf_professor') == cpf_professor]
-    
-    # Migrar questões sem ID (para compatibilidade com questões antigas)
-    import time
-    questoes_modificadas = False
-    for questao in questoes:
-        if 'id' not in questao:
-            questao['id'] = int(time.time() * 1000) + hash(questao['enunciado']) % 10000
-            questoes_modificadas = True
-    
-    if questoes_modificadas:
-        save_data(data)
+    questoes = questoes_do_professor(cpf_professor)
     
     # Verificar se veio uma disciplina específica via GET
     disciplina_selecionada = request.GET.get('disciplina', '')
     
     # Se veio de uma disciplina específica, filtrar questões apenas dessa disciplina
     if disciplina_selecionada:
-        questoes_disponiveis = [q for q in questoes if q['disciplina_nome'] == disciplina_selecionada]
+        questoes_disponiveis = questoes.filter(disciplina_nome=disciplina_selecionada)
         disciplinas_professor = [disciplina_selecionada]
     else:
         questoes_disponiveis = questoes
         # Buscar todas as disciplinas do professor logado para filtro
-        disciplinas_professor = list(set([q['disciplina_nome'] for q in questoes]))
+        disciplinas_professor = list(questoes.order_by().values_list('disciplina_nome', flat=True).distinct())
     
     if request.method == 'POST':
         # Verificar se é seleção manual ou automática
@@ -443,64 +370,58 @@ def gerar_prova(request):
         # Filtrar por disciplina se selecionada
         questoes_filtradas = questoes_disponiveis
         if disciplina_filtro and disciplina_filtro != 'todas':
-            questoes_filtradas = [q for q in questoes_disponiveis if q['disciplina_nome'] == disciplina_filtro]
+            questoes_filtradas = questoes_disponiveis.filter(disciplina_nome=disciplina_filtro)
+        
+        # Sorteio sobre os IDs; só as questões sorteadas são carregadas inteiras
+        ids_filtrados = list(questoes_filtradas.values_list('id', flat=True))
         
         # Validar quantidade
-        if quantidade <= 0 or quantidade > len(questoes_filtradas):
-            error = f'Quantidade inválida! Deve ser entre 1 e {len(questoes_filtradas)} questões.'
+        if quantidade <= 0 or quantidade > len(ids_filtrados):
+            error = f'Quantidade inválida! Deve ser entre 1 e {len(ids_filtrados)} questões.'
             return render(request, 'cadastro/gerar_prova.html', {
                 'error': error,
-                'total_questoes': len(questoes_disponiveis),
+                'total_questoes': questoes_disponiveis.count(),
                 'disciplinas': disciplinas_professor,
                 'disciplina_selecionada': disciplina_selecionada
             })
         
         # Selecionar questões aleatoriamente
         import random
-        questoes_selecionadas = random.sample(questoes_filtradas, quantidade)
+        ids_sorteados = random.sample(ids_filtrados, quantidade)
+        por_id = Questao.objects.in_bulk(ids_sorteados)
+        questoes_selecionadas = [por_id[questao_id] for questao_id in ids_sorteados]
         
         # Salvar a prova e gabarito no banco de dados
         prova_salva = salvar_prova_e_gabarito(
             questoes_selecionadas, 
             disciplina_filtro if disciplina_filtro != 'todas' else disciplina_selecionada or 'Múltiplas disciplinas',
-            cpf_professor,
+            professor_logado(request),
             selecao_manual=False
         )
         
         return render(request, 'cadastro/visualizar_prova.html', {
             'questoes': questoes_selecionadas,
             'quantidade': quantidade,
+            'layout_gabarito': layout_for(quantidade).template_context(quantidade),
             'disciplina': disciplina_filtro if disciplina_filtro != 'todas' else disciplina_selecionada or 'Múltiplas disciplinas',
             'prova_id': prova_salva.id if prova_salva else None,
             'gabarito_salvo': prova_salva is not None
         })
     
     return render(request, 'cadastro/gerar_prova.html', {
-        'total_questoes': len(questoes_disponiveis),
+        'total_questoes': questoes_disponiveis.count(),
         'disciplinas': disciplinas_professor,
         'disciplina_selecionada': disciplina_selecionada
     })
 
 def selecionar_questoes(request):
-    data = load_data()
     cpf_professor = request.session.get('usuario')
-    questoes = [q for q in data.get('questoes', []) if q.get('cpf_professor') == cpf_professor]
-    
-    # Migrar questões sem ID (para compatibilidade com questões antigas)
-    import time
-    questoes_modificadas = False
-    for questao in questoes:
-        if 'id' not in questao:
-            questao['id'] = int(time.time() * 1000) + hash(questao['enunciado']) % 10000
-            questoes_modificadas = True
-    
-    if questoes_modificadas:
-        save_data(data)
+    questoes = questoes_do_professor(cpf_professor)
     
     # Filtrar por disciplina se especificada
     disciplina_filtro = request.GET.get('disciplina', '')
     if disciplina_filtro and disciplina_filtro != 'todas':
-        questoes = [q for q in questoes if q['disciplina_nome'] == disciplina_filtro]
+        questoes = questoes.filter(disciplina_nome=disciplina_filtro)
     
     if request.method == 'POST':
         # Obter questões selecionadas
@@ -515,28 +436,28 @@ def selecionar_questoes(request):
             })
         
         # Buscar as questões selecionadas
-        questoes_selecionadas = []
-        for questao in questoes:
-            if str(questao.get('id', '')) in questoes_selecionadas_ids:
-                questoes_selecionadas.append(questao)
+        ids = [int(questao_id) for questao_id in questoes_selecionadas_ids if questao_id.isdigit()]
+        questoes_selecionadas = list(questoes.filter(id__in=ids))
         
         # Salvar a prova e gabarito no banco de dados
         prova_salva = salvar_prova_e_gabarito(
             questoes_selecionadas,
             disciplina_filtro if disciplina_filtro != 'todas' else 'Múltiplas disciplinas',
-            request.session.get('usuario'),
+            professor_logado(request),
             selecao_manual=True
         )
         
         return render(request, 'cadastro/visualizar_prova.html', {
             'questoes': questoes_selecionadas,
             'quantidade': len(questoes_selecionadas),
+            'layout_gabarito': layout_for(len(questoes_selecionadas)).template_context(len(questoes_selecionadas)),
             'disciplina': disciplina_filtro if disciplina_filtro != 'todas' else 'Múltiplas disciplinas',
             'selecao_manual': True,
             'prova_id': prova_salva.id if prova_salva else None,
             'gabarito_salvo': prova_salva is not None
         })
     
+    questoes = list(questoes)
     return render(request, 'cadastro/selecionar_questoes.html', {
         'questoes': questoes,
         'disciplina_filtro': disciplina_filtro,
@@ -550,10 +471,10 @@ def listar_provas(request, disciplina=None):
         return redirect('login')
     
     try:
-        # Buscar professor
-        professor = Professor.objects.filter(email__contains=cpf_professor).first()
+        professor = professor_logado(request)
         if professor:
-            provas = Prova.objects.filter(professor=professor)
+            # Pelo relacionamento: prova.professor no template é o objeto já carregado
+            provas = professor.provas.all()
             
             # Filtrar por disciplina se especificada
             if disciplina:
@@ -581,28 +502,20 @@ def visualizar_gabarito(request, prova_id):
         return redirect('login')
     
     try:
-        prova = Prova.objects.get(id=prova_id)
+        prova = Prova.objects.select_related('gabarito').get(id=prova_id)
         gabarito = prova.gabarito
         
         # Verificar se o professor tem acesso a esta prova
-        if prova.professor.email != f"{cpf_professor}@temp.com":
+        professor = professor_logado(request)
+        if not professor or prova.professor_id != professor.id:
             return render(request, 'cadastro/erro.html', {
                 'mensagem': 'Você não tem permissão para visualizar este gabarito.'
             })
+        prova.professor = professor  # mesmo registro; evita buscá-lo de novo no template
         
-        # Buscar as questões do gabarito
-        questoes_ids = prova.get_questoes_ids_list()
-        questoes = []
-        
-        # Buscar questões dos dados temporários (JSON)
-        data = load_data()
-        
-        for questao_id in questoes_ids:
-            for questao_data in data.get('questoes', []):
-                # Converter ambos para o mesmo tipo para comparação
-                if int(questao_data.get('id', 0)) == int(questao_id):
-                    questoes.append(questao_data)
-                    break
+        # Buscar as questões do gabarito (uma consulta, na ordem da prova)
+        questoes = prova.get_questoes_list()
+        questoes_ids = [questao.id for questao in questoes]
         
         respostas_corretas = gabarito.get_respostas_dict()
         
@@ -614,7 +527,6 @@ def visualizar_gabarito(request, prova_id):
             'debug_info': {
                 'questoes_ids': questoes_ids,
                 'questoes_encontradas': len(questoes),
-                'total_questoes_sistema': len(data.get('questoes', []))
             }
         })
         
@@ -627,11 +539,116 @@ def visualizar_gabarito(request, prova_id):
             'mensagem': f'Erro ao carregar gabarito: {str(e)}'
         })
 
+def atualizar_gabarito(request, prova_id):
+    """
+    Corrige respostas do gabarito e/ou anula questões, recalculando os resultados já gravados
+    Corpo JSON: {'respostas': {questao_id: letra}, 'anuladas': [questao_id, ...],
+                 'pesos': {questao_id: peso}, 'credito_parcial': {questao_id: {letra: fração}},
+                 'penalidade_erro': fração do peso descontada por resposta errada}
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método não permitido'})
+
+    cpf_professor = request.session.get('usuario')
+    if not cpf_professor:
+        return JsonResponse({'success': False, 'error': 'Não autorizado'})
+
+    try:
+        prova = Prova.objects.select_related('gabarito').get(id=prova_id)
+        gabarito = prova.gabarito
+    except (Prova.DoesNotExist, GabaritoProva.DoesNotExist):
+        return JsonResponse({'success': False, 'error': 'Prova não encontrada'})
+
+    professor = professor_logado(request)
+    if not professor or prova.professor_id != professor.id:
+        return JsonResponse({'success': False, 'error': 'Você não tem permissão para alterar este gabarito'})
+
+    try:
+        data_request = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Dados inválidos'})
+
+    respostas_corretas = gabarito.get_respostas_dict()
+    for questao_id, letra in (data_request.get('respostas') or {}).items():
+        questao_id = str(questao_id)
+        letra = str(letra).upper()
+        if questao_id not in respostas_corretas:
+            return JsonResponse({'success': False, 'error': f'Questão {questao_id} não pertence à prova'})
+        if letra not in ('A', 'B', 'C', 'D', 'E'):
+            return JsonResponse({'success': False, 'error': f'Resposta inválida para a questão {questao_id}'})
+        respostas_corretas[questao_id] = letra
+
+    anuladas = data_request.get('anuladas')
+    if anuladas is not None:
+        anuladas = [str(questao_id) for questao_id in anuladas]
+        if any(questao_id not in respostas_corretas for questao_id in anuladas):
+            return JsonResponse({'success': False, 'error': 'Questão anulada não pertence à prova'})
+        gabarito.set_anuladas_list(anuladas)
+
+    try:
+        pesos = data_request.get('pesos')
+        if pesos is not None:
+            pesos = {str(questao_id): float(peso) for questao_id, peso in pesos.items()}
+            if any(questao_id not in respostas_corretas or peso < 0 for questao_id, peso in pesos.items()):
+                return JsonResponse({'success': False, 'error': 'Pesos inválidos'})
+            gabarito.set_pesos_dict(pesos)
+
+        credito_parcial = data_request.get('credito_parcial')
+        if credito_parcial is not None:
+            credito_parcial = {
+                str(questao_id): {str(letra).upper(): float(fracao) for letra, fracao in creditos.items()}
+                for questao_id, creditos in credito_parcial.items()
+            }
+            for questao_id, creditos in credito_parcial.items():
+                if questao_id not in respostas_corretas or any(
+                        letra not in ('A', 'B', 'C', 'D', 'E') or not 0 <= fracao <= 1
+                        for letra, fracao in creditos.items()):
+                    return JsonResponse({'success': False, 'error': 'Crédito parcial inválido'})
+            gabarito.set_credito_parcial_dict(credito_parcial)
+
+        if data_request.get('penalidade_erro') is not None:
+            penalidade = float(data_request['penalidade_erro'])
+            if not 0 <= penalidade <= 1:
+                return JsonResponse({'success': False, 'error': 'Penalidade inválida'})
+            gabarito.penalidade_erro = penalidade
+    except (AttributeError, TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Dados inválidos'})
+
+    from .grading import regrade_prova
+
+    gabarito.set_respostas_dict(respostas_corretas)
+    gabarito.save(update_fields=['respostas_corretas', 'questoes_anuladas', 'pesos',
+                                 'credito_parcial', 'penalidade_erro'])
+    if pesos is not None:
+        # Os pontos de cada questão da prova acompanham os pesos do gabarito
+        itens = list(prova.itens.all())
+        for item in itens:
+            item.pontos = pesos.get(str(item.questao_id), 1.0)
+        ProvaQuestao.objects.bulk_update(itens, ['pontos'])
+    recalculo = regrade_prova(prova)
+
+    return JsonResponse({
+        'success': True,
+        'respostas_corretas': respostas_corretas,
+        'anuladas': gabarito.get_anuladas_list(),
+        'pesos': gabarito.get_pesos_dict(),
+        'credito_parcial': gabarito.get_credito_parcial_dict(),
+        'penalidade_erro': gabarito.penalidade_erro,
+        'resultados': recalculo['resultados'],
+        'resultados_alterados': recalculo['alterados'],
+    })
+
 def processar_omr(request):
     """
-    Função para processar respostas OMR e calcular notas
-    Utiliza OpenCV para detectar marcações em gabaritos
+    Recebe a foto do gabarito e enfileira a leitura OMR
+    O processamento (OpenCV) roda em segundo plano; a resposta traz o job_id
+    para acompanhar o progresso em status_omr. Fotos reenviadas (mesmo
+    conteúdo) são respondidas na hora com a leitura guardada em cache
     """
+    professor = professor_logado(request)
+    if not professor:
+        return JsonResponse({'success': False, 'error': 'Não autorizado'}, status=403)
+    
     if request.method == 'POST':
         prova_id = request.POST.get('prova_id')
         aluno_matricula = request.POST.get('aluno_matricula')
@@ -639,8 +656,14 @@ def processar_omr(request):
         foto_gabarito = request.FILES.get('foto_gabarito')
         
         try:
-            prova = Prova.objects.get(id=prova_id)
-            gabarito = prova.gabarito
+            # Só as provas do próprio professor (as de outros aparecem como não encontradas)
+            prova = Prova.objects.get(id=prova_id, professor=professor)
+            
+            if not hasattr(prova, 'gabarito'):
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Prova sem gabarito cadastrado'
+                })
             
             if not foto_gabarito:
                 return JsonResponse({
@@ -648,49 +671,25 @@ def processar_omr(request):
                     'error': 'Nenhuma imagem foi enviada'
                 })
             
-            # Processar imagem com OpenCV
-            from .omr_processor import process_uploaded_image
+            from . import omr_jobs
             
             # Obter número de questões da prova
-            questoes_ids = prova.get_questoes_ids_list()
-            num_questoes = len(questoes_ids)
-            
-            # Processar OMR
-            respostas_detectadas = process_uploaded_image(foto_gabarito, num_questoes)
-            
-            # Obter gabarito correto
-            respostas_corretas = gabarito.get_respostas_dict()
+            num_questoes = prova.itens.count()
             
-            # Calcular nota
-            acertos = 0
-            for i, questao_id in enumerate(questoes_ids):
-                questao_id_str = str(questao_id)
-                if (i < len(respostas_detectadas) and 
-                    questao_id_str in respostas_corretas and
-                    respostas_detectadas[i] and
-                    respostas_detectadas[i].upper() == respostas_corretas[questao_id_str].upper()):
-                    acertos += 1
+            job = omr_jobs.enqueue(prova, foto_gabarito.read(), num_questoes, aluno_matricula, avaliacao)
             
-            total = len(questoes_ids)
-            nota_final = round((acertos / total) * 10, 1) if total > 0 else 0
+            # Imagem já lida antes (reenvio): o resultado volta na mesma resposta
+            if job.status != job.STATUS_PENDENTE:
+                resposta = omr_jobs.job_status(job)
+                resposta['status_url'] = reverse('status_omr', args=[job.id])
+                return JsonResponse(resposta)
             
-            # Preparar resultado
-            resultado = {
+            return JsonResponse({
                 'success': True,
-                'respostas_detectadas': respostas_detectadas,
-                'acertos': acertos,
-                'total': total,
-                'nota': nota_final,
-                'detalhes': {
-                    'prova_id': prova_id,
-                    'aluno_matricula': aluno_matricula,
-                    'avaliacao': avaliacao,
-                    'questoes_ids': questoes_ids,
-                    'respostas_corretas': list(respostas_corretas.values())
-                }
-            }
-            
-            return JsonResponse(resultado)
+                'job_id': job.id,
+                'status': job.status,
+                'status_url': reverse('status_omr', args=[job.id])
+            }, status=202)
             
         except Prova.DoesNotExist:
             return JsonResponse({
@@ -704,8 +703,176 @@ def processar_omr(request):
             })
     
     return JsonResponse({'success': False, 'error': 'Método não permitido'})
+
+def status_omr(request, job_id):
+    """Status e progresso de uma leitura OMR enfileirada (consultado pelo executarOMR)"""
+    from .models import OMRJob
+    from . import omr_jobs
     
-    return JsonResponse({'success': False, 'error': 'Método não permitido'})
+    professor = professor_logado(request)
+    try:
+        # Só o professor dono da prova vê a leitura (os ids são sequenciais)
+        job = OMRJob.objects.defer('imagem').get(id=job_id, prova__professor=professor)
+    except OMRJob.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Leitura OMR não encontrada'}, status=404)
+    
+    return JsonResponse(omr_jobs.job_status(job))
+
+def metricas_omr(request):
+    """
+    Histogramas dos tempos por etapa e dos contadores das leituras OMR
+    deste processo (janela das últimas leituras), mais os contadores do cache
+    """
+    from . import omr_cache, omr_metrics
+    
+    if not professor_logado(request):
+        return JsonResponse({'success': False, 'error': 'Não autorizado'}, status=403)
+    
+    return JsonResponse({'success': True, **omr_metrics.snapshot(), 'cache': omr_cache.stats()})
+
+def overlay_omr(request, job_id):
+    """
+    Foto da leitura OMR com as bolhas lidas destacadas, para conferência
+    A imagem anotada é desenhada só quando alguém abre este endereço, e só
+    enquanto a foto estiver guardada (OMR_IMAGEM_RETENCAO)
+    """
+    from .models import OMRJob
+    from .omr_overlay import render_overlay
+    from .omr_scoring import decode_fill_matrix
+    
+    professor = professor_logado(request)
+    try:
+        job = OMRJob.objects.get(id=job_id, status=OMRJob.STATUS_CONCLUIDO, prova__professor=professor)
+    except OMRJob.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Leitura OMR não encontrada'}, status=404)
+    
+    bolhas = job.get_bolhas_dict()
+    if not bolhas:
+        return JsonResponse({'success': False, 'error': 'Leitura OMR sem bolhas registradas'}, status=404)
+    if not job.imagem:
+        return JsonResponse({'success': False, 'error': 'A foto desta leitura já foi descartada'}, status=404)
+    
+    resultado = job.get_resultado_dict()
+    preenchimento = resultado.get('leitura', {}).get('preenchimento')
+    fills = decode_fill_matrix(preenchimento) if preenchimento else None
+    imagem = render_overlay(bytes(job.imagem), bolhas, resultado.get('respostas_detectadas'), fills)
+    return HttpResponse(imagem, content_type='image/jpeg')
+
+# Limites do upload em lote (quantidade de folhas e tamanho de cada imagem)
+MAX_GABARITOS_LOTE = 200
+MAX_TAMANHO_GABARITO = 30 * 1024 * 1024
+EXTENSOES_GABARITO = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+
+def extrair_gabaritos_zip(arquivo_zip):
+    """Lê as imagens de um ZIP enviado, retornando [(nome, bytes)]"""
+    import zipfile
+    
+    gabaritos = []
+    with zipfile.ZipFile(arquivo_zip) as zf:
+        for info in zf.infolist():
+            nome = os.path.basename(info.filename)
+            if (info.is_dir() or not nome or nome.startswith('.') or '__MACOSX' in info.filename
+                    or not nome.lower().endswith(EXTENSOES_GABARITO)):
+                continue
+            if info.file_size > MAX_TAMANHO_GABARITO:
+                raise ValueError(f'Imagem muito grande no ZIP: {nome}')
+            if len(gabaritos) >= MAX_GABARITOS_LOTE:
+                raise ValueError(f'O lote pode ter no máximo {MAX_GABARITOS_LOTE} gabaritos')
+            gabaritos.append((nome, zf.read(info)))
+    return gabaritos
+
+def processar_omr_lote(request):
+    """
+    Corrige várias folhas de resposta de uma mesma prova em uma única requisição
+    Aceita várias imagens (fotos_gabarito) e/ou um ZIP (arquivo_zip) e processa
+    as folhas em paralelo em um pool de processos
+    """
+    professor = professor_logado(request)
+    if not professor:
+        return JsonResponse({'success': False, 'error': 'Não autorizado'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método não permitido'})
+    
+    prova_id = request.POST.get('prova_id')
+    avaliacao = request.POST.get('avaliacao')
+    
+    try:
+        prova = Prova.objects.get(id=prova_id, professor=professor)
+        gabarito = prova.gabarito
+        
+        gabaritos = []
+        for foto in request.FILES.getlist('fotos_gabarito'):
+            if foto.size > MAX_TAMANHO_GABARITO:
+                return JsonResponse({'success': False, 'error': f'Imagem muito grande: {foto.name}'})
+            gabaritos.append((foto.name, foto.read()))
+        
+        arquivo_zip = request.FILES.get('arquivo_zip')
+        if arquivo_zip:
+            gabaritos.extend(extrair_gabaritos_zip(arquivo_zip))
+        
+        if not gabaritos:
+            return JsonResponse({'success': False, 'error': 'Nenhuma imagem foi enviada'})
+        if len(gabaritos) > MAX_GABARITOS_LOTE:
+            return JsonResponse({
+                'success': False,
+                'error': f'O lote pode ter no máximo {MAX_GABARITOS_LOTE} gabaritos'
+            })
+        
+        from .grading import compile_key, letter_codes
+        from .omr_jobs import store_sheet
+        from .omr_processor import process_sheets_batch, reading_details
+        
+        questoes_ids = prova.get_questoes_ids_list()
+        key = compile_key(gabarito, questoes_ids)
+        
+        folhas = []
+        lidas = []
+        respostas_lidas = []
+        for resultado in process_sheets_batch(gabaritos, len(questoes_ids)):
+            # A matrícula (11 dígitos) pode vir no nome do arquivo, ex.: 20231234567.jpg
+            matricula = re.search(r'\d{11}', resultado['arquivo'] or '')
+            folha = {
+                'arquivo': resultado['arquivo'],
+                'aluno_matricula': matricula.group(0) if matricula else None,
+                'success': resultado['erro'] is None,
+            }
+            if resultado['erro']:
+                folha['error'] = resultado['erro']
+            else:
+                folha.update({
+                    'respostas_detectadas': resultado['respostas'],
+                    'leitura': reading_details(resultado),
+                })
+                lidas.append(folha)
+                respostas_lidas.append(letter_codes(resultado['respostas'], len(key)))
+                # Matriz de preenchimento guardada para redecisões (omr_redecidir)
+                store_sheet(prova, resultado, len(questoes_ids), folha['aluno_matricula'] or '')
+            folhas.append(folha)
+        
+        # Todas as folhas lidas corrigidas de uma vez
+        if lidas:
+            acertos, notas = key.grade(respostas_lidas, scale=10)
+            for folha, folha_acertos, nota_final in zip(lidas, acertos, notas):
+                folha.update({
+                    'acertos': int(folha_acertos),
+                    'total': len(key),
+                    'nota': round(float(nota_final), 1),
+                })
+        falhas = len(folhas) - len(lidas)
+        
+        return JsonResponse({
+            'success': True,
+            'prova_id': prova.id,
+            'avaliacao': avaliacao,
+            'total_folhas': len(folhas),
+            'falhas': falhas,
+            'folhas': folhas
+        })
+        
+    except Prova.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Prova não encontrada'})
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': f'Erro no processamento OMR em lote: {str(e)}'})
 
 def api_provas_disciplina(request, disciplina):
     """API para buscar provas de uma disciplina específica"""
@@ -714,7 +881,7 @@ def api_provas_disciplina(request, disciplina):
         return JsonResponse({'error': 'Não autorizado'}, status=401)
     
     try:
-        professor = Professor.objects.filter(email__contains=cpf_professor).first()
+        professor = professor_logado(request)
         if professor:
             provas = Prova.objects.filter(
                 professor=professor, 
@@ -748,27 +915,18 @@ def aplicar_nota_omr(request):
             avaliacao = data_request.get('avaliacao')
             nota = float(data_request.get('nota', 0))
             
-            # Carregar dados temporários
-            data = load_data()
-            cpf_professor = request.session.get('usuario')
+            # Mapear nome da avaliação para o campo correspondente
+            campo_nota = Inscricao.CAMPOS_NOTA.get(avaliacao)
             
-            # Encontrar e atualizar a nota do aluno
-            for disciplina in data.get('disciplinas', []):
-                if disciplina.get('cpf_professor') == cpf_professor:
-                    for aluno in disciplina.get('alunos', []):
-                        if aluno.get('matricula') == matricula:
-                            # Mapear nome da avaliação para o campo correspondente
-                            campo_nota = {
-                                '1VA': 'nota_1va',
-                                '2VA': 'nota_2va', 
-                                '3VA': 'nota_3va',
-                                'Final': 'nota_final'
-                            }.get(avaliacao)
-                            
-                            if campo_nota:
-                                aluno[campo_nota] = nota
-                                save_data(data)
-                                return JsonResponse({'success': True})
+            # Primeira inscrição do aluno nas disciplinas do professor
+            inscricao = Inscricao.objects.filter(
+                disciplina__professor=professor_logado(request),
+                aluno__matricula=matricula
+            ).order_by('disciplina_id').values_list('id', flat=True).first()
+            
+            if inscricao and campo_nota:
+                Inscricao.objects.filter(id=inscricao).update(**{campo_nota: nota})
+                return JsonResponse({'success': True})
             
             return JsonResponse({'success': False, 'error': 'Aluno não encontrado'})
         except Exception as e:
@@ -783,32 +941,26 @@ def editar_questao(request, questao_id):
     if not cpf_professor:
         return redirect('login')
     
-    data = load_data()
-    questao = None
-    
     # Verificar se veio uma disciplina específica via GET
     disciplina_filtro = request.GET.get('disciplina', '')
     
-    # Encontrar a questão
-    for q in data['questoes']:
-        if q['id'] == questao_id:
-            questao = q
-            break
+    # Encontrar a questão (só as do professor logado)
+    questao = Questao.objects.filter(id=questao_id, cpf_professor=cpf_professor).first()
     
     if not questao:
         return redirect('lista_questoes')
     
     if request.method == 'POST':
         # Atualizar os dados da questão
-        questao['enunciado'] = request.POST.get('enunciado')
-        questao['alternativa_a'] = request.POST.get('alternativa_a')
-        questao['alternativa_b'] = request.POST.get('alternativa_b')
-        questao['alternativa_c'] = request.POST.get('alternativa_c')
-        questao['alternativa_d'] = request.POST.get('alternativa_d')
-        questao['alternativa_e'] = request.POST.get('alternativa_e')
-        questao['resposta_correta'] = request.POST.get('resposta_correta')
-        
-        save_data(data)
+        Questao.objects.filter(id=questao.id).update(
+            enunciado=request.POST.get('enunciado'),
+            alternativa_a=request.POST.get('alternativa_a'),
+            alternativa_b=request.POST.get('alternativa_b'),
+            alternativa_c=request.POST.get('alternativa_c'),
+            alternativa_d=request.POST.get('alternativa_d'),
+            alternativa_e=request.POST.get('alternativa_e'),
+            resposta_correta=request.POST.get('resposta_correta'),
+        )
         
         # Redirecionar baseado na disciplina
         if disciplina_filtro:
@@ -817,7 +969,7 @@ def editar_questao(request, questao_id):
             return redirect('lista_questoes')
     
     # Preparar dados para o template
-    disciplinas = data['disciplinas']
+    disciplinas = disciplinas_do_professor(professor_logado(request))
     return render(request, 'cadastro/editar_questao.html', {
         'questao': questao,
         'disciplinas': disciplinas,
@@ -833,18 +985,15 @@ def excluir_questao(request, questao_id):
     
     if request.method == 'DELETE':
         try:
-            data = load_data()
-            
             # Encontrar e remover a questão
-            questoes_originais = len(data['questoes'])
-            data['questoes'] = [q for q in data['questoes'] if q['id'] != questao_id]
-            
-            if len(data['questoes']) < questoes_originais:
-                save_data(data)
+            removidas, _ = Questao.objects.filter(id=questao_id, cpf_professor=cpf_professor).delete()
+            if removidas:
                 return JsonResponse({'success': True})
-            else:
-                return JsonResponse({'success': False, 'error': 'Questão não encontrada'})
+            return JsonResponse({'success': False, 'error': 'Questão não encontrada'})
                 
+        except ProtectedError:
+            # ProvaQuestao protege as questões usadas em provas
+            return JsonResponse({'success': False, 'error': 'A questão faz parte de uma prova; exclua a prova antes'})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     
@@ -872,8 +1021,7 @@ def excluir_prova(request, prova_id):
         try:
             from .models import Prova, GabaritoProva, ResultadoAluno, Professor
             
-            # Buscar professor usando a mesma lógica da view listar_provas
-            professor = Professor.objects.filter(email__contains=cpf_professor).first()
+            professor = professor_logado(request)
             print(f"Professor encontrado: {professor}")
             
             if not professor:
@@ -923,51 +1071,20 @@ def gerar_pdf_prova(request, prova_id):
     try:
         from .models import Prova, Professor, Questao
         
-        # Buscar professor usando a mesma lógica
-        professor = Professor.objects.filter(email__contains=cpf_professor).first()
+        professor = professor_logado(request)
         if not professor:
             return redirect('login')
         
         # Buscar a prova
         prova = Prova.objects.get(id=prova_id, professor=professor)
         
-        # Buscar as questões da prova
-        questoes_ids = prova.get_questoes_ids_list()
-        questoes = []
-        
-        print(f"DEBUG PDF: Prova ID {prova_id}, Questões IDs: {questoes_ids}")
-        
-        # Primeiro tentar buscar no Django
-        for questao_id in questoes_ids:
-            try:
-                questao = Questao.objects.get(id=questao_id)
-                questoes.append({
-                    'enunciado': questao.enunciado,
-                    'alternativa_a': questao.alternativa_a,
-                    'alternativa_b': questao.alternativa_b,
-                    'alternativa_c': questao.alternativa_c,
-                    'alternativa_d': questao.alternativa_d,
-                    'alternativa_e': questao.alternativa_e,
-                    'resposta_correta': questao.resposta_correta,
-                    'id': questao.id
-                })
-                print(f"DEBUG PDF: Questão Django encontrada: {questao_id}")
-            except Questao.DoesNotExist:
-                print(f"DEBUG PDF: Questão Django não encontrada: {questao_id}")
-                # Fallback para sistema de arquivos JSON
-                data = load_data()
-                questoes_json = data.get('questoes', [])
-                for q in questoes_json:
-                    if q.get('id') == questao_id:
-                        questoes.append(q)
-                        print(f"DEBUG PDF: Questão JSON encontrada: {questao_id}")
-                        break
-        
-        print(f"DEBUG PDF: Total de questões encontradas: {len(questoes)}")
+        # Buscar as questões da prova (uma consulta, na ordem da prova)
+        questoes = prova.get_questoes_list()
         
         return render(request, 'cadastro/visualizar_prova.html', {
             'questoes': questoes,
             'quantidade': len(questoes),
+            'layout_gabarito': layout_for(len(questoes)).template_context(len(questoes)),
             'disciplina': prova.disciplina,
             'prova_id': prova.id,
             'gabarito_salvo': True,
@@ -977,10 +1094,7 @@ def gerar_pdf_prova(request, prova_id):
         })
         
     except Prova.DoesNotExist:
-        print(f"DEBUG PDF: Prova {prova_id} não encontrada")
         return redirect('listar_provas')
-    except Exception as e:
-        print(f"DEBUG PDF: Erro: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception('Erro ao gerar o PDF da prova %s', prova_id)
         return redirect('listar_provas')
\ No newline at end of file
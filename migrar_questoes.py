@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 """
 Script para migrar questões do sistema JSON para o banco Django
+(para importar todos os dados do JSON: python manage.py importar_dados_json)
 """
+import json
 import os
 import sys
 import django
@@ -12,14 +14,16 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sistema_cadastro.settings')
 django.setup()
 
 from cadastro.models import Professor, Questao
-from cadastro.views import load_data
+
+TEMP_STORAGE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp_storage', 'dados_temp.json')
 
 def migrar_questoes():
     """Migra questões do JSON para o Django"""
     print("Iniciando migração de questões...")
     
     # Carregar dados do JSON
-    data = load_data()
+    with open(TEMP_STORAGE_FILE, encoding='utf-8') as file:
+        data = json.load(file)
     questoes_json = data.get('questoes', [])
     usuarios = data.get('usuarios', [])
     
@@ -27,6 +31,7 @@ def migrar_questoes():
     
     migradas = 0
     erros = 0
+    professores = {}  # cpf -> Professor
     
     for questao in questoes_json:
         try:
@@ -36,17 +41,20 @@ def migrar_questoes():
                 print(f"Questão sem CPF do professor: {questao.get('id')}")
                 continue
                 
-            # Buscar professor no Django
-            professor = Professor.objects.filter(email__contains=cpf_professor).first()
+            # Buscar professor no Django (índice de Professor.cpf; uma consulta por professor)
+            if cpf_professor not in professores:
+                professores[cpf_professor] = Professor.objects.filter(cpf=cpf_professor).first()
+            professor = professores[cpf_professor]
             
             if not professor:
                 # Criar professor se não existir
                 usuario = next((u for u in usuarios if u.get('cpf') == cpf_professor), None)
                 if usuario:
                     professor, created = Professor.objects.get_or_create(
-                        email=f"{cpf_professor}@temp.com",
-                        defaults={'nome': usuario.get('nome', 'Professor')}
+                        cpf=cpf_professor,
+                        defaults={'nome': usuario.get('nome', 'Professor'), 'email': f"{cpf_professor}@temp.com"}
                     )
+                    professores[cpf_professor] = professor
                     if created:
                         print(f"Professor criado: {professor.nome}")
                 else:
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
 from pathlib import Path
+from datetime import timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -117,4 +118,29 @@ STATIC_URL = '/static/'
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# OMR: processa a fila de leituras em uma thread do próprio processo web.
+# Use False quando a fila for drenada por "python manage.py omr_worker".
+OMR_INLINE_WORKER = True
+
+# Pool de processos OMR compartilhado pela fila e pela correção em lote.
+# O pool é criado em cada processo web: com um servidor WSGI de W workers, o total
+# é W × OMR_POOL_WORKERS processos OMR (ex.: núcleos // W). None usa 2 processos
+# (ou 1, em máquinas de um núcleo); cada processo é reciclado após N leituras.
+OMR_POOL_WORKERS = None
+OMR_POOL_MAX_TASKS = 200
+
+# Cache de leituras OMR por conteúdo da imagem (reenvios da mesma foto).
+# Limite de entradas na tabela, idade máxima e tamanho do LRU em memória.
+OMR_CACHE_MAX_ENTRIES = 5000
+OMR_CACHE_MAX_AGE = timedelta(days=30)
+OMR_CACHE_MEMORY_ENTRIES = 256
+# Hits acumulados antes de gravar os contadores de uso, e gravações entre
+# duas aplicações dos limites acima (o worker também os aplica periodicamente).
+OMR_CACHE_FLUSH_EVERY = 50
+OMR_CACHE_EVICT_EVERY = 100
+
+# Por quanto tempo a foto enviada fica guardada no job OMR (para a
+# sobreposição de conferência). Depois disso o worker descarta os bytes.
+OMR_IMAGEM_RETENCAO = timedelta(days=7)